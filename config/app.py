@@ -1,4 +1,5 @@
 import os
+from typing import Optional
 from pydantic_settings import BaseSettings  # Updated import
 
 class Settings(BaseSettings):
@@ -7,18 +8,79 @@ class Settings(BaseSettings):
     SECRET_KEY: str = os.getenv("SECRET_KEY", "development-secret-key")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 7  # 1 week
     
+    # Build the caller from token claims instead of loading the User on every request
+    STATELESS_AUTH: bool = True
+    # How long a user's active flag and role are trusted before being re-read
+    USER_STATE_CACHE_TTL_SECONDS: int = 30
+    USER_STATE_CACHE_MAX_SIZE: int = 10000
+    
+    # bcrypt cost factor; hashes with a different cost are rehashed on the next login
+    BCRYPT_ROUNDS: int = 12
+    # Threads dedicated to bcrypt work (defaults to the number of CPU cores)
+    PASSWORD_HASH_WORKERS: Optional[int] = None
+    # Remember recent successful password checks so repeated kiosk logins skip bcrypt
+    LOGIN_THROUGHPUT_MODE: bool = False
+    PASSWORD_VERIFY_CACHE_TTL_SECONDS: int = 300
+    PASSWORD_VERIFY_CACHE_MAX_SIZE: int = 10000
+    
     DB_USER: str = os.getenv("DB_USER", "postgres")
     DB_PASSWORD: str = os.getenv("DB_PASSWORD", "password")
     DB_HOST: str = os.getenv("DB_HOST", "localhost")
     DB_PORT: str = os.getenv("DB_PORT", "5432")
     DB_NAME: str = os.getenv("DB_NAME", "facereg_db")
     
+    # Connection pool sizing, per worker process
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    
+    # Log connections held out of the pool longer than the threshold (captures a stack per checkout)
+    DB_LEAK_DETECTION: bool = False
+    DB_LEAK_THRESHOLD_SECONDS: float = 60.0
+    
+    # Only store check-ins and manual edits; absence of an enrolled student is implied at read time.
+    # Reads and rollups treat a missing row as absent either way, so this only decides whether
+    # new default absences are written. Migration f1b6d3a9e720 drops the stored ones regardless.
+    LAZY_ABSENT_ATTENDANCE: bool = True
+    
+    # Where face crops and other blobs are kept; "local" stores them under BLOB_STORE_PATH
+    BLOB_STORE_BACKEND: str = os.getenv("BLOB_STORE_BACKEND", "local")
+    BLOB_STORE_PATH: str = os.getenv("BLOB_STORE_PATH", "storage")
+    
+    # Stream face galleries with binary COPY into one float32 matrix (psycopg2 only)
+    GALLERY_BINARY_COPY: bool = True
+    # Share galleries between workers through a memory-mapped snapshot file
+    GALLERY_SNAPSHOTS: bool = True
+    GALLERY_SNAPSHOT_PATH: str = os.getenv("GALLERY_SNAPSHOT_PATH", os.path.join("storage", "galleries"))
+    # How often a worker checks its snapshot against the database for out-of-band changes
+    GALLERY_SNAPSHOT_VERIFY_SECONDS: float = 10.0
+    
+    # Broadcast config changes and cache evictions to every worker; "postgres" uses LISTEN/NOTIFY
+    INVALIDATION_BUS_BACKEND: str = os.getenv("INVALIDATION_BUS_BACKEND", "postgres")
+    INVALIDATION_CHANNEL: str = "facereg_invalidation"
+    # Fallback check of the stored face recognition config version, for missed notifications
+    FACE_RECOGNITION_CONFIG_POLL_SECONDS: float = 30.0
+    
+    # Reuse the detection and embedding when the same photo is resubmitted for a check-in
+    CHECK_IN_RESULT_CACHE: bool = True
+    CHECK_IN_RESULT_CACHE_TTL_SECONDS: int = 120
+    CHECK_IN_RESULT_CACHE_MAX_SIZE: int = 1000
+    # Answer resubmissions of a photo that already recorded a check-in with 409.
+    # Retries of a photo that failed get the cached error or are matched again.
+    CHECK_IN_REJECT_REPLAYS: bool = False
+    
     
     # Database URL property
     @property
     def DATABASE_URL(self) -> str:
         return f"postgresql://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
     
+    @property
+    def ASYNC_DATABASE_URL(self) -> str:
+        return f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
+    
     # Update to Pydantic v2 format
     model_config = {
         "env_file": ".env",
@@ -11,4 +11,5 @@ DB_PORT = os.getenv("DB_PORT", "5432")
 DB_NAME = os.getenv("DB_NAME", "facereg_db")
 
 # SQLAlchemy connection string
-DATABASE_URL = settings.DATABASE_URL
\ No newline at end of file
+DATABASE_URL = settings.DATABASE_URL
+ASYNC_DATABASE_URL = settings.ASYNC_DATABASE_URL
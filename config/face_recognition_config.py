@@ -1,12 +1,20 @@
-from typing import Literal, Optional
-import os
-from pydantic import BaseModel
-from utils.logging import logger
+from typing import Dict, Literal, Optional
+from pydantic import BaseModel, ConfigDict
 
 ModelType = Literal["insightface", "deepface"]
 
 class FaceRecognitionConfig(BaseModel):
-    """Configuration settings for face recognition services"""
+    """
+    Configuration settings for face recognition services.
+    
+    Instances are immutable snapshots: read the current one through
+    crud.face_recognition_config.get_face_recognition_config() and derive
+    changed copies with with_changes().
+    """
+    model_config = ConfigDict(frozen=True, extra="ignore")
+    
+    # Stored version this snapshot was built from (0 = built-in defaults)
+    version: int = 0
     
     DEFAULT_MODEL: ModelType = "deepface"
     
@@ -41,25 +49,34 @@ class FaceRecognitionConfig(BaseModel):
     ENABLE_DUPLICATE_DETECTION: bool = True 
     DUPLICATE_DETECTION_THRESHOLD: float = 0.85
     SIMILARITY_THRESHOLD: float = 0.85 # should be 0.7 for facenet512 but for security, im going to use 0.8 for facenet512
+    # Per-model overrides of the two thresholds above; similarities from different models are not comparable
+    SIMILARITY_THRESHOLDS: Dict[ModelType, float] = {}
+    DUPLICATE_DETECTION_THRESHOLDS: Dict[ModelType, float] = {}
 
 
     FACE_MIN_WIDTH_RATIO: float = 0.25  
     FACE_MIN_HEIGHT_RATIO: float = 0.25 
     FACE_MARGIN_RATIO: float = 0.05
     FACE_DETECTION_CONFIDENCE: float = 0.7 
+    # Mean intensity of DeepFace's 0-1 normalized face crop below which it is treated as occluded
+    MIN_FACE_INTENSITY: float = 0.1
     
     def get_model_for_operation(self, operation: str) -> ModelType:
-        operation_upper = operation.upper()
-        override_attr = f"{operation_upper}_MODEL"
-        
-        if hasattr(self, override_attr) and getattr(self, override_attr) is not None:
-            model = getattr(self, override_attr)
-            logger.info(f"Using operation-specific model for {operation}: {model}")
-            return model
-        
-        logger.info(f"Using default model for {operation}: {self.DEFAULT_MODEL}")
+        """The model for "register_face" or "check_in": its override if set, else the default."""
+        if operation == "register_face" and self.REGISTER_FACE_MODEL is not None:
+            return self.REGISTER_FACE_MODEL
+        if operation == "check_in" and self.CHECK_IN_MODEL is not None:
+            return self.CHECK_IN_MODEL
         return self.DEFAULT_MODEL
     
+    def get_similarity_threshold(self, model_type: ModelType) -> float:
+        """The match threshold for embeddings of the given model."""
+        return self.SIMILARITY_THRESHOLDS.get(model_type, self.SIMILARITY_THRESHOLD)
+    
+    def get_duplicate_detection_threshold(self, model_type: ModelType) -> float:
+        """The duplicate-registration threshold for embeddings of the given model."""
+        return self.DUPLICATE_DETECTION_THRESHOLDS.get(model_type, self.DUPLICATE_DETECTION_THRESHOLD)
+    
     def get_anti_spoofing_threshold(self, is_registration: bool = False) -> float:
         """
         Get the appropriate anti-spoofing threshold based on operation
@@ -74,23 +91,16 @@ class FaceRecognitionConfig(BaseModel):
             return self.REGISTRATION_ANTI_SPOOFING_THRESHOLD
         return self.ANTI_SPOOFING_THRESHOLD
     
-    def update_default_model(self, model: ModelType):
+    def with_changes(self, changes: dict) -> "FaceRecognitionConfig":
         """
-        Update the default model used for all operations
+        A validated copy with the given fields replaced.
         
-        Args:
-            model: The new default model
+        Unknown fields are ignored; invalid values raise a pydantic ValidationError.
         """
-        if model not in ["insightface", "deepface"]:
-            raise ValueError(f"Invalid model: {model}")
-        
-        self.DEFAULT_MODEL = model
-        logger.info(f"Default model updated to {model}")
-    
-    class Config:
-        extra = "ignore"
-        env_prefix = "FACE_RECOGNITION_"
-        env_file = ".env"
+        return type(self).model_validate({**self.model_dump(), **changes})
 
-# Create a singleton instance
-face_recognition_config = FaceRecognitionConfig()
\ No newline at end of file
+# Fields that select the model for one operation, by operation name
+OPERATION_MODEL_FIELDS = {
+    "register_face": "REGISTER_FACE_MODEL",
+    "check_in": "CHECK_IN_MODEL",
+}
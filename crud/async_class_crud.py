@@ -0,0 +1,17 @@
+from sqlalchemy import exists, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from models.database import ClassSession, student_class_association
+from typing import Optional
+
+# Async counterparts of the crud.class_crud lookups used by endpoints running on an
+# AsyncSession. Enrollment goes through the association table directly since
+# relationship collections cannot lazy-load on an async session.
+
+async def is_student_enrolled(db: AsyncSession, class_id: int, student_id: int) -> bool:
+    return await db.scalar(select(exists().where(
+        student_class_association.c.class_id == class_id,
+        student_class_association.c.user_id == student_id
+    )))
+
+async def get_session(db: AsyncSession, session_id: int) -> Optional[ClassSession]:
+    return await db.scalar(select(ClassSession).where(ClassSession.id == session_id))
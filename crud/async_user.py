@@ -0,0 +1,9 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from models.database import User
+from schemas.user import UserResponse
+
+# Async counterparts of the crud.user lookups used by endpoints running on an AsyncSession
+
+async def get_user(db: AsyncSession, user_id: int) -> UserResponse:
+    return await db.scalar(select(User).where(User.id == user_id))
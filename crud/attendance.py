@@ -0,0 +1,125 @@
+from sqlalchemy import case, exists, literal, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from models.database import Attendance, AttendanceStatus, ClassSession, student_class_association
+from crud.attendance_rollup import status_change_ctes
+from datetime import datetime
+from typing import Optional
+
+# Attempts before giving up on an upsert that keeps racing concurrent writers of the same row
+MAX_UPSERT_ATTEMPTS = 3
+
+def _upsert_attendance_statement(
+    session: ClassSession,
+    student_id: int,
+    status: str,
+    late_minutes: int,
+    check_in_time: Optional[datetime]
+):
+    """
+    One statement upserting the attendance row and the rollups, returning the row and its previous status.
+
+    The previous status is read from a pre-image CTE. Should another transaction change
+    the row after that was read, the conflicting update is skipped and no row is returned,
+    so that the rollups are never moved from a stale status.
+    """
+    old = select(Attendance.status).where(
+        Attendance.student_id == student_id,
+        Attendance.session_id == session.id
+    ).cte("old")
+    had_row = exists(select(old.c.status))
+    old_status = select(old.c.status).scalar_subquery()
+
+    # Without a stored row an enrolled student was implicitly absent, as in effective_attendance()
+    enrolled = exists().where(
+        student_class_association.c.class_id == session.class_id,
+        student_class_association.c.user_id == student_id
+    )
+    previous_status = case(
+        (had_row, old_status),
+        (enrolled, literal(AttendanceStatus.ABSENT.value))
+    )
+
+    stmt = insert(Attendance).values(
+        student_id=student_id,
+        session_id=session.id,
+        status=status,
+        check_in_time=check_in_time,
+        late_minutes=late_minutes
+    )
+    values = {"status": stmt.excluded.status, "late_minutes": stmt.excluded.late_minutes}
+    if check_in_time is not None:
+        values["check_in_time"] = stmt.excluded.check_in_time
+    upserted = stmt.on_conflict_do_update(
+        constraint="uq_attendances_student_id_session_id",
+        set_=values,
+        where=had_row & Attendance.status.is_not_distinct_from(old_status)
+    ).returning(
+        Attendance.id,
+        Attendance.student_id,
+        Attendance.session_id,
+        Attendance.status,
+        Attendance.check_in_time,
+        Attendance.late_minutes,
+        previous_status.label("previous_status")
+    ).cte("upserted")
+
+    query = select(upserted)
+    for rollup in status_change_ctes(upserted, session.class_id, session.session_date, student_id):
+        query = query.add_cte(rollup)
+    return query
+
+def _upsert_attempts(
+    session: ClassSession,
+    student_id: int,
+    status: str,
+    late_minutes: int,
+    check_in_time: Optional[datetime]
+):
+    """Yield the upsert statement until the caller gets a row back from it; raise once out of attempts."""
+    stmt = _upsert_attendance_statement(session, student_id, status, late_minutes, check_in_time)
+    for _ in range(MAX_UPSERT_ATTEMPTS):
+        # Each execution reads the row afresh, including changes committed since the last one
+        yield stmt
+    raise RuntimeError(
+        f"Attendance for student {student_id} in session {session.id} kept changing concurrently; "
+        f"gave up after {MAX_UPSERT_ATTEMPTS} attempts"
+    )
+
+def upsert_attendance(
+    db: Session,
+    session: ClassSession,
+    student_id: int,
+    status: str,
+    late_minutes: int = 0,
+    check_in_time: Optional[datetime] = None
+):
+    """
+    Record a student's attendance for a session.
+
+    Inserts the row for (student_id, session_id) or updates it in place, and moves the
+    attendance rollups in the same statement. check_in_time is only overwritten when
+    given. Returns the resulting row (id, student_id, session_id, status, check_in_time,
+    late_minutes, previous_status), where previous_status is "absent" for a new row of
+    an enrolled student (absence is implied) and None for any other new row.
+    The caller commits.
+    """
+    for stmt in _upsert_attempts(session, student_id, status, late_minutes, check_in_time):
+        row = db.execute(stmt).first()
+        if row is not None:
+            return row
+
+async def upsert_attendance_async(
+    db: AsyncSession,
+    session: ClassSession,
+    student_id: int,
+    status: str,
+    late_minutes: int = 0,
+    check_in_time: Optional[datetime] = None
+):
+    """Async version of upsert_attendance."""
+    for stmt in _upsert_attempts(session, student_id, status, late_minutes, check_in_time):
+        row = (await db.execute(stmt)).first()
+        if row is not None:
+            return row
@@ -0,0 +1,297 @@
+from sqlalchemy import Date, case, func, literal, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from models.database import (
+    AttendanceStatus, ClassSession,
+    ClassAttendanceRollup, StudentAttendanceRollup
+)
+from crud.attendance_view import effective_attendance
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Rollup column holding the count for each attendance status
+STATUS_COLUMNS = {
+    AttendanceStatus.PRESENT.value: "present_count",
+    AttendanceStatus.LATE.value: "late_count",
+    AttendanceStatus.ABSENT.value: "absent_count",
+}
+
+def month_of(session_date: datetime) -> date:
+    """Return the first day of the month a session falls in."""
+    return session_date.date().replace(day=1)
+
+def _status_deltas(old_status: Optional[str], new_status: Optional[str]) -> Dict[str, int]:
+    deltas = {}
+    old_column = STATUS_COLUMNS.get((old_status or "").lower())
+    new_column = STATUS_COLUMNS.get((new_status or "").lower())
+    if old_column == new_column:
+        return deltas
+    if old_column:
+        deltas[old_column] = -1
+    if new_column:
+        deltas[new_column] = 1
+    return deltas
+
+def _upsert_counts_statement(model, rows: List[Dict]):
+    """Statement adding the count columns of each row onto the existing rollup rows, creating them if missing."""
+    table = model.__table__
+    stmt = insert(table).values([
+        {**row, **{column: row.get(column, 0) for column in STATUS_COLUMNS.values()}}
+        for row in rows
+    ])
+    return _add_counts_on_conflict(stmt, table)
+
+def _add_counts_on_conflict(stmt, table):
+    key_columns = [column.name for column in table.primary_key.columns]
+    return stmt.on_conflict_do_update(
+        index_elements=key_columns,
+        set_={
+            column: table.c[column] + stmt.excluded[column]
+            for column in STATUS_COLUMNS.values()
+        }
+    )
+
+def status_change_statements(
+    class_id: int,
+    session_date: datetime,
+    student_id: int,
+    old_status: Optional[str],
+    new_status: str
+) -> List:
+    """Statements moving one attendance between status counters; empty if nothing changes."""
+    deltas = _status_deltas(old_status, new_status)
+    if not deltas or class_id is None:
+        return []
+
+    return [
+        _upsert_counts_statement(ClassAttendanceRollup, [
+            {"class_id": class_id, "month": month_of(session_date), **deltas}
+        ]),
+        _upsert_counts_statement(StudentAttendanceRollup, [
+            {"student_id": student_id, "class_id": class_id, **deltas}
+        ]),
+    ]
+
+def status_change_ctes(changes, class_id: int, session_date: datetime, student_id: int) -> List:
+    """
+    Rollup upserts, as CTEs, moving each attendance in `changes` between status counters.
+
+    `changes` is a selectable with status and previous_status columns, e.g. the RETURNING
+    rows of an attendance upsert, so the rollups change in the same statement as the row.
+    """
+    if class_id is None:
+        return []
+
+    def delta(status: str):
+        return (
+            case((func.lower(changes.c.status) == status, 1), else_=0)
+            - case((func.lower(changes.c.previous_status) == status, 1), else_=0)
+        )
+
+    deltas = [delta(status) for status in STATUS_COLUMNS]
+    changed = func.lower(changes.c.status).is_distinct_from(func.lower(changes.c.previous_status))
+    columns = list(STATUS_COLUMNS.values())
+    return [
+        _add_counts_on_conflict(
+            insert(ClassAttendanceRollup).from_select(
+                ["class_id", "month", *columns],
+                select(literal(class_id), literal(month_of(session_date)), *deltas).where(changed)
+            ),
+            ClassAttendanceRollup.__table__
+        ).cte("class_rollup"),
+        _add_counts_on_conflict(
+            insert(StudentAttendanceRollup).from_select(
+                ["student_id", "class_id", *columns],
+                select(literal(student_id), literal(class_id), *deltas).where(changed)
+            ),
+            StudentAttendanceRollup.__table__
+        ).cte("student_rollup"),
+    ]
+
+def absent_rows_statements(
+    class_id: int,
+    session_dates: Iterable[datetime],
+    student_ids: Iterable[int]
+) -> List:
+    """Statements counting new default ABSENT rows for every (student, session) pair given."""
+    student_ids = list(student_ids)
+    months: Dict[date, int] = {}
+    session_count = 0
+    for session_date in session_dates:
+        month = month_of(session_date)
+        months[month] = months.get(month, 0) + 1
+        session_count += 1
+
+    if not student_ids or not session_count:
+        return []
+
+    return [
+        _upsert_counts_statement(ClassAttendanceRollup, [
+            {"class_id": class_id, "month": month, "absent_count": count * len(student_ids)}
+            for month, count in months.items()
+        ]),
+        _upsert_counts_statement(StudentAttendanceRollup, [
+            {"student_id": student_id, "class_id": class_id, "absent_count": session_count}
+            for student_id in student_ids
+        ]),
+    ]
+
+def absent_pairs_statements(class_id: int, pairs: Iterable[Tuple[int, datetime]], delta: int = 1) -> List:
+    """
+    Statements counting default absences given as (student_id, session_date) pairs.
+
+    Pass delta=-1 to take them back out, e.g. when implied absences go away with an enrollment.
+    """
+    months: Dict[date, int] = {}
+    students: Dict[int, int] = {}
+    for student_id, session_date in pairs:
+        month = month_of(session_date)
+        months[month] = months.get(month, 0) + delta
+        students[student_id] = students.get(student_id, 0) + delta
+
+    if not students:
+        return []
+
+    return [
+        _upsert_counts_statement(ClassAttendanceRollup, [
+            {"class_id": class_id, "month": month, "absent_count": count}
+            for month, count in months.items()
+        ]),
+        _upsert_counts_statement(StudentAttendanceRollup, [
+            {"student_id": student_id, "class_id": class_id, "absent_count": count}
+            for student_id, count in students.items()
+        ]),
+    ]
+
+def attendance_to_remove(session_id: Optional[int] = None, student_id: Optional[int] = None):
+    """
+    (class_id, student_id, session_date, status) of the stored and implied attendance of
+    a session or a student, to take out of the rollups before it is deleted.
+    """
+    attendance = effective_attendance()
+    query = select(
+        ClassSession.class_id, attendance.c.student_id, ClassSession.session_date, attendance.c.status
+    ).join(
+        ClassSession, ClassSession.id == attendance.c.session_id
+    ).where(ClassSession.class_id.isnot(None), attendance.c.student_id.isnot(None))
+    if session_id is not None:
+        query = query.where(attendance.c.session_id == session_id)
+    if student_id is not None:
+        query = query.where(attendance.c.student_id == student_id)
+    return query
+
+def removed_attendance_statements(rows: Iterable[Tuple[int, int, datetime, str]]) -> List:
+    """Statements subtracting (class_id, student_id, session_date, status) rows from the rollups."""
+    months: Dict[Tuple[int, date], Dict[str, int]] = {}
+    students: Dict[Tuple[int, int], Dict[str, int]] = {}
+    for class_id, student_id, session_date, status in rows:
+        column = STATUS_COLUMNS.get((status or "").lower())
+        if not column:
+            continue
+        month_counts = months.setdefault((class_id, month_of(session_date)), {})
+        month_counts[column] = month_counts.get(column, 0) - 1
+        student_counts = students.setdefault((student_id, class_id), {})
+        student_counts[column] = student_counts.get(column, 0) - 1
+
+    if not months:
+        return []
+
+    return [
+        _upsert_counts_statement(ClassAttendanceRollup, [
+            {"class_id": class_id, "month": month, **counts}
+            for (class_id, month), counts in months.items()
+        ]),
+        _upsert_counts_statement(StudentAttendanceRollup, [
+            {"student_id": student_id, "class_id": class_id, **counts}
+            for (student_id, class_id), counts in students.items()
+        ]),
+    ]
+
+def remove_from_rollups(db: Session, session_id: Optional[int] = None, student_id: Optional[int] = None):
+    """
+    Take a session's or a student's attendance out of the rollups, before deleting the
+    session or student in the same transaction. The caller commits.
+    """
+    rows = db.execute(attendance_to_remove(session_id=session_id, student_id=student_id)).all()
+    for stmt in removed_attendance_statements(rows):
+        db.execute(stmt)
+
+def record_status_change(
+    db: Session,
+    class_id: int,
+    session_date: datetime,
+    student_id: int,
+    old_status: Optional[str],
+    new_status: str
+):
+    """
+    Move one attendance between status counters.
+
+    old_status is None when the attendance row did not exist before. The caller commits.
+    """
+    for stmt in status_change_statements(class_id, session_date, student_id, old_status, new_status):
+        db.execute(stmt)
+
+def record_absent_rows(
+    db: Session,
+    class_id: int,
+    session_dates: Iterable[datetime],
+    student_ids: Iterable[int]
+):
+    """
+    Count newly created default ABSENT rows for every (student, session) pair given.
+
+    Used when a session is created for a class or a student is enrolled into one. The caller commits.
+    """
+    for stmt in absent_rows_statements(class_id, session_dates, student_ids):
+        db.execute(stmt)
+
+def _status_count(attendance, status: str):
+    return func.count(case((func.lower(attendance.c.status) == status, 1)))
+
+def rebuild_attendance_rollups(db: Session, class_id: Optional[int] = None):
+    """
+    Recompute rollups from the stored and implied attendance, for one class or for all of them.
+    """
+    class_query = db.query(ClassAttendanceRollup)
+    student_query = db.query(StudentAttendanceRollup)
+    if class_id is not None:
+        class_query = class_query.filter(ClassAttendanceRollup.class_id == class_id)
+        student_query = student_query.filter(StudentAttendanceRollup.class_id == class_id)
+    class_query.delete(synchronize_session=False)
+    student_query.delete(synchronize_session=False)
+
+    attendance = effective_attendance()
+    counts = [_status_count(attendance, status).label(column) for status, column in STATUS_COLUMNS.items()]
+    month = func.date_trunc("month", ClassSession.session_date).cast(Date)
+
+    by_month = db.query(ClassSession.class_id, month, *counts).join(
+        attendance, attendance.c.session_id == ClassSession.id
+    ).filter(ClassSession.class_id.isnot(None))
+    by_student = db.query(attendance.c.student_id, ClassSession.class_id, *counts).join(
+        ClassSession, attendance.c.session_id == ClassSession.id
+    ).filter(ClassSession.class_id.isnot(None), attendance.c.student_id.isnot(None))
+    if class_id is not None:
+        by_month = by_month.filter(ClassSession.class_id == class_id)
+        by_student = by_student.filter(ClassSession.class_id == class_id)
+
+    columns = list(STATUS_COLUMNS.values())
+    db.execute(insert(ClassAttendanceRollup).from_select(
+        ["class_id", "month", *columns],
+        by_month.group_by(ClassSession.class_id, month).statement
+    ))
+    db.execute(insert(StudentAttendanceRollup).from_select(
+        ["student_id", "class_id", *columns],
+        by_student.group_by(attendance.c.student_id, ClassSession.class_id).statement
+    ))
+    db.commit()
+
+def get_monthly_rollups(db: Session, start_date: datetime, end_date: datetime):
+    """Attendance status totals across all classes, one row per month in the range."""
+    return db.query(
+        ClassAttendanceRollup.month,
+        *[func.sum(getattr(ClassAttendanceRollup, column)).label(column) for column in STATUS_COLUMNS.values()]
+    ).filter(
+        ClassAttendanceRollup.month >= month_of(start_date),
+        ClassAttendanceRollup.month <= end_date.date()
+    ).group_by(ClassAttendanceRollup.month).all()
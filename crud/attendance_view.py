@@ -0,0 +1,54 @@
+from sqlalchemy import DateTime, Integer, cast, exists, literal, null, select, union_all
+from models.database import Attendance, AttendanceStatus, ClassSession, student_class_association
+
+def missing_attendance_pairs(class_id=None, student_ids=None, session_ids=None):
+    """
+    (student_id, session_id, session_date) for every enrolled student and session of
+    their class that has no attendance row, i.e. the absences that are only implied.
+    """
+    query = select(
+        student_class_association.c.user_id.label("student_id"),
+        ClassSession.id.label("session_id"),
+        ClassSession.session_date
+    ).join(
+        ClassSession, ClassSession.class_id == student_class_association.c.class_id
+    ).where(~exists().where(
+        Attendance.student_id == student_class_association.c.user_id,
+        Attendance.session_id == ClassSession.id
+    ))
+    if class_id is not None:
+        query = query.where(student_class_association.c.class_id == class_id)
+    if student_ids is not None:
+        query = query.where(student_class_association.c.user_id.in_(student_ids))
+    if session_ids is not None:
+        query = query.where(ClassSession.id.in_(session_ids))
+    return query
+
+def effective_attendance():
+    """
+    Stored attendance rows plus an ABSENT row for every enrolled (student, session)
+    pair without one, so absence does not have to be stored to be reported.
+
+    Derived rows have no id, check-in time or created_at. Filters on student_id or
+    session_id are pushed down into both halves by Postgres.
+    """
+    recorded = select(
+        Attendance.id,
+        Attendance.student_id,
+        Attendance.session_id,
+        Attendance.status,
+        Attendance.check_in_time,
+        Attendance.late_minutes,
+        Attendance.created_at
+    )
+    missing = missing_attendance_pairs().subquery()
+    derived = select(
+        cast(null(), Integer).label("id"),
+        missing.c.student_id,
+        missing.c.session_id,
+        literal(AttendanceStatus.ABSENT.value).label("status"),
+        cast(null(), DateTime(timezone=True)).label("check_in_time"),
+        literal(0).label("late_minutes"),
+        cast(null(), DateTime(timezone=True)).label("created_at")
+    )
+    return union_all(recorded, derived).subquery("effective_attendances")
@@ -1,7 +1,21 @@
+from sqlalchemy import delete, literal, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from models.database import Class, ClassSession, User, Attendance, AttendanceStatus
+from models.database import Class, ClassSession, User, Attendance, AttendanceStatus, student_class_association
 from schemas.class_schema import ClassCreate, ClassUpdate, ClassSessionCreate, ClassSessionUpdate
-from typing import Optional, List
+from typing import Dict, Optional, List
+from crud.attendance_rollup import absent_pairs_statements, remove_from_rollups
+from crud.attendance_view import missing_attendance_pairs
+from config.app import settings
+from utils.logging import logger
+
+class SessionConflictError(ValueError):
+    """A session of the class already exists at the requested start time."""
+
+def _raise_if_start_time_conflict(error: IntegrityError):
+    if "uq_class_sessions_class_id_start_time" in str(error.orig):
+        raise SessionConflictError("A session already exists at this start time") from error
 
 def get_class(db: Session, class_id: int) -> Optional[Class]:
     return db.query(Class).filter(Class.id == class_id).first()
@@ -55,53 +69,126 @@ def delete_class(db: Session, class_id: int):
     db.commit()
     return True
     
+def backfill_absent_attendance(
+    db: Session,
+    class_id: int,
+    student_ids: Optional[List[int]] = None,
+    session_ids: Optional[List[int]] = None
+):
+    """
+    Account for the default ABSENT attendance of every enrolled student for every session
+    of the class, optionally narrowed to some students or sessions.
+    
+    With LAZY_ABSENT_ATTENDANCE the absences stay implied and only the rollups change;
+    otherwise the rows are written with one INSERT ... SELECT. Existing rows are left
+    alone either way. The caller commits.
+    """
+    if settings.LAZY_ABSENT_ATTENDANCE:
+        missing = [
+            (row.student_id, row.session_date)
+            for row in db.execute(missing_attendance_pairs(class_id, student_ids, session_ids))
+        ]
+        for stmt in absent_pairs_statements(class_id, missing):
+            db.execute(stmt)
+        return
+    
+    pairs = select(
+        student_class_association.c.user_id,
+        ClassSession.id,
+        literal(AttendanceStatus.ABSENT.value),
+        literal(0)
+    ).join(
+        ClassSession, ClassSession.class_id == student_class_association.c.class_id
+    ).where(student_class_association.c.class_id == class_id)
+    if student_ids is not None:
+        pairs = pairs.where(student_class_association.c.user_id.in_(student_ids))
+    if session_ids is not None:
+        pairs = pairs.where(ClassSession.id.in_(session_ids))
+    
+    backfill = insert(Attendance).from_select(
+        ["student_id", "session_id", "status", "late_minutes"], pairs
+    ).on_conflict_do_nothing(
+        constraint="uq_attendances_student_id_session_id"
+    ).returning(Attendance.student_id, Attendance.session_id).cte("backfill")
+    
+    inserted = db.execute(
+        select(backfill.c.student_id, ClassSession.session_date).join(
+            ClassSession, ClassSession.id == backfill.c.session_id
+        )
+    ).all()
+    for stmt in absent_pairs_statements(class_id, inserted):
+        db.execute(stmt)
+
+def unenroll_students(db: Session, class_id: int, student_ids: List[int]) -> int:
+    """
+    Remove enrollment rows, keeping any stored attendance. Implied absences disappear
+    with the enrollment, so they are taken out of the rollups. Returns the number of
+    enrollments removed; the caller commits.
+    """
+    missing = [
+        (row.student_id, row.session_date)
+        for row in db.execute(missing_attendance_pairs(class_id, student_ids))
+    ]
+    for stmt in absent_pairs_statements(class_id, missing, delta=-1):
+        db.execute(stmt)
+    
+    result = db.execute(delete(student_class_association).where(
+        student_class_association.c.class_id == class_id,
+        student_class_association.c.user_id.in_(student_ids)
+    ))
+    return result.rowcount
+
 def register_student_to_class(db: Session, class_id: int, student_id: int):
-    db_class = db.query(Class).filter(Class.id == class_id).first()
-    db_student = db.query(User).filter(User.id == student_id, User.role == "student").first()
+    result = register_students_to_class(db, class_id, [student_id])
+    return bool(result) and student_id not in result["not_found"]
+
+def register_students_to_class(db: Session, class_id: int, student_ids: List[int]) -> Optional[Dict[str, List[int]]]:
+    """
+    Enroll many students into a class at once.
     
-    if not db_class or not db_student:
-        return False
+    Enrollment rows and the default ABSENT rows for the class's existing sessions are
+    each written with a single INSERT ... SELECT, skipping anything already present
+    (e.g. rows left over from an earlier enrollment). Returns None if the class does
+    not exist, otherwise the ids grouped into enrolled, already_enrolled and not_found.
+    """
+    if not db.query(Class.id).filter(Class.id == class_id).first():
+        return None
     
-    if db_student in db_class.students:
-        return True
+    student_ids = list(dict.fromkeys(student_ids))
+    valid_ids = set(db.execute(
+        select(User.id).where(User.id.in_(student_ids), User.role == "student")
+    ).scalars())
     
-    # Add student to class
-    db_class.students.append(db_student)
-    db.commit()
+    enrolled = []
+    if valid_ids:
+        enrolled = db.execute(
+            insert(student_class_association).from_select(
+                ["user_id", "class_id"],
+                select(User.id, literal(class_id)).where(User.id.in_(valid_ids))
+            ).on_conflict_do_nothing().returning(student_class_association.c.user_id)
+        ).scalars().all()
     
-    # Create attendance records for all existing sessions
-    existing_sessions = db.query(ClassSession).filter(ClassSession.class_id == class_id).all()
-    if existing_sessions:
-        attendance_records = [
-            Attendance(
-                student_id=student_id,
-                session_id=session.id,
-                status=AttendanceStatus.ABSENT.value,
-                check_in_time=None,
-                late_minutes=0
-            )
-            for session in existing_sessions
-        ]
-        
-        if attendance_records:
-            db.bulk_save_objects(attendance_records)
-            db.commit()
+    if enrolled:
+        backfill_absent_attendance(db, class_id, student_ids=enrolled)
     
-    return True
+    db.commit()
+    
+    return {
+        "enrolled": sorted(enrolled),
+        "already_enrolled": sorted(valid_ids.difference(enrolled)),
+        "not_found": [student_id for student_id in student_ids if student_id not in valid_ids],
+    }
 
 def remove_student_from_class(db: Session, class_id: int, student_id: int):
-    db_class = db.query(Class).filter(Class.id == class_id).first()
-    db_student = db.query(User).filter(User.id == student_id).first()
+    db_class = db.query(Class.id).filter(Class.id == class_id).first()
+    db_student = db.query(User.id).filter(User.id == student_id).first()
     
     if not db_class or not db_student:
         return False
     
-    if db_student in db_class.students:
-        db_class.students.remove(db_student)
-        db.commit()
-        return True
-    
-    return False
+    removed = unenroll_students(db, class_id, [student_id])
+    db.commit()
+    return removed > 0
 
 
 def get_class_students(db: Session, class_id: int):
@@ -128,31 +215,22 @@ def create_class_session(db: Session, session: ClassSessionCreate) -> ClassSessi
             notes=session.notes
         )
         db.add(db_session)
+        db.flush()
+        
+        # The session and its ABSENT rows are committed together
+        backfill_absent_attendance(db, db_session.class_id, session_ids=[db_session.id])
         db.commit()
         db.refresh(db_session)
         
-        class_obj = db.query(Class).filter(Class.id == session.class_id).first()
-        if class_obj and class_obj.students:
-            attendance_records = [
-                Attendance(
-                    student_id=student.id,
-                    session_id=db_session.id,
-                    status=AttendanceStatus.ABSENT.value,
-                    check_in_time=None,
-                    late_minutes=0
-                )
-                for student in class_obj.students
-            ]
-            
-            if attendance_records:
-                db.bulk_save_objects(attendance_records)
-                db.commit()
-        
         return db_session
+    except IntegrityError as e:
+        db.rollback()
+        _raise_if_start_time_conflict(e)
+        logger.error(f"Error creating class session: {str(e)}")
+        raise
     except Exception as e:
         db.rollback()
-        # Log the error
-        print(f"Error creating class session: {str(e)}")
+        logger.error(f"Error creating class session: {str(e)}")
         raise
 
 def update_class_session(db: Session, session_id: int, session: ClassSessionUpdate):
@@ -165,7 +243,12 @@ def update_class_session(db: Session, session_id: int, session: ClassSessionUpda
     for key, value in update_data.items():
         setattr(db_session, key, value)
     
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        _raise_if_start_time_conflict(e)
+        raise
     db.refresh(db_session)
     return db_session
 
@@ -174,6 +257,8 @@ def delete_class_session(db: Session, session_id: int):
     if not db_session:
         return False
     
+    # The session's attendance leaves the rollups in the same transaction as the session
+    remove_from_rollups(db, session_id=session_id)
     db.delete(db_session)
     db.commit()
     return True
\ No newline at end of file
@@ -0,0 +1,112 @@
+import threading
+from typing import Optional
+from sqlalchemy import cast, func
+from sqlalchemy.dialects.postgresql import JSONB, insert
+from sqlalchemy.orm import Session
+from config.app import settings
+from config.face_recognition_config import FaceRecognitionConfig
+from database.db import SessionLocal
+from models.database import FaceRecognitionSettings
+from services.invalidation_bus import publish, subscribe
+from utils.logging import logger
+
+SETTINGS_ROW_ID = 1
+
+# The snapshot every hot path reads; replaced whole, never mutated
+_current: Optional[FaceRecognitionConfig] = None
+_refresh_lock = threading.Lock()
+_poller: Optional[threading.Thread] = None
+_poller_stopping = threading.Event()
+
+def _build(version: int, overrides: dict) -> FaceRecognitionConfig:
+    return FaceRecognitionConfig().with_changes({**overrides, "version": version})
+
+def _stored_version(db: Session) -> int:
+    version = db.query(FaceRecognitionSettings.version).filter(
+        FaceRecognitionSettings.id == SETTINGS_ROW_ID
+    ).scalar()
+    return version or 0
+
+def refresh_face_recognition_config() -> FaceRecognitionConfig:
+    """Reload the snapshot if the stored version changed; only the version is read otherwise."""
+    global _current
+    with _refresh_lock:
+        try:
+            db = SessionLocal()
+            try:
+                version = _stored_version(db)
+                if _current is None or version != _current.version:
+                    overrides = db.query(FaceRecognitionSettings.overrides).filter(
+                        FaceRecognitionSettings.id == SETTINGS_ROW_ID
+                    ).scalar()
+                    _current = _build(version, overrides or {})
+                    logger.info(f"Loaded face recognition config version {version}")
+            finally:
+                db.close()
+        except Exception as e:
+            logger.error(f"Error loading face recognition config: {str(e)}")
+            if _current is None:
+                _current = FaceRecognitionConfig()
+        return _current
+
+def get_face_recognition_config() -> FaceRecognitionConfig:
+    """The current config snapshot. Only the first call in a process touches the database."""
+    config = _current
+    if config is None:
+        config = refresh_face_recognition_config()
+    return config
+
+# Another worker saved a new version
+subscribe("face_recognition_config", lambda payload: refresh_face_recognition_config())
+
+def save_face_recognition_config(db: Session, changes: dict, updated_by: Optional[int] = None) -> FaceRecognitionConfig:
+    """
+    Store config changes as a new version and return the resulting snapshot.
+
+    The changes are validated against the current config first (pydantic
+    ValidationError if invalid). Other workers are notified when the
+    transaction commits and otherwise pick the version up on their next poll.
+    """
+    global _current
+    get_face_recognition_config().with_changes(changes)
+
+    changes_json = cast(changes, JSONB)
+    version, overrides = db.execute(
+        insert(FaceRecognitionSettings).values(
+            id=SETTINGS_ROW_ID, version=1, overrides=changes, updated_by=updated_by
+        ).on_conflict_do_update(
+            index_elements=[FaceRecognitionSettings.id],
+            set_={
+                "version": FaceRecognitionSettings.version + 1,
+                "overrides": FaceRecognitionSettings.overrides.op("||")(changes_json),
+                "updated_by": updated_by,
+                "updated_at": func.now(),
+            }
+        ).returning(FaceRecognitionSettings.version, FaceRecognitionSettings.overrides)
+    ).one()
+
+    publish("face_recognition_config", {"version": version}, db=db)
+    db.commit()
+
+    config = _build(version, overrides)
+    with _refresh_lock:
+        if _current is None or _current.version < version:
+            _current = config
+    return config
+
+def start_face_recognition_config_poller() -> None:
+    """Check the stored version in the background, for notifications that were missed."""
+    global _poller
+    if _poller and _poller.is_alive():
+        return
+
+    def poll():
+        while not _poller_stopping.wait(settings.FACE_RECOGNITION_CONFIG_POLL_SECONDS):
+            refresh_face_recognition_config()
+
+    _poller_stopping.clear()
+    _poller = threading.Thread(target=poll, name="face-config-poller", daemon=True)
+    _poller.start()
+
+def stop_face_recognition_config_poller() -> None:
+    _poller_stopping.set()
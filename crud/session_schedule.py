@@ -0,0 +1,71 @@
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from models.database import ClassSession
+from schemas.class_schema import ClassSessionScheduleCreate
+from crud.class_crud import backfill_absent_attendance
+from datetime import datetime, timedelta
+from typing import List, Set
+import re
+
+WEEKDAY_CODES = {"M": 0, "T": 1, "W": 2, "TH": 3, "F": 4, "SA": 5, "SU": 6}
+WEEKDAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+# Two-letter codes first so "TTh" reads as Tuesday + Thursday
+_WEEKDAY_PATTERN = re.compile(r"Th|Sa|Su|M|T|W|F", re.IGNORECASE)
+
+def parse_weekdays(days: str) -> Set[int]:
+    """Turn weekday letters like "MWF" or "TTh" into weekday numbers (Monday=0)."""
+    compact = re.sub(r"[\s,/]", "", days)
+    tokens = _WEEKDAY_PATTERN.findall(compact)
+    if not tokens or "".join(tokens) != compact:
+        raise ValueError(f"Invalid weekday pattern: {days!r}")
+    return {WEEKDAY_CODES[token.upper()] for token in tokens}
+
+def expand_schedule(schedule: ClassSessionScheduleCreate) -> List[dict]:
+    """List the session rows (without class_id) a recurrence produces, in date order."""
+    weekdays = parse_weekdays(schedule.days)
+    if schedule.end_date < schedule.start_date:
+        raise ValueError("end_date must not be before start_date")
+
+    skip_dates = set(schedule.skip_dates)
+    rows = []
+    day = schedule.start_date
+    while day <= schedule.end_date:
+        if day.weekday() in weekdays and day not in skip_dates:
+            start = datetime.combine(day, schedule.start_time)
+            rows.append({
+                "session_date": datetime.combine(day, datetime.min.time()),
+                "start_time": start,
+                "end_time": start + timedelta(minutes=schedule.duration_minutes),
+                "notes": schedule.notes or f"{WEEKDAY_NAMES[day.weekday()]} session",
+            })
+        day += timedelta(days=1)
+    return rows
+
+def generate_class_sessions(db: Session, class_id: int, schedule: ClassSessionScheduleCreate) -> List[ClassSession]:
+    """
+    Create every session of a weekly recurrence for a class, plus ABSENT rows for the enrolled students.
+
+    Sessions are inserted in one statement and sessions that already exist at the
+    same start time are skipped via ON CONFLICT, so re-running a schedule is safe.
+    Returns only the sessions that were created.
+    """
+    rows = expand_schedule(schedule)
+    if not rows:
+        return []
+
+    created_ids = db.execute(
+        insert(ClassSession).values([{"class_id": class_id, **row} for row in rows]).on_conflict_do_nothing(
+            constraint="uq_class_sessions_class_id_start_time"
+        ).returning(ClassSession.id)
+    ).scalars().all()
+
+    if created_ids:
+        backfill_absent_attendance(db, class_id, session_ids=created_ids)
+    db.commit()
+
+    if not created_ids:
+        return []
+    return db.query(ClassSession).filter(
+        ClassSession.id.in_(created_ids)
+    ).order_by(ClassSession.start_time).all()
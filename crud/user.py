@@ -1,8 +1,11 @@
 from sqlalchemy.orm import Session
 from models.database import User
 from schemas.user import UserCreate, UserUpdate, UserResponse
-from typing import List, Optional
-from security.password import get_password_hash, verify_password
+from typing import Dict, List, Optional
+from security.password import get_password_hash, verify_password, verify_and_update_password_async
+from starlette.concurrency import run_in_threadpool
+from security.auth import invalidate_user_state
+from crud.attendance_rollup import remove_from_rollups
 import datetime
 def get_user(db: Session, user_id: int) -> UserResponse:
     return db.query(User).filter(User.id == user_id).first()
@@ -70,6 +73,7 @@ def update_user(db: Session, user_id: int, user: UserUpdate) -> UserResponse:
     try:
         db.commit()
         db.refresh(db_user)
+        invalidate_user_state(user_id)
         return db_user
     except Exception as e:
         db.rollback()
@@ -82,10 +86,12 @@ def delete_user(db: Session, user_id: int):
         return False
 
     from models.database import Attendance  
+    remove_from_rollups(db, student_id=user_id)
     db.query(Attendance).filter(Attendance.student_id == user_id).delete(synchronize_session=False)
 
     db.delete(db_user)
     db.commit()
+    invalidate_user_state(user_id)
     return True
 
 def authenticate_user(db: Session, username: str, password: str) -> Optional[UserResponse]:
@@ -94,9 +100,29 @@ def authenticate_user(db: Session, username: str, password: str) -> Optional[Use
         return False
     return user
 
+async def authenticate_user_async(db: Session, username: str, password: str) -> Optional[UserResponse]:
+    """Authenticate without blocking the event loop, upgrading the stored hash if its cost changed."""
+    user = await run_in_threadpool(lambda: get_user_by_username(db, username))
+    if not user:
+        return False
+    
+    valid, new_hash = await verify_and_update_password_async(password, user.hashed_password)
+    if not valid:
+        return False
+    
+    if new_hash:
+        user.hashed_password = new_hash
+        await run_in_threadpool(db.commit)
+    return user
+
 # Add these new functions to look up users by student/staff ID
 def get_user_by_student_id(db: Session, student_id: str) -> UserResponse:
     return db.query(User).filter(User.student_id == student_id).first()
 
 def get_user_by_staff_id(db: Session, staff_id: str) -> UserResponse:
-    return db.query(User).filter(User.staff_id == staff_id).first()
\ No newline at end of file
+    return db.query(User).filter(User.staff_id == staff_id).first()
+
+def get_user_ids_by_student_ids(db: Session, student_ids: List[str]) -> Dict[str, int]:
+    """Map school student numbers to user ids in one query; unknown numbers are left out."""
+    rows = db.query(User.student_id, User.id).filter(User.student_id.in_(student_ids)).all()
+    return {student_id: user_id for student_id, user_id in rows}
@@ -1,18 +1,86 @@
+from contextlib import contextmanager
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from config.database import DATABASE_URL
+from sqlalchemy.orm import Session, sessionmaker
+from config.database import DATABASE_URL, ASYNC_DATABASE_URL
+from config.app import settings
+from database.pool_monitor import InstrumentedQueuePool, install_leak_tracking, start_leak_detector
 
 # Create SQLAlchemy engine
-engine = create_engine(DATABASE_URL)
+engine = create_engine(
+    DATABASE_URL,
+    poolclass=InstrumentedQueuePool,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+)
+
+if settings.DB_LEAK_DETECTION:
+    install_leak_tracking(engine)
+    start_leak_detector(settings.DB_LEAK_THRESHOLD_SECONDS)
 
 # Create sessionmaker
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# asyncpg-backed engine for endpoints that await the database instead of blocking the event loop
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+)
+
+# Objects stay usable after commit since async sessions cannot lazy-load expired attributes
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 # Dependency to get DB session
 def get_db():
     db = SessionLocal()
     try:
         yield db
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+# Dependency to get an async DB session
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+        except Exception:
+            await db.rollback()
+            raise
+
+@contextmanager
+def session_scope():
+    """Session for work outside a request: commits on success, rolls back on error, always closes."""
+    db = SessionLocal()
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+def release_connection(db: Session):
+    """
+    End the session's transaction so its connection goes back to the pool.
+    
+    Objects already loaded stay usable without being reloaded, so call this before
+    slow non-database work (e.g. running face models) in the middle of a request.
+    """
+    expire_on_commit = db.expire_on_commit
+    db.expire_on_commit = False
+    try:
+        db.commit()
     finally:
-        db.close()
\ No newline at end of file
+        db.expire_on_commit = expire_on_commit
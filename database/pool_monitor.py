@@ -0,0 +1,142 @@
+import threading
+import time
+import traceback
+from typing import Dict, List
+from sqlalchemy import event
+from sqlalchemy import exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+from utils.logging import logger
+
+# id(connection record) -> (checked out at, stack of the code that checked it out)
+_checked_out: Dict[int, tuple] = {}
+_checked_out_lock = threading.Lock()
+_detector_started = False
+
+class PoolStats:
+    """Counters for connection checkouts and the time spent waiting for a free connection."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.connections_created = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def record_wait(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.total_wait_seconds += seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+
+    def record_connect(self):
+        with self._lock:
+            self.connections_created += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            attempts = self.checkouts + self.timeouts
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "connections_created": self.connections_created,
+                "avg_wait_ms": round(self.total_wait_seconds / attempts * 1000, 3) if attempts else 0.0,
+                "max_wait_ms": round(self.max_wait_seconds * 1000, 3),
+            }
+
+pool_stats = PoolStats()
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that times how long each checkout waits for a connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            pool_stats.record_wait(time.perf_counter() - start, timed_out=True)
+            raise
+        pool_stats.record_wait(time.perf_counter() - start)
+        return connection
+
+    def _create_connection(self):
+        pool_stats.record_connect()
+        return super()._create_connection()
+
+def get_pool_status(engine: Engine) -> dict:
+    """Current pool occupancy plus the checkout counters since startup."""
+    pool = engine.pool
+    status = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update({
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+        })
+    status.update(pool_stats.snapshot())
+    return status
+
+def install_leak_tracking(engine: Engine):
+    """Remember where every pooled connection was checked out until it is returned."""
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        # Drop this frame and SQLAlchemy's own frames to keep the report readable
+        stack = [
+            frame for frame in traceback.extract_stack()[:-1]
+            if "sqlalchemy" not in frame.filename
+        ]
+        with _checked_out_lock:
+            _checked_out[id(connection_record)] = (time.monotonic(), stack)
+
+    @event.listens_for(engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        with _checked_out_lock:
+            _checked_out.pop(id(connection_record), None)
+
+def find_leaked_connections(threshold_seconds: float) -> List[dict]:
+    """Connections that have been checked out of the pool for longer than the threshold."""
+    now = time.monotonic()
+    with _checked_out_lock:
+        held = list(_checked_out.values())
+
+    return [
+        {
+            "held_seconds": round(now - checked_out_at, 1),
+            "checked_out_from": "".join(traceback.format_list(stack[-8:]))
+        }
+        for checked_out_at, stack in held
+        if now - checked_out_at > threshold_seconds
+    ]
+
+def report_leaked_connections(threshold_seconds: float) -> int:
+    """Log every connection held longer than the threshold and return how many there were."""
+    leaks = find_leaked_connections(threshold_seconds)
+    for leak in leaks:
+        logger.warning(
+            f"Connection not returned to the pool after {leak['held_seconds']}s, checked out from:\n"
+            f"{leak['checked_out_from']}"
+        )
+    return len(leaks)
+
+def start_leak_detector(threshold_seconds: float, interval_seconds: float = 30.0):
+    """Periodically report leaked connections from a daemon thread."""
+    global _detector_started
+    if _detector_started:
+        return
+    _detector_started = True
+
+    def _run():
+        while True:
+            time.sleep(interval_seconds)
+            try:
+                report_leaked_connections(threshold_seconds)
+            except Exception as e:
+                logger.error(f"Error checking for leaked connections: {str(e)}")
+
+    threading.Thread(target=_run, name="db-leak-detector", daemon=True).start()
@@ -6,7 +6,9 @@ from sqlalchemy.orm import Session
 from database.db import get_db
 import uvicorn
 from routers import auth, users, classes, attendance
-from routers.admin import dashboard  # Import the admin dashboard router
+from routers.admin import dashboard, face_recognition  # Import the admin routers
+from services.invalidation_bus import get_invalidation_bus
+from crud.face_recognition_config import start_face_recognition_config_poller, stop_face_recognition_config_poller
 
 # Create your FastAPI instance with security scheme
 app = FastAPI(
@@ -42,6 +44,23 @@ app.include_router(
     tags=["Admin"]
 )
 
+app.include_router(
+    face_recognition.router,
+    prefix="/admin",
+    tags=["Admin"]
+)
+
+@app.on_event("startup")
+def start_invalidation_listener():
+    # Config changes and cache evictions from other workers
+    get_invalidation_bus().start()
+    start_face_recognition_config_poller()
+
+@app.on_event("shutdown")
+def stop_invalidation_listener():
+    get_invalidation_bus().stop()
+    stop_face_recognition_config_poller()
+
 @app.get("/")
 def read_root():
     return {"message": "Face Recognition API running"}
@@ -0,0 +1,97 @@
+"""add attendance rollup tables
+
+Revision ID: a1f3c9d27e54
+Revises: cb7694dec59a
+Create Date: 2026-10-18 09:12:41.305118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a1f3c9d27e54'
+down_revision: Union[str, None] = 'cb7694dec59a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('class_attendance_rollups',
+    sa.Column('class_id', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('present_count', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('late_count', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('absent_count', sa.Integer(), nullable=False, server_default='0'),
+    sa.ForeignKeyConstraint(['class_id'], ['classes.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('class_id', 'month')
+    )
+    op.create_index('ix_class_attendance_rollups_month', 'class_attendance_rollups', ['month'], unique=False)
+    op.create_table('student_attendance_rollups',
+    sa.Column('student_id', sa.Integer(), nullable=False),
+    sa.Column('class_id', sa.Integer(), nullable=False),
+    sa.Column('present_count', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('late_count', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('absent_count', sa.Integer(), nullable=False, server_default='0'),
+    sa.ForeignKeyConstraint(['class_id'], ['classes.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['student_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('student_id', 'class_id')
+    )
+    # Backfill from the attendance rows, counting an absence for every enrolled
+    # student and session without one, as the application does
+    op.execute("""
+        WITH effective AS (
+            SELECT a.student_id, a.session_id, a.status
+            FROM attendances a
+            UNION ALL
+            SELECT e.user_id, s.id, 'absent'
+            FROM student_class_association e
+            JOIN class_sessions s ON s.class_id = e.class_id
+            WHERE NOT EXISTS (
+                SELECT 1 FROM attendances a WHERE a.student_id = e.user_id AND a.session_id = s.id
+            )
+        )
+        INSERT INTO class_attendance_rollups (class_id, month, present_count, late_count, absent_count)
+        SELECT s.class_id,
+               date_trunc('month', s.session_date)::date,
+               count(*) FILTER (WHERE lower(a.status) = 'present'),
+               count(*) FILTER (WHERE lower(a.status) = 'late'),
+               count(*) FILTER (WHERE lower(a.status) = 'absent')
+        FROM effective a
+        JOIN class_sessions s ON s.id = a.session_id
+        WHERE s.class_id IS NOT NULL
+        GROUP BY s.class_id, date_trunc('month', s.session_date)::date
+    """)
+    op.execute("""
+        WITH effective AS (
+            SELECT a.student_id, a.session_id, a.status
+            FROM attendances a
+            UNION ALL
+            SELECT e.user_id, s.id, 'absent'
+            FROM student_class_association e
+            JOIN class_sessions s ON s.class_id = e.class_id
+            WHERE NOT EXISTS (
+                SELECT 1 FROM attendances a WHERE a.student_id = e.user_id AND a.session_id = s.id
+            )
+        )
+        INSERT INTO student_attendance_rollups (student_id, class_id, present_count, late_count, absent_count)
+        SELECT a.student_id,
+               s.class_id,
+               count(*) FILTER (WHERE lower(a.status) = 'present'),
+               count(*) FILTER (WHERE lower(a.status) = 'late'),
+               count(*) FILTER (WHERE lower(a.status) = 'absent')
+        FROM effective a
+        JOIN class_sessions s ON s.id = a.session_id
+        WHERE a.student_id IS NOT NULL AND s.class_id IS NOT NULL
+        GROUP BY a.student_id, s.class_id
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('student_attendance_rollups')
+    op.drop_index('ix_class_attendance_rollups_month', table_name='class_attendance_rollups')
+    op.drop_table('class_attendance_rollups')
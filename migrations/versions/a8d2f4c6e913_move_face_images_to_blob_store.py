@@ -0,0 +1,118 @@
+"""move face images to blob store
+
+Revision ID: a8d2f4c6e913
+Revises: f1b6d3a9e720
+Create Date: 2026-10-18 16:05:42.117390
+
+"""
+import hashlib
+import os
+import tempfile
+from typing import Optional, Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a8d2f4c6e913'
+down_revision: Union[str, None] = 'f1b6d3a9e720'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 500
+
+# The local blob store layout as of this revision: <root>/face-images/<aa>/<bb>/<sha256 hex>.
+# Kept here rather than imported so later changes to the blob store cannot alter this migration.
+BLOB_ROOT = os.path.join(os.getenv("BLOB_STORE_PATH", "storage"), "face-images")
+
+
+def _blob_path(key: str) -> str:
+    return os.path.join(BLOB_ROOT, key[:2], key[2:4], key)
+
+
+def _put_blob(data: bytes) -> str:
+    key = hashlib.sha256(data).hexdigest()
+    path = _blob_path(key)
+    if os.path.exists(path):
+        return key
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return key
+
+
+def _get_blob(key: str) -> Optional[bytes]:
+    try:
+        with open(_blob_path(key), "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('face_images', sa.Column('image_key', sa.String(length=64), nullable=True))
+
+    # Copy every image into the blob store; identical crops end up as one file
+    connection = op.get_bind()
+    last_id = 0
+    while True:
+        rows = connection.execute(sa.text(
+            "SELECT id, image_data FROM face_images WHERE id > :last_id ORDER BY id LIMIT :limit"
+        ), {"last_id": last_id, "limit": BATCH_SIZE}).fetchall()
+        if not rows:
+            break
+        for row in rows:
+            connection.execute(sa.text(
+                "UPDATE face_images SET image_key = :key WHERE id = :id"
+            ), {"key": _put_blob(bytes(row.image_data)), "id": row.id})
+        last_id = rows[-1].id
+
+    op.alter_column('face_images', 'image_key', nullable=False)
+    op.create_index(op.f('ix_face_images_image_key'), 'face_images', ['image_key'], unique=False)
+    op.drop_column('face_images', 'image_data')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.add_column('face_images', sa.Column('image_data', sa.LargeBinary(), nullable=True))
+
+    connection = op.get_bind()
+    missing = []
+    last_id = 0
+    while True:
+        rows = connection.execute(sa.text(
+            "SELECT id, image_key FROM face_images WHERE id > :last_id ORDER BY id LIMIT :limit"
+        ), {"last_id": last_id, "limit": BATCH_SIZE}).fetchall()
+        if not rows:
+            break
+        for row in rows:
+            data = _get_blob(row.image_key)
+            if data is None:
+                missing.append(row.id)
+                continue
+            connection.execute(sa.text(
+                "UPDATE face_images SET image_data = :data WHERE id = :id"
+            ), {"data": data, "id": row.id})
+        last_id = rows[-1].id
+
+    if missing:
+        # The rows cannot satisfy NOT NULL without their image; nothing has been changed yet
+        raise RuntimeError(
+            f"Cannot restore image_data for {len(missing)} face_images rows whose blobs are missing "
+            f"from {BLOB_ROOT}: ids {missing}. Point BLOB_STORE_PATH at the blob storage, or "
+            "delete these rows, then downgrade again."
+        )
+
+    op.alter_column('face_images', 'image_data', nullable=False)
+    op.drop_index(op.f('ix_face_images_image_key'), table_name='face_images')
+    op.drop_column('face_images', 'image_key')
@@ -0,0 +1,29 @@
+"""add face image thumbnail key
+
+Revision ID: b3e9a7d15c48
+Revises: a8d2f4c6e913
+Create Date: 2026-10-18 16:48:13.902551
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3e9a7d15c48'
+down_revision: Union[str, None] = 'a8d2f4c6e913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing images get their thumbnail the first time it is requested
+    op.add_column('face_images', sa.Column('thumbnail_key', sa.String(length=64), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('face_images', 'thumbnail_key')
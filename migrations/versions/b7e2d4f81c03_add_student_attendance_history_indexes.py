@@ -0,0 +1,30 @@
+"""add student attendance history indexes
+
+Revision ID: b7e2d4f81c03
+Revises: a1f3c9d27e54
+Create Date: 2026-10-18 10:03:17.552904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e2d4f81c03'
+down_revision: Union[str, None] = 'a1f3c9d27e54'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_attendances_student_id_session_id', 'attendances', ['student_id', 'session_id'], unique=False)
+    op.create_index('ix_class_sessions_class_id_session_date', 'class_sessions', ['class_id', 'session_date'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_class_sessions_class_id_session_date', table_name='class_sessions')
+    op.drop_index('ix_attendances_student_id_session_id', table_name='attendances')
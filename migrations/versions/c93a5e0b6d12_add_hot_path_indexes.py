@@ -0,0 +1,103 @@
+"""add hot path indexes
+
+Revision ID: c93a5e0b6d12
+Revises: b7e2d4f81c03
+Create Date: 2026-10-18 11:26:48.901377
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c93a5e0b6d12'
+down_revision: Union[str, None] = 'b7e2d4f81c03'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Keep a single attendance row per (student, session): prefer rows with a
+    # check-in, then the most recently created one
+    op.execute("""
+        DELETE FROM attendances a
+        USING (
+            SELECT id, row_number() OVER (
+                PARTITION BY student_id, session_id
+                ORDER BY (check_in_time IS NOT NULL) DESC, id DESC
+            ) AS rank
+            FROM attendances
+            WHERE student_id IS NOT NULL AND session_id IS NOT NULL
+        ) ranked
+        WHERE a.id = ranked.id AND ranked.rank > 1
+    """)
+    # Removing duplicates can change the rolled-up counts, so recompute them
+    op.execute("DELETE FROM class_attendance_rollups")
+    op.execute("DELETE FROM student_attendance_rollups")
+    op.execute("""
+        WITH effective AS (
+            SELECT a.student_id, a.session_id, a.status
+            FROM attendances a
+            UNION ALL
+            SELECT e.user_id, s.id, 'absent'
+            FROM student_class_association e
+            JOIN class_sessions s ON s.class_id = e.class_id
+            WHERE NOT EXISTS (
+                SELECT 1 FROM attendances a WHERE a.student_id = e.user_id AND a.session_id = s.id
+            )
+        )
+        INSERT INTO class_attendance_rollups (class_id, month, present_count, late_count, absent_count)
+        SELECT s.class_id,
+               date_trunc('month', s.session_date)::date,
+               count(*) FILTER (WHERE lower(a.status) = 'present'),
+               count(*) FILTER (WHERE lower(a.status) = 'late'),
+               count(*) FILTER (WHERE lower(a.status) = 'absent')
+        FROM effective a
+        JOIN class_sessions s ON s.id = a.session_id
+        WHERE s.class_id IS NOT NULL
+        GROUP BY s.class_id, date_trunc('month', s.session_date)::date
+    """)
+    op.execute("""
+        WITH effective AS (
+            SELECT a.student_id, a.session_id, a.status
+            FROM attendances a
+            UNION ALL
+            SELECT e.user_id, s.id, 'absent'
+            FROM student_class_association e
+            JOIN class_sessions s ON s.class_id = e.class_id
+            WHERE NOT EXISTS (
+                SELECT 1 FROM attendances a WHERE a.student_id = e.user_id AND a.session_id = s.id
+            )
+        )
+        INSERT INTO student_attendance_rollups (student_id, class_id, present_count, late_count, absent_count)
+        SELECT a.student_id,
+               s.class_id,
+               count(*) FILTER (WHERE lower(a.status) = 'present'),
+               count(*) FILTER (WHERE lower(a.status) = 'late'),
+               count(*) FILTER (WHERE lower(a.status) = 'absent')
+        FROM effective a
+        JOIN class_sessions s ON s.id = a.session_id
+        WHERE a.student_id IS NOT NULL AND s.class_id IS NOT NULL
+        GROUP BY a.student_id, s.class_id
+    """)
+
+    # The unique constraint's index replaces the plain (student_id, session_id) index
+    op.drop_index('ix_attendances_student_id_session_id', table_name='attendances')
+    op.create_unique_constraint('uq_attendances_student_id_session_id', 'attendances', ['student_id', 'session_id'])
+    op.create_index(op.f('ix_attendances_session_id'), 'attendances', ['session_id'], unique=False)
+    op.create_index(op.f('ix_classes_teacher_id'), 'classes', ['teacher_id'], unique=False)
+    op.create_index('ix_face_embeddings_user_id_model_type', 'face_embeddings', ['user_id', 'model_type'], unique=False)
+    op.create_index('ix_student_class_association_class_id', 'student_class_association', ['class_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_student_class_association_class_id', table_name='student_class_association')
+    op.drop_index('ix_face_embeddings_user_id_model_type', table_name='face_embeddings')
+    op.drop_index(op.f('ix_classes_teacher_id'), table_name='classes')
+    op.drop_index(op.f('ix_attendances_session_id'), table_name='attendances')
+    op.drop_constraint('uq_attendances_student_id_session_id', 'attendances', type_='unique')
+    op.create_index('ix_attendances_student_id_session_id', 'attendances', ['student_id', 'session_id'], unique=False)
@@ -0,0 +1,109 @@
+"""unique class session start time
+
+Revision ID: e5a8c1f7b294
+Revises: c93a5e0b6d12
+Create Date: 2026-10-18 14:02:37.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a8c1f7b294'
+down_revision: Union[str, None] = 'c93a5e0b6d12'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Fold duplicate sessions (same class and start time) into the oldest one
+    op.execute("""
+        CREATE TEMPORARY TABLE duplicate_sessions ON COMMIT DROP AS
+        SELECT id, min(id) OVER (PARTITION BY class_id, start_time) AS keep_id
+        FROM class_sessions
+        WHERE class_id IS NOT NULL
+    """)
+    op.execute("DELETE FROM duplicate_sessions WHERE id = keep_id")
+    # Move attendance over unless the student already has a row on the kept
+    # session, preferring rows with a check-in
+    op.execute("""
+        DELETE FROM attendances a
+        USING (
+            SELECT a.id, row_number() OVER (
+                PARTITION BY a.student_id, coalesce(d.keep_id, a.session_id)
+                ORDER BY (a.check_in_time IS NOT NULL) DESC, a.id DESC
+            ) AS rank
+            FROM attendances a
+            LEFT JOIN duplicate_sessions d ON d.id = a.session_id
+            WHERE a.session_id IN (SELECT id FROM duplicate_sessions)
+               OR a.session_id IN (SELECT keep_id FROM duplicate_sessions)
+        ) ranked
+        WHERE a.id = ranked.id AND ranked.rank > 1
+    """)
+    op.execute("""
+        UPDATE attendances a SET session_id = d.keep_id
+        FROM duplicate_sessions d
+        WHERE a.session_id = d.id
+    """)
+    op.execute("DELETE FROM class_sessions WHERE id IN (SELECT id FROM duplicate_sessions)")
+
+    # Recompute the rollups for the attendance rows that were dropped
+    op.execute("DELETE FROM class_attendance_rollups")
+    op.execute("DELETE FROM student_attendance_rollups")
+    op.execute("""
+        WITH effective AS (
+            SELECT a.student_id, a.session_id, a.status
+            FROM attendances a
+            UNION ALL
+            SELECT e.user_id, s.id, 'absent'
+            FROM student_class_association e
+            JOIN class_sessions s ON s.class_id = e.class_id
+            WHERE NOT EXISTS (
+                SELECT 1 FROM attendances a WHERE a.student_id = e.user_id AND a.session_id = s.id
+            )
+        )
+        INSERT INTO class_attendance_rollups (class_id, month, present_count, late_count, absent_count)
+        SELECT s.class_id,
+               date_trunc('month', s.session_date)::date,
+               count(*) FILTER (WHERE lower(a.status) = 'present'),
+               count(*) FILTER (WHERE lower(a.status) = 'late'),
+               count(*) FILTER (WHERE lower(a.status) = 'absent')
+        FROM effective a
+        JOIN class_sessions s ON s.id = a.session_id
+        WHERE s.class_id IS NOT NULL
+        GROUP BY s.class_id, date_trunc('month', s.session_date)::date
+    """)
+    op.execute("""
+        WITH effective AS (
+            SELECT a.student_id, a.session_id, a.status
+            FROM attendances a
+            UNION ALL
+            SELECT e.user_id, s.id, 'absent'
+            FROM student_class_association e
+            JOIN class_sessions s ON s.class_id = e.class_id
+            WHERE NOT EXISTS (
+                SELECT 1 FROM attendances a WHERE a.student_id = e.user_id AND a.session_id = s.id
+            )
+        )
+        INSERT INTO student_attendance_rollups (student_id, class_id, present_count, late_count, absent_count)
+        SELECT a.student_id,
+               s.class_id,
+               count(*) FILTER (WHERE lower(a.status) = 'present'),
+               count(*) FILTER (WHERE lower(a.status) = 'late'),
+               count(*) FILTER (WHERE lower(a.status) = 'absent')
+        FROM effective a
+        JOIN class_sessions s ON s.id = a.session_id
+        WHERE a.student_id IS NOT NULL AND s.class_id IS NOT NULL
+        GROUP BY a.student_id, s.class_id
+    """)
+
+    op.create_unique_constraint('uq_class_sessions_class_id_start_time', 'class_sessions', ['class_id', 'start_time'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uq_class_sessions_class_id_start_time', 'class_sessions', type_='unique')
@@ -0,0 +1,48 @@
+"""partition face embeddings by model type
+
+Revision ID: e8b1a4d6c257
+Revises: c4f7e2b9a1d6
+Create Date: 2026-10-18 19:04:12.337815
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8b1a4d6c257'
+down_revision: Union[str, None] = 'c4f7e2b9a1d6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Rows from before model_type existed were made by the default model, DeepFace,
+    # and the seed script labelled its rows with DeepFace's recognition network
+    op.execute("UPDATE face_embeddings SET model_type = 'deepface' WHERE model_type IS NULL OR model_type = 'facenet512'")
+
+    # Anything else cannot be attributed to a model safely, so stop with the values to clean up
+    unknown = op.get_bind().execute(sa.text("""
+        SELECT model_type, count(*) FROM face_embeddings
+        WHERE model_type NOT IN ('insightface', 'deepface')
+        GROUP BY model_type ORDER BY model_type
+    """)).all()
+    if unknown:
+        found = ", ".join(f"{model_type!r} ({count} rows)" for model_type, count in unknown)
+        raise RuntimeError(
+            f"face_embeddings has model_type values other than 'insightface' and 'deepface': {found}. "
+            "Relabel or delete these rows, then run the upgrade again."
+        )
+    op.alter_column('face_embeddings', 'model_type', existing_type=sa.String(), nullable=False)
+    op.create_check_constraint(
+        'ck_face_embeddings_model_type', 'face_embeddings', "model_type IN ('insightface', 'deepface')"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('ck_face_embeddings_model_type', 'face_embeddings', type_='check')
+    op.alter_column('face_embeddings', 'model_type', existing_type=sa.String(), nullable=True)
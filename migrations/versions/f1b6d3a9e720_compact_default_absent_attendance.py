@@ -0,0 +1,49 @@
+"""compact default absent attendance
+
+Revision ID: f1b6d3a9e720
+Revises: e5a8c1f7b294
+Create Date: 2026-10-18 15:21:09.664813
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1b6d3a9e720'
+down_revision: Union[str, None] = 'e5a8c1f7b294'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Untouched ABSENT rows of enrolled students are implied at read time, so drop
+    # them. Rows of students no longer enrolled are kept since nothing implies them.
+    # The rollups already count these absences and stay as they are. Reads treat a
+    # missing row as absent whether or not new absences are stored, so this holds
+    # for every LAZY_ABSENT_ATTENDANCE setting.
+    op.execute("""
+        DELETE FROM attendances a
+        USING class_sessions s, student_class_association e
+        WHERE s.id = a.session_id
+          AND e.class_id = s.class_id
+          AND e.user_id = a.student_id
+          AND lower(a.status) = 'absent'
+          AND a.check_in_time IS NULL
+          AND coalesce(a.late_minutes, 0) = 0
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Store an ABSENT row again for every enrolled student and session without one
+    op.execute("""
+        INSERT INTO attendances (student_id, session_id, status, late_minutes)
+        SELECT e.user_id, s.id, 'absent', 0
+        FROM student_class_association e
+        JOIN class_sessions s ON s.class_id = e.class_id
+        ON CONFLICT ON CONSTRAINT uq_attendances_student_id_session_id DO NOTHING
+    """)
@@ -1,7 +1,8 @@
-from sqlalchemy import Column, Integer, String, LargeBinary, DateTime, ForeignKey, Boolean, Float, Table
+from sqlalchemy import Column, Integer, String, LargeBinary, DateTime, Date, ForeignKey, Boolean, Float, Table, Index, UniqueConstraint, CheckConstraint
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import deferred, relationship
 import uuid
 import enum
 from pgvector.sqlalchemy import Vector
@@ -19,7 +20,8 @@ student_class_association = Table(
     'student_class_association',
     Base.metadata,
     Column('user_id', Integer, ForeignKey('users.id'), primary_key=True),
-    Column('class_id', Integer, ForeignKey('classes.id'), primary_key=True)
+    Column('class_id', Integer, ForeignKey('classes.id'), primary_key=True),
+    Index('ix_student_class_association_class_id', 'class_id')
 )
 
 class User(Base):
@@ -55,7 +57,7 @@ class Class(Base):
     description = Column(String)
     semester = Column(String)
     academic_year = Column(String)
-    teacher_id = Column(Integer, ForeignKey("users.id"))
+    teacher_id = Column(Integer, ForeignKey("users.id"), index=True)
     start_time = Column(DateTime(timezone=True))
     end_time = Column(DateTime(timezone=True))
     location = Column(String)
@@ -81,12 +83,17 @@ class ClassSession(Base):
     class_obj = relationship("Class", back_populates="sessions")
     attendances = relationship("Attendance", back_populates="session", cascade="all, delete")
 
+    __table_args__ = (
+        Index("ix_class_sessions_class_id_session_date", "class_id", "session_date"),
+        UniqueConstraint("class_id", "start_time", name="uq_class_sessions_class_id_start_time"),
+    )
+
 class Attendance(Base):
     __tablename__ = "attendances"
     
     id = Column(Integer, primary_key=True, index=True)
     student_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
-    session_id = Column(Integer, ForeignKey("class_sessions.id", ondelete="CASCADE"))
+    session_id = Column(Integer, ForeignKey("class_sessions.id", ondelete="CASCADE"), index=True)
     status = Column(String, default=AttendanceStatus.ABSENT.value)
     check_in_time = Column(DateTime(timezone=True))
     late_minutes = Column(Integer, default=0)
@@ -96,32 +103,76 @@ class Attendance(Base):
     student = relationship("User", back_populates="attendances")
     session = relationship("ClassSession", back_populates="attendances")
 
+    __table_args__ = (
+        UniqueConstraint("student_id", "session_id", name="uq_attendances_student_id_session_id"),
+    )
+
+class ClassAttendanceRollup(Base):
+    """Per-class, per-month attendance status counts maintained alongside attendances"""
+    __tablename__ = "class_attendance_rollups"
+    
+    class_id = Column(Integer, ForeignKey("classes.id", ondelete="CASCADE"), primary_key=True)
+    month = Column(Date, primary_key=True)  # First day of the month
+    present_count = Column(Integer, nullable=False, default=0)
+    late_count = Column(Integer, nullable=False, default=0)
+    absent_count = Column(Integer, nullable=False, default=0)
+
+class StudentAttendanceRollup(Base):
+    """Per-student, per-class attendance status counts maintained alongside attendances"""
+    __tablename__ = "student_attendance_rollups"
+    
+    student_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    class_id = Column(Integer, ForeignKey("classes.id", ondelete="CASCADE"), primary_key=True)
+    present_count = Column(Integer, nullable=False, default=0)
+    late_count = Column(Integer, nullable=False, default=0)
+    absent_count = Column(Integer, nullable=False, default=0)
+
 class FaceEmbedding(Base):
     __tablename__ = "face_embeddings"
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
-    embedding = Column(Vector(512), nullable=False)  
+    # Only loaded when asked for (undefer) so metadata queries skip the 512-float vector
+    embedding = deferred(Column(Vector(512), nullable=False))
     confidence_score = Column(Float)
     device_id = Column(String, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    model_type = Column(String, index=True)
+    # Partition key for matching: embeddings are only ever compared within one model type
+    model_type = Column(String, nullable=False, index=True)
     registration_group_id = Column(String, index=True)
 
     user = relationship("User", back_populates="face_embeddings")
     face_image = relationship("FaceImage", back_populates="embedding", uselist=False, cascade="all, delete")
 
+    __table_args__ = (
+        Index("ix_face_embeddings_user_id_model_type", "user_id", "model_type"),
+        CheckConstraint("model_type IN ('insightface', 'deepface')", name="ck_face_embeddings_model_type"),
+    )
+
 class FaceImage(Base):
     __tablename__ = "face_images"
     
     id = Column(Integer, primary_key=True, index=True)
     embedding_id = Column(Integer, ForeignKey("face_embeddings.id", ondelete="CASCADE"), unique=True)
-    image_data = Column(LargeBinary, nullable=False)
+    # SHA-256 of the crop in the blob store; identical crops share one stored copy
+    image_key = Column(String(64), nullable=False, index=True)
+    thumbnail_key = Column(String(64), nullable=True)  # WebP thumbnail, made at registration
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationship to face embedding
     embedding = relationship("FaceEmbedding", back_populates="face_image")
 
+class FaceRecognitionSettings(Base):
+    """Stored face recognition config: a single row (id 1) whose version bumps on every change"""
+    __tablename__ = "face_recognition_settings"
+    
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=1)
+    # Fields that differ from the built-in FaceRecognitionConfig defaults
+    overrides = Column(JSONB, nullable=False, default=dict)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    updated_by = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+
 class AuthLog(Base):
     __tablename__ = "auth_logs"
     
@@ -1,7 +1,9 @@
 from fastapi import APIRouter
 from .dashboard import router as dashboard_router
+from .face_recognition import router as face_recognition_router
 # Create main router
 router = APIRouter(prefix="/admin", tags=["Classes"])
 
 # Include sub-routers without prefix to maintain the same URLs
 router.include_router(dashboard_router)
+router.include_router(face_recognition_router)
@@ -1,9 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from database.db import get_db
-from schemas.user import UserResponse
-from security.auth import get_current_active_user
-from models.database import Class, ClassSession, Attendance, User
+from database.db import get_db, engine
+from database.pool_monitor import get_pool_status
+from services.check_in_cache import check_in_cache
+from security.auth import CurrentPrincipal, get_current_active_principal
+from models.database import Class, User, student_class_association
+from crud.attendance_rollup import get_monthly_rollups
 from datetime import datetime, timedelta
 from typing import List, Dict, Any
 
@@ -14,7 +17,7 @@ async def get_dashboard_data(
     startDate: str = None,
     endDate: str = None,
     db: Session = Depends(get_db),
-    current_user: UserResponse = Depends(get_current_active_user)
+    current_user: CurrentPrincipal = Depends(get_current_active_principal)
 ):
     """Get all dashboard data in a single request"""
     if current_user.role != "admin":
@@ -29,39 +32,52 @@ async def get_dashboard_data(
         end_date = datetime.fromisoformat(endDate.replace('Z', '+00:00')) if endDate else None
     except Exception as e:
         print(f"Error parsing dates: {str(e)}")
-        start_date = datetime.now() - timedelta(days=150)  # Default to past 5 months
+        start_date = None
+        end_date = None
+    
+    if end_date is None:
         end_date = datetime.now()
+    if start_date is None:
+        start_date = end_date - timedelta(days=150)  # Default to past 5 months
     
     # Get users data
-    users = db.query(User).all()
+    role_counts = dict(
+        db.query(User.role, func.count(User.id)).group_by(User.role).all()
+    )
     users_data = {
-        "total": len(users),
-        "admins": len([u for u in users if u.role == "admin"]),
-        "teachers": len([u for u in users if u.role == "teacher"]),
-        "students": len([u for u in users if u.role == "student"])
+        "total": sum(role_counts.values()),
+        "admins": role_counts.get("admin", 0),
+        "teachers": role_counts.get("teacher", 0),
+        "students": role_counts.get("student", 0)
     }
     
-    # Get classes with students
-    classes = db.query(Class).all()
-    classes_with_students = []
+    # Get classes with their enrollment counts in one grouped query
+    students_count = func.count(student_class_association.c.user_id).label("students_count")
+    class_rows = db.query(
+        Class.id, Class.name, Class.class_code, students_count
+    ).outerjoin(
+        student_class_association, student_class_association.c.class_id == Class.id
+    ).group_by(Class.id).all()
     
-    for cls in classes:
-        students_count = len(cls.students) if cls.students else 0
-        classes_with_students.append({
-            "id": cls.id,
-            "name": cls.name,
-            "class_code": cls.class_code,
-            "students_count": students_count
-        })
+    classes_with_students = [
+        {
+            "id": row.id,
+            "name": row.name,
+            "class_code": row.class_code,
+            "students_count": row.students_count
+        }
+        for row in class_rows
+    ]
     
     # Get classes with sizes for top classes
-    classes_with_sizes = []
-    for cls in classes:
-        classes_with_sizes.append({
-            "id": cls.id,
-            "name": cls.name or "Unnamed Class",
-            "students": len(cls.students) if cls.students else 0
-        })
+    classes_with_sizes = [
+        {
+            "id": row.id,
+            "name": row.name or "Unnamed Class",
+            "students": row.students_count
+        }
+        for row in class_rows
+    ]
     
     classes_with_sizes.sort(key=lambda x: x["students"], reverse=True)
     classes_with_sizes = classes_with_sizes[:5]  # Top 5 classes
@@ -96,30 +112,15 @@ async def get_dashboard_data(
             "year": month["year"]
         }
     
-    # Process actual attendance data
-    for cls in classes:
-        sessions = db.query(ClassSession).filter(ClassSession.class_id == cls.id).all()
-        
-        for session in sessions:
-            session_date = session.session_date
-            if start_date and session_date < start_date:
-                continue
-            if end_date and session_date > end_date:
-                continue
-                
-            attendance_records = session.attendances
-            month_key = session_date.strftime("%Y-%m")
-            
-            if month_key in attendance_data:
-                for record in attendance_records:
-                    status = record.status.lower()
-                    if status in ["present", "late", "absent"]:
-                        attendance_data[month_key][status] += 1
+    # Read per-month attendance totals from the rollup table
+    for rollup in get_monthly_rollups(db, start_date, end_date):
+        month_key = rollup.month.strftime("%Y-%m")
+        if month_key in attendance_data:
+            attendance_data[month_key]["present"] += rollup.present_count or 0
+            attendance_data[month_key]["late"] += rollup.late_count or 0
+            attendance_data[month_key]["absent"] += rollup.absent_count or 0
     
     for month_key, data in attendance_data.items():
-
-        students_count = len([u for u in users if u.role == "student"])
-        
         activity_data.append({
             "month": month_key,
             "date": data["date"],
@@ -128,7 +129,7 @@ async def get_dashboard_data(
             "late": data["late"],
             "absent": data["absent"],
             "total": data["present"] + data["late"] + data["absent"],
-            "students": students_count,
+            "students": users_data["students"],
             "attendance": data["present"] + data["late"]
         })
     
@@ -139,4 +140,30 @@ async def get_dashboard_data(
         "classes": classes_with_students,
         "classesWithSizes": classes_with_sizes,
         "activityData": activity_data
-    }
\ No newline at end of file
+    }
+
+@router.get("/db-pool")
+async def get_db_pool_status(
+    current_user: CurrentPrincipal = Depends(get_current_active_principal)
+):
+    """Get database connection pool occupancy and checkout wait statistics"""
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    
+    return get_pool_status(engine)
+
+@router.get("/check-in-cache")
+async def get_check_in_cache_stats(
+    current_user: CurrentPrincipal = Depends(get_current_active_principal)
+):
+    """Get hit/miss counters of this worker's check-in result cache"""
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    
+    return check_in_cache.stats()
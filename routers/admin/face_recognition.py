@@ -1,24 +1,36 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from database.db import get_db
-from schemas.user import UserResponse
-from security.auth import get_current_active_user
+from security.auth import CurrentPrincipal, get_current_active_principal
 from typing import Dict, Any
-from pydantic import BaseModel
-from config.face_recognition_config import face_recognition_config, ModelType
+from pydantic import BaseModel, ValidationError
+from starlette.concurrency import run_in_threadpool
+from config.face_recognition_config import ModelType, OPERATION_MODEL_FIELDS
+from crud.face_recognition_config import get_face_recognition_config as get_current_config, save_face_recognition_config
 from utils.logging import logger
 
-router = APIRouter(prefix="/admin", tags=["Admin"])
+router = APIRouter()
 
 class FaceRecognitionConfigUpdate(BaseModel):
     default_model: ModelType = None
     enable_antispoofing: bool = None
     enable_fallback: bool = None
     similarity_threshold: float = None
+    # Per-model thresholds, merged into the stored ones
+    similarity_thresholds: Dict[ModelType, float] = None
+
+def _save_config(db: Session, changes: dict, updated_by: int):
+    try:
+        return save_face_recognition_config(db, changes, updated_by=updated_by)
+    except ValidationError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid face recognition configuration: {e.errors()}"
+        )
 
 @router.get("/face-recognition-config")
 async def get_face_recognition_config(
-    current_user: UserResponse = Depends(get_current_active_user)
+    current_user: CurrentPrincipal = Depends(get_current_active_principal)
 ):
     """Get current face recognition configuration"""
     if current_user.role != "admin":
@@ -27,21 +39,27 @@ async def get_face_recognition_config(
             detail="Only administrators can access face recognition configuration"
         )
     
+    config = get_current_config()
     return {
-        "default_model": face_recognition_config.DEFAULT_MODEL,
-        "enable_antispoofing": face_recognition_config.ENABLE_ANTISPOOFING,
-        "enable_fallback": face_recognition_config.ENABLE_FALLBACK,
-        "similarity_threshold": face_recognition_config.SIMILARITY_THRESHOLD,
+        "version": config.version,
+        "default_model": config.DEFAULT_MODEL,
+        "enable_antispoofing": config.ENABLE_ANTISPOOFING,
+        "enable_fallback": config.ENABLE_FALLBACK,
+        "similarity_threshold": config.SIMILARITY_THRESHOLD,
+        "similarity_thresholds": {
+            model_type: config.get_similarity_threshold(model_type) for model_type in ("insightface", "deepface")
+        },
         "operation_overrides": {
-            "register_face": face_recognition_config.REGISTER_FACE_MODEL,
-            "check_in": face_recognition_config.CHECK_IN_MODEL
+            "register_face": config.REGISTER_FACE_MODEL,
+            "check_in": config.CHECK_IN_MODEL
         }
     }
 
 @router.post("/face-recognition-config")
 async def update_face_recognition_config(
     config_update: FaceRecognitionConfigUpdate,
-    current_user: UserResponse = Depends(get_current_active_user)
+    db: Session = Depends(get_db),
+    current_user: CurrentPrincipal = Depends(get_current_active_principal)
 ):
     """Update face recognition configuration"""
     if current_user.role != "admin":
@@ -51,28 +69,40 @@ async def update_face_recognition_config(
         )
     
     # Update only the provided fields
+    changes = {}
     if config_update.default_model is not None:
-        face_recognition_config.update_default_model(config_update.default_model)
+        changes["DEFAULT_MODEL"] = config_update.default_model
     
     if config_update.enable_antispoofing is not None:
-        face_recognition_config.ENABLE_ANTISPOOFING = config_update.enable_antispoofing
+        changes["ENABLE_ANTISPOOFING"] = config_update.enable_antispoofing
         logger.info(f"Anti-spoofing {'enabled' if config_update.enable_antispoofing else 'disabled'}")
     
     if config_update.enable_fallback is not None:
-        face_recognition_config.ENABLE_FALLBACK = config_update.enable_fallback
+        changes["ENABLE_FALLBACK"] = config_update.enable_fallback
         logger.info(f"Fallback {'enabled' if config_update.enable_fallback else 'disabled'}")
     
     if config_update.similarity_threshold is not None:
-        face_recognition_config.SIMILARITY_THRESHOLD = config_update.similarity_threshold
+        changes["SIMILARITY_THRESHOLD"] = config_update.similarity_threshold
         logger.info(f"Similarity threshold updated to {config_update.similarity_threshold}")
     
-    return {"message": "Face recognition configuration updated successfully"}
+    if config_update.similarity_thresholds:
+        changes["SIMILARITY_THRESHOLDS"] = {
+            **get_current_config().SIMILARITY_THRESHOLDS, **config_update.similarity_thresholds
+        }
+        logger.info(f"Per-model similarity thresholds updated: {config_update.similarity_thresholds}")
+    
+    if not changes:
+        return {"message": "Face recognition configuration updated successfully", "version": get_current_config().version}
+    
+    config = await run_in_threadpool(_save_config, db, changes, current_user.id)
+    return {"message": "Face recognition configuration updated successfully", "version": config.version}
 
 @router.post("/face-recognition-config/operation-override")
 async def set_operation_specific_model(
     operation: str,
     model: ModelType = None,  # None means use default
-    current_user: UserResponse = Depends(get_current_active_user)
+    db: Session = Depends(get_db),
+    current_user: CurrentPrincipal = Depends(get_current_active_principal)
 ):
     """Set model override for specific operation"""
     if current_user.role != "admin":
@@ -82,16 +112,14 @@ async def set_operation_specific_model(
         )
     
     # Validate operation
-    valid_operations = ["register_face", "check_in"]
-    if operation not in valid_operations:
+    if operation not in OPERATION_MODEL_FIELDS:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Invalid operation. Valid operations are: {', '.join(valid_operations)}"
+            detail=f"Invalid operation. Valid operations are: {', '.join(OPERATION_MODEL_FIELDS)}"
         )
     
     # Set the override
-    override_attr = f"{operation.upper()}_MODEL"
-    setattr(face_recognition_config, override_attr, model)
+    await run_in_threadpool(_save_config, db, {OPERATION_MODEL_FIELDS[operation]: model}, current_user.id)
     
     if model is None:
         logger.info(f"Removed model override for {operation}, will use default")
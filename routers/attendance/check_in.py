@@ -1,15 +1,23 @@
 from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, status, BackgroundTasks
-from sqlalchemy.orm import Session
-from database.db import get_db
+from sqlalchemy import exists, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.db import get_async_db, session_scope
 from services.face_recognition import FaceRecognitionService
-from schemas.user import UserResponse
-from security.auth import get_current_active_user
-from models.database import ClassSession, Attendance, User, AttendanceStatus
+from services.face_recognition.dual_model import extract_dual_embeddings, other_model
+from security.auth import CurrentPrincipal, get_current_active_principal
+from models.database import Class, AttendanceStatus
 from datetime import datetime, timezone
 from starlette.concurrency import run_in_threadpool
 from utils.logging import logger
-from config.face_recognition_config import face_recognition_config
+from config.face_recognition_config import FaceRecognitionConfig
+from crud.face_recognition_config import get_face_recognition_config
 from pydantic import BaseModel
+from typing import Tuple
+from crud.attendance import upsert_attendance_async
+from crud.async_class_crud import get_session, is_student_enrolled
+from crud.async_user import get_user
+from config.app import settings
+from services.check_in_cache import ProbeExtraction, check_in_cache
 
 router = APIRouter()
 
@@ -17,58 +25,36 @@ class AttendanceUpdateRequest(BaseModel):
     status: str
     late_minutes: int = 0
 
-@router.post("/check-in")
-async def check_in(
-    session_id: int,
-    file: UploadFile = File(...),
-    model: str = None,
-    try_both_models: bool = False,
-    background_tasks: BackgroundTasks = None,
-    db: Session = Depends(get_db),
-    current_user: UserResponse = Depends(get_current_active_user)
-):
-    if model is None:
-        model = face_recognition_config.get_model_for_operation("check_in")
-    
-    if model not in ["insightface", "deepface"]:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid model selection. Choose 'insightface' or 'deepface'"
-        )
-    
-    if model == "deepface":
-        try:
-            import deepface
-        except ImportError:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="DeepFace model is not installed on the server. Please contact administrator."
-            )
-    
-    session = db.query(ClassSession).filter(ClassSession.id == session_id).first()
-    
-    if not session:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Class session not found"
-        )
-    
-    image_data = await file.read()
-    
+def _compare_face(face_service, embedding, **kwargs):
+    """Run a gallery comparison on its own short-lived sync session (the model services are sync)."""
+    with session_scope() as sync_db:
+        return face_service.compare_face(embedding, sync_db, **kwargs)
+
+async def _extract_probe(image_data: bytes, model: str, try_both_models: bool, config: FaceRecognitionConfig) -> ProbeExtraction:
+    """Detect, check and embed the face in an upload; HTTPException if there is no usable face."""
     face_service = FaceRecognitionService.get_instance(model_type=model)
     processed_image = await run_in_threadpool(
         lambda: face_service.preprocess_image(image_data)
     )
     
-    result = await run_in_threadpool(
-        lambda: face_service.extract_face_embedding(processed_image, check_spoofing=face_recognition_config.ENABLE_ANTISPOOFING)
-    )
-    
-    if len(result) == 3:
-        embedding, confidence, aligned_face = result
-        spoof_result = None
+    embeddings = {}
+    if try_both_models:
+        # One detection and anti-spoofing pass; both networks embed the same face concurrently
+        detected, embeddings, spoof_result = await run_in_threadpool(
+            lambda: extract_dual_embeddings(model, processed_image, check_spoofing=config.ENABLE_ANTISPOOFING)
+        )
+        embedding = embeddings.get(model)
     else:
-        embedding, confidence, aligned_face, spoof_result = result
+        result = await run_in_threadpool(
+            lambda: face_service.extract_face_embedding(processed_image, check_spoofing=config.ENABLE_ANTISPOOFING)
+        )
+        
+        if len(result) == 3:
+            embedding, confidence, aligned_face = result
+            spoof_result = None
+        else:
+            embedding, confidence, aligned_face, spoof_result = result
+        embeddings = {model: embedding}
     
     # Handle face detection errors
     if embedding is None:
@@ -102,38 +88,35 @@ async def check_in(
                 detail="No face detected in the image. Please try with a clearer photo showing your full face."
             )
     
-    # Continue with face matching
+    return ProbeExtraction(embeddings={
+        model_type: vector for model_type, vector in embeddings.items() if vector is not None
+    })
+
+async def _match_probe(probe: ProbeExtraction, model: str, try_both_models: bool, class_id: int, config: FaceRecognitionConfig) -> Tuple[str, int, float]:
+    """Match probe embeddings against the class's current galleries; (model, user id, similarity) or a 401."""
+    face_service = FaceRecognitionService.get_instance(model_type=model)
+    embedding = probe.embeddings[model]
     match, matched_user_id, similarity = await run_in_threadpool(
-        lambda: face_service.compare_face(embedding=embedding, db=db, class_id=session.class_id, 
-                                         threshold=face_recognition_config.SIMILARITY_THRESHOLD)
+        lambda: _compare_face(face_service, embedding, class_id=class_id,
+                              threshold=config.get_similarity_threshold(model))
     )
     
     if not match and try_both_models:
-        other_model = "insightface" if model == "deepface" else "deepface"
-        logger.info(f"No match found with {model}, trying {other_model}")
+        fallback_model = other_model(model)
+        logger.info(f"No match found with {model}, trying {fallback_model}")
         
-        other_service = FaceRecognitionService.get_instance(model_type=other_model)
-        result = await run_in_threadpool(
-            lambda: other_service.extract_face_embedding(processed_image)
-        )
-        
-        if len(result) == 3:
-            other_embedding, other_confidence, _ = result
-        else:
-            other_embedding, other_confidence, _, _ = result
+        other_service = FaceRecognitionService.get_instance(model_type=fallback_model)
+        other_embedding = probe.embeddings.get(fallback_model)
         
         if other_embedding is not None:
             match, matched_user_id, similarity = await run_in_threadpool(
-                lambda: other_service.compare_face(other_embedding, db, user_id=None,
-                                                 threshold=face_recognition_config.SIMILARITY_THRESHOLD)
+                lambda: _compare_face(other_service, other_embedding, class_id=class_id,
+                                      threshold=config.get_similarity_threshold(fallback_model))
             )
             
             if match:
-                logger.info(f"Match found with alternate model {other_model}, similarity: {similarity:.2f}")
-                model = other_model
-                face_service = other_service
-                embedding = other_embedding
-                confidence = other_confidence
+                logger.info(f"Match found with alternate model {fallback_model}, similarity: {similarity:.2f}")
+                model = fallback_model
         
     if not match:
         raise HTTPException(
@@ -141,11 +124,77 @@ async def check_in(
             detail=f"Face verification failed. No matching user found (best similarity: {similarity:.2f})."
         )
     
-    # Rest of the endpoint remains the same...
-    # [Continue with existing code for user verification, attendance recording, etc.]
+    return model, matched_user_id, similarity
+
+@router.post("/check-in")
+async def check_in(
+    session_id: int,
+    file: UploadFile = File(...),
+    model: str = None,
+    try_both_models: bool = False,
+    background_tasks: BackgroundTasks = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentPrincipal = Depends(get_current_active_principal)
+):
+    config = get_face_recognition_config()
+    if model is None:
+        model = config.get_model_for_operation("check_in")
+    
+    if model not in ["insightface", "deepface"]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid model selection. Choose 'insightface' or 'deepface'"
+        )
+    
+    if model == "deepface":
+        try:
+            import deepface
+        except ImportError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="DeepFace model is not installed on the server. Please contact administrator."
+            )
+    
+    session = await get_session(db, session_id)
+    
+    if not session:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Class session not found"
+        )
+    
+    # Hand the connection back to the pool while the face models run
+    await db.commit()
+    
+    image_data = await file.read()
+    
+    # Resubmissions of the same upload reuse the earlier extraction; matching always runs
+    # against the current galleries so newly registered or deleted faces count at once
+    cache_key = check_in_cache.key_for(image_data, model, session_id, try_both_models, config.version)
+    probe = check_in_cache.get(cache_key) if settings.CHECK_IN_RESULT_CACHE else None
+    if probe is not None and settings.CHECK_IN_REJECT_REPLAYS and check_in_cache.checked_in(cache_key):
+        check_in_cache.record_rejected_replay()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="This photo was already submitted for this session. Please take a new photo."
+        )
+    
+    if probe is None:
+        try:
+            probe = await _extract_probe(image_data, model, try_both_models, config)
+        except HTTPException as e:
+            # Only detection errors end up here, and they depend on the image alone
+            probe = ProbeExtraction(error_status=e.status_code, error_detail=e.detail)
+        if settings.CHECK_IN_RESULT_CACHE:
+            check_in_cache.put(cache_key, probe)
+    
+    if probe.error_status is not None:
+        raise HTTPException(status_code=probe.error_status, detail=probe.error_detail)
+    
+    model, matched_user_id, similarity = await _match_probe(probe, model, try_both_models, session.class_id, config)
     
     # Now get the student user who matched
-    student_user = db.query(User).filter(User.id == matched_user_id).first()
+    student_user = await get_user(db, matched_user_id)
     if not student_user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -153,7 +202,7 @@ async def check_in(
         )
     
     # Check if the matched student has access to this class
-    student_has_access = any(c.id == session.class_id for c in student_user.classes)
+    student_has_access = await is_student_enrolled(db, session.class_id, matched_user_id)
     
     # Admin can check in any student, teacher can check in their students
     allowed_to_check_in = False
@@ -168,8 +217,10 @@ async def check_in(
             logger.info(f"Admin {current_user.id} checking in non-enrolled student {matched_user_id} to class {session.class_id}")
     elif current_user.role == "teacher":
         # Teachers can check in students for classes they teach (student must be enrolled)
-        teacher = db.query(User).filter(User.id == current_user.id).first()
-        teaches_class = any(c.id == session.class_id for c in teacher.teaching_classes)
+        teaches_class = await db.scalar(select(exists().where(
+            Class.id == session.class_id,
+            Class.teacher_id == current_user.id
+        )))
         allowed_to_check_in = teaches_class and student_has_access
     
     if not allowed_to_check_in:
@@ -184,12 +235,6 @@ async def check_in(
             detail=detail
         )
     
-    # Check if attendance record already exists
-    existing_attendance = db.query(Attendance).filter(
-        Attendance.student_id == matched_user_id,
-        Attendance.session_id == session_id
-    ).first()
-    
     now = datetime.now(timezone.utc)
     # Calculate late minutes if student is late
     late_minutes = 0
@@ -201,41 +246,19 @@ async def check_in(
         if late_minutes > 0:
             attendance_status = AttendanceStatus.LATE.value
 
-    if existing_attendance:
-        # Update existing attendance
-        existing_attendance.status = attendance_status
-        existing_attendance.check_in_time = now
-        existing_attendance.late_minutes = late_minutes
-    else:
-        # Create new attendance record
-        attendance = Attendance(
-            student_id=matched_user_id,
-            session_id=session_id,
-            status=attendance_status,
-            check_in_time=now,
-            late_minutes=late_minutes
-        )
-        db.add(attendance)
-    
-    # # Optionally store this new face to improve recognition if it's the student's own face
-    # if match and similarity < 0.85 and similarity > 0.65 and current_user.id == matched_user_id:
-    #     embeddings_count = await run_in_threadpool(
-    #         lambda: face_service.get_user_embeddings_count(db, matched_user_id)
-    #     )
-        
-    #     if embeddings_count < 10 and background_tasks:
-    #         background_tasks.add_task(
-    #             face_service.store_face_embedding,
-    #             db=db, 
-    #             user_id=matched_user_id,
-    #             embedding=embedding,
-    #             confidence=confidence,
-    #             device_id="auto_update"
-    #         )
+    # Insert or update the attendance row in one statement
+    await upsert_attendance_async(
+        db, session, matched_user_id, attendance_status,
+        late_minutes=late_minutes, check_in_time=now
+    )
     
-    db.commit()
+    await db.commit()
+    if settings.CHECK_IN_RESULT_CACHE:
+        check_in_cache.mark_checked_in(cache_key)
     
-    class_info = session.class_obj
+    class_info = await db.get(Class, session.class_id)
+    # The principal carries no display name, so load it only when it is shown
+    admin_user = await get_user(db, current_user.id) if current_user.id != matched_user_id else None
 
     return {
         "message": "Attendance recorded successfully",
@@ -244,7 +267,7 @@ async def check_in(
         "face_match_confidence": similarity,
         "admin_user": {
             "id": current_user.id,
-            "name": current_user.full_name,
+            "name": admin_user.full_name if admin_user else None,
             "username": current_user.username,
             "role": current_user.role
         } if current_user.id != matched_user_id else None,
@@ -274,8 +297,8 @@ async def manual_update_attendance(
     session_id: int,
     student_id: int,
     data: AttendanceUpdateRequest,
-    db: Session = Depends(get_db),
-    current_user: UserResponse = Depends(get_current_active_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentPrincipal = Depends(get_current_active_principal)
 ):
     status = data.status
     late_minutes = data.late_minutes
@@ -283,25 +306,14 @@ async def manual_update_attendance(
     if current_user.role not in ("admin", "teacher"):
         raise HTTPException(status_code=403, detail="Not authorized")
 
-    attendance = db.query(Attendance).filter_by(
-        session_id=session_id, student_id=student_id
-    ).first()
-    if not attendance:
-        # Create a new attendance record if not found
-        attendance = Attendance(
-            session_id=session_id,
-            student_id=student_id,
-            status=status,
-            late_minutes=late_minutes,
-            check_in_time=None  # or datetime.now() if you want
-        )
-        db.add(attendance)
-    else:
-        attendance.status = status
-        attendance.late_minutes = late_minutes
+    session = await get_session(db, session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Class session not found")
 
-    db.commit()
-    db.refresh(attendance)
+    attendance = await upsert_attendance_async(
+        db, session, student_id, status, late_minutes=late_minutes
+    )
+    await db.commit()
     return {"success": True, "attendance": {
         "student_id": attendance.student_id,
         "session_id": attendance.session_id,
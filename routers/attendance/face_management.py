@@ -1,17 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, status
+from fastapi import APIRouter, Depends, HTTPException, File, Header, Query, Request, Response, UploadFile, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from database.db import get_db
 from services.face_recognition import FaceRecognitionService
-from schemas.user import UserResponse
-from security.auth import get_current_active_user
+from security.auth import CurrentPrincipal, get_current_active_principal
 from models.database import FaceEmbedding, FaceImage, User
+from sqlalchemy import String, cast, func, literal
+from sqlalchemy.dialects.postgresql import aggregate_order_by, array_agg
 from starlette.concurrency import run_in_threadpool
 import base64
 from typing import Dict, List, Optional, Tuple
 import numpy as np
 from utils.logging import logger
-from config.face_recognition_config import face_recognition_config
+from config.app import settings
+from crud.face_recognition_config import get_face_recognition_config
 from services.face_recognition.duplicate_detection import DuplicateFaceDetector
+from services.face_recognition.dual_model import extract_dual_embeddings, other_model
+from services.face_recognition.gallery_snapshot import remove_from_snapshot
+from services.blob_store import get_blob_store
+from services.face_images import store_face_crop, make_thumbnail, FULL_MEDIA_TYPE, THUMBNAIL_MEDIA_TYPE
 import uuid
 
 router = APIRouter()
@@ -23,10 +30,11 @@ async def register_face(
     model: str = None,
     store_both_models: bool = False,
     db: Session = Depends(get_db),
-    current_user: UserResponse = Depends(get_current_active_user)
+    current_user: CurrentPrincipal = Depends(get_current_active_principal)
 ):
+    config = get_face_recognition_config()
     if model is None:
-        model = face_recognition_config.get_model_for_operation("register_face")
+        model = config.get_model_for_operation("register_face")
     
     if model not in ["insightface", "deepface"]:
         raise HTTPException(
@@ -43,19 +51,33 @@ async def register_face(
         lambda: face_service.preprocess_image(image_data)
     )
     
-    result = await run_in_threadpool(
-        lambda: face_service.extract_face_embedding(
-            processed_image, 
-            check_spoofing=face_recognition_config.ENABLE_REGISTRATION_ANTISPOOFING
+    embeddings = {}
+    if store_both_models:
+        # One detection and anti-spoofing pass; both networks embed the same face concurrently
+        detected, embeddings, spoof_result = await run_in_threadpool(
+            lambda: extract_dual_embeddings(
+                model, processed_image, check_spoofing=config.ENABLE_REGISTRATION_ANTISPOOFING
+            )
         )
-    )
-    
-    # Handle both 3-value and 4-value returns for backward compatibility
-    if len(result) == 3:
-        embedding_primary, confidence_primary, aligned_face_primary = result
-        spoof_result = None
+        embedding_primary = embeddings.get(model)
+        confidence_primary = detected.confidence if detected else 0.0
+        aligned_face_primary = detected.aligned_face if detected else None
+        if detected:
+            spoof_result = detected.spoof_result
     else:
-        embedding_primary, confidence_primary, aligned_face_primary, spoof_result = result
+        result = await run_in_threadpool(
+            lambda: face_service.extract_face_embedding(
+                processed_image, 
+                check_spoofing=config.ENABLE_REGISTRATION_ANTISPOOFING
+            )
+        )
+        
+        # Handle both 3-value and 4-value returns for backward compatibility
+        if len(result) == 3:
+            embedding_primary, confidence_primary, aligned_face_primary = result
+            spoof_result = None
+        else:
+            embedding_primary, confidence_primary, aligned_face_primary, spoof_result = result
     
     # Check for spoofing or incomplete face
     if spoof_result:
@@ -77,9 +99,10 @@ async def register_face(
             detail="No face detected in the image. Please try with a clearer photo showing your full face."
         )
     
-    if face_recognition_config.ENABLE_DUPLICATE_DETECTION:
+    if config.ENABLE_DUPLICATE_DETECTION:
         is_duplicate, duplicate_info = await DuplicateFaceDetector.check_for_duplicates(
             embedding_primary, 
+            model,
             current_user_id=current_user.id
         )
         
@@ -99,11 +122,22 @@ async def register_face(
         )
     )
     
-    if aligned_face_primary and embedding_id_primary:
+    # The crop and its thumbnail are stored once and shared by the primary and secondary embeddings
+    image_key, thumbnail_key = None, None
+    if aligned_face_primary:
+        try:
+            image_key, thumbnail_key = await run_in_threadpool(
+                lambda: store_face_crop(aligned_face_primary)
+            )
+        except Exception as e:
+            logger.error(f"Error storing face image: {str(e)}")
+    
+    if image_key and embedding_id_primary:
         try:
             face_image = FaceImage(
                 embedding_id=embedding_id_primary,
-                image_data=aligned_face_primary
+                image_key=image_key,
+                thumbnail_key=thumbnail_key
             )
             db.add(face_image)
             db.commit()
@@ -114,46 +148,39 @@ async def register_face(
     embedding_id_secondary = None
     
     if store_both_models:
-        # Get the other model
-        other_model = "insightface" if model == "deepface" else "deepface"
+        secondary_model = other_model(model)
         
         try:
-            # Process with secondary model
-            secondary_service = FaceRecognitionService.get_instance(model_type=other_model)
-            result = await run_in_threadpool(
-                lambda: secondary_service.extract_face_embedding(processed_image)
-            )
-            
-            # Handle different return formats
-            if len(result) == 3:
-                embedding_secondary, confidence_secondary, _ = result
-            else:
-                embedding_secondary, confidence_secondary, _, _ = result
+            secondary_service = FaceRecognitionService.get_instance(model_type=secondary_model)
+            # Embedded from the same detection as the primary
+            embedding_secondary = embeddings.get(secondary_model)
+            confidence_secondary = confidence_primary
             
             if embedding_secondary is not None:
                 # Store the secondary embedding with the same group ID
                 embedding_id_secondary = await run_in_threadpool(
                     lambda: secondary_service.store_face_embedding(
                         db, current_user.id, embedding_secondary, confidence_secondary, 
-                        f"{device_id}_auto_{other_model}", other_model, registration_group_id
+                        f"{device_id}_auto_{secondary_model}", secondary_model, registration_group_id
                     )
                 )
                 
                 # Also store the face image for the secondary embedding
-                if aligned_face_primary and embedding_id_secondary:
+                if image_key and embedding_id_secondary:
                     try:
                         secondary_face_image = FaceImage(
                             embedding_id=embedding_id_secondary,
-                            image_data=aligned_face_primary
+                            image_key=image_key,
+                            thumbnail_key=thumbnail_key
                         )
                         db.add(secondary_face_image)
                         db.commit()
                     except Exception as e:
                         logger.error(f"Error storing face image for secondary model: {str(e)}")
                 
-                logger.info(f"Successfully stored secondary embedding with {other_model}")
+                logger.info(f"Successfully stored secondary embedding with {secondary_model}")
         except Exception as e:
-            logger.error(f"Error processing with secondary model {other_model}: {str(e)}")
+            logger.error(f"Error processing with secondary model {secondary_model}: {str(e)}")
     
     # Get total embeddings count
     embeddings_count = await run_in_threadpool(
@@ -179,53 +206,54 @@ async def register_face(
 
 @router.get("/my-faces", response_model=Dict)
 async def get_my_faces(
+    request: Request,
     db: Session = Depends(get_db),
-    current_user: UserResponse = Depends(get_current_active_user)
+    current_user: CurrentPrincipal = Depends(get_current_active_principal)
 ):
     """Get information about registered faces for the current user, grouping by registration."""
-    embeddings = db.query(FaceEmbedding).filter(
+    # Embeddings without a registration group form a group of their own
+    group_key = func.coalesce(
+        FaceEmbedding.registration_group_id, literal("single_") + cast(FaceEmbedding.id, String)
+    )
+    newest_first = (FaceEmbedding.created_at.desc(), FaceEmbedding.id.desc())
+    
+    # One row per registration: metadata of its newest embedding, every model in it,
+    # and the newest embedding that has a stored image (rows without one sort last)
+    groups = db.query(
+        array_agg(aggregate_order_by(FaceEmbedding.id, *newest_first))[1].label("id"),
+        func.max(FaceEmbedding.created_at).label("created_at"),
+        array_agg(aggregate_order_by(FaceEmbedding.device_id, *newest_first))[1].label("device_id"),
+        array_agg(aggregate_order_by(FaceEmbedding.confidence_score, *newest_first))[1].label("confidence"),
+        array_agg(aggregate_order_by(FaceEmbedding.model_type, *newest_first)).label("models"),
+        array_agg(aggregate_order_by(
+            FaceImage.embedding_id, FaceImage.id.is_(None), *newest_first
+        ))[1].label("image_embedding_id")
+    ).outerjoin(
+        FaceImage, FaceImage.embedding_id == FaceEmbedding.id
+    ).filter(
         FaceEmbedding.user_id == current_user.id
-    ).order_by(FaceEmbedding.created_at.desc()).all()
-    
-    grouped_embeddings = {}
-    
-    for emb in embeddings:
-        # Check if this embedding has a registration group
-        group_id = getattr(emb, 'registration_group_id', None)
-        
-        # If no group ID, use the embedding ID as a unique identifier
-        if not group_id:
-            group_id = f"single_{emb.id}"
-        
-        # Initialize group if not exists
-        if group_id not in grouped_embeddings:
-            grouped_embeddings[group_id] = {
-                "id": emb.id,  # Use the ID of the first embedding found
-                "created_at": emb.created_at,
-                "device_id": emb.device_id.split('_auto_')[0] if '_auto_' in emb.device_id else emb.device_id,
-                "confidence": emb.confidence_score,
-                "models": [],
-                "image": None
-            }
+    ).group_by(group_key).order_by(func.max(FaceEmbedding.created_at).desc()).all()
+    
+    result_faces = []
+    for group in groups:
+        device_id = group.device_id
+        face = {
+            "id": group.id,
+            "created_at": group.created_at,
+            "device_id": device_id.split('_auto_')[0] if device_id and '_auto_' in device_id else device_id,
+            "confidence": group.confidence,
+            "models": [model_type or "unknown" for model_type in group.models],
+            "image_url": None,
+            "thumbnail_url": None
+        }
         
-        # Add this model to the group's models list
-        model_type = getattr(emb, 'model_type', 'unknown')
-        grouped_embeddings[group_id]["models"].append(model_type)
+        # Point at the face image endpoint instead of inlining the bytes
+        if group.image_embedding_id is not None:
+            image_url = request.url_for("get_face_image", embedding_id=group.image_embedding_id)
+            face["image_url"] = str(image_url)
+            face["thumbnail_url"] = str(image_url.include_query_params(size="thumbnail"))
         
-        # Try to get the face image if we don't have one yet
-        if not grouped_embeddings[group_id]["image"]:
-            try:
-                # Check if this embedding has an associated image
-                if hasattr(emb, 'face_image') and emb.face_image and emb.face_image.image_data:
-                    grouped_embeddings[group_id]["image"] = base64.b64encode(emb.face_image.image_data).decode('utf-8')
-            except Exception as e:
-                logger.error(f"Error retrieving face image for embedding {emb.id}: {str(e)}")
-    
-    # Convert the grouped dictionary to a list
-    result_faces = list(grouped_embeddings.values())
-    
-    # Sort by created_at (newest first)
-    result_faces.sort(key=lambda x: x["created_at"], reverse=True)
+        result_faces.append(face)
     
     return {
         "count": len(result_faces),
@@ -236,11 +264,11 @@ async def get_my_faces(
 async def delete_face(
     embedding_id: int,
     db: Session = Depends(get_db),
-    current_user: UserResponse = Depends(get_current_active_user)
+    current_user: CurrentPrincipal = Depends(get_current_active_principal)
 ):
     """Delete all face embeddings from the same registration group."""
 
-    embedding = db.query(FaceEmbedding).filter(
+    embedding = db.query(FaceEmbedding.id, FaceEmbedding.registration_group_id).filter(
         FaceEmbedding.id == embedding_id,
         FaceEmbedding.user_id == current_user.id
     ).first()
@@ -251,33 +279,39 @@ async def delete_face(
             detail="Face embedding not found"
         )
     
-    has_group_id = hasattr(embedding, 'registration_group_id') and embedding.registration_group_id
-    
-    if has_group_id:
-        embeddings_to_delete = db.query(FaceEmbedding).filter(
-            FaceEmbedding.registration_group_id == embedding.registration_group_id,
-            FaceEmbedding.user_id == current_user.id
-        ).all()
-        
-        for emb in embeddings_to_delete:
-            db.delete(emb)
+    # Face images go with their embeddings through the ON DELETE CASCADE foreign key
+    query = db.query(FaceEmbedding).filter(FaceEmbedding.user_id == current_user.id)
+    if embedding.registration_group_id:
+        query = query.filter(FaceEmbedding.registration_group_id == embedding.registration_group_id)
     else:
         # If no group ID (legacy data), just delete the single embedding
-        db.delete(embedding)
+        query = query.filter(FaceEmbedding.id == embedding.id)
+    deleted_ids = [row.id for row in query.with_entities(FaceEmbedding.id).all()]
+    query.delete(synchronize_session=False)
     
     db.commit()
     
+    if settings.GALLERY_SNAPSHOTS:
+        await run_in_threadpool(lambda: remove_from_snapshot(deleted_ids))
+    
     return {"message": "Face embedding(s) deleted successfully"}
 
 @router.get("/faces/{embedding_id}", response_model=dict)
 async def get_face_details(
     embedding_id: int,
     db: Session = Depends(get_db),
-    current_user: UserResponse = Depends(get_current_active_user)
+    current_user: CurrentPrincipal = Depends(get_current_active_principal)
 ):
     """Get details of a specific face embedding."""
     # First check if the user is an admin or the owner of this embedding
-    embedding = db.query(FaceEmbedding).filter(FaceEmbedding.id == embedding_id).first()
+    embedding = db.query(
+        FaceEmbedding.id,
+        FaceEmbedding.user_id,
+        FaceEmbedding.confidence_score,
+        FaceEmbedding.device_id,
+        FaceEmbedding.created_at,
+        User.username
+    ).outerjoin(User, User.id == FaceEmbedding.user_id).filter(FaceEmbedding.id == embedding_id).first()
     
     if not embedding:
         raise HTTPException(
@@ -292,14 +326,11 @@ async def get_face_details(
             detail="Not authorized to view this face embedding"
         )
     
-    # Get the user this embedding belongs to
-    user = db.query(User).filter(User.id == embedding.user_id).first()
-    
     # Return the embedding details
     response = {
         "id": embedding.id,
         "user_id": embedding.user_id,
-        "username": user.username if user else "Unknown",
+        "username": embedding.username if embedding.username else "Unknown",
         "confidence_score": embedding.confidence_score,
         "device_id": embedding.device_id,
         "created_at": embedding.created_at
@@ -307,10 +338,77 @@ async def get_face_details(
     
     return response
 
+@router.get("/faces/{embedding_id}/image", name="get_face_image")
+async def get_face_image(
+    embedding_id: int,
+    size: str = Query("full", pattern="^(full|thumbnail)$"),
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+    current_user: CurrentPrincipal = Depends(get_current_active_principal)
+):
+    """
+    Stream the stored face crop of an embedding: the JPEG by default, or a small WebP
+    thumbnail with size=thumbnail. Blobs are content-addressed, so the key doubles as
+    a strong ETag and responses can be cached for a long time.
+    """
+    row = db.query(FaceEmbedding.user_id, FaceImage.image_key, FaceImage.thumbnail_key).join(
+        FaceImage, FaceImage.embedding_id == FaceEmbedding.id
+    ).filter(FaceEmbedding.id == embedding_id).first()
+    
+    if not row:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Face image not found"
+        )
+    
+    if row.user_id != current_user.id and current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to view this face image"
+        )
+    
+    key, media_type = row.image_key, FULL_MEDIA_TYPE
+    if size == "thumbnail":
+        thumbnail_key = row.thumbnail_key
+        if not thumbnail_key:
+            # Images stored before thumbnails existed get one on first request
+            thumbnail_key = await run_in_threadpool(lambda: _create_missing_thumbnail(db, row.image_key))
+        if thumbnail_key:
+            key, media_type = thumbnail_key, THUMBNAIL_MEDIA_TYPE
+    
+    etag = f'"{key}"'
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=31536000, immutable"}
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    chunks = get_blob_store().stream(key)
+    if chunks is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Face image not found"
+        )
+    
+    return StreamingResponse(chunks, media_type=media_type, headers=headers)
+
+def _create_missing_thumbnail(db: Session, image_key: str) -> Optional[str]:
+    store = get_blob_store()
+    image_data = store.get(image_key)
+    thumbnail = make_thumbnail(image_data) if image_data else None
+    if not thumbnail:
+        return None
+    
+    thumbnail_key = store.put(thumbnail)
+    # Every row sharing the crop shares the thumbnail too
+    db.query(FaceImage).filter(FaceImage.image_key == image_key).update(
+        {FaceImage.thumbnail_key: thumbnail_key}, synchronize_session=False
+    )
+    db.commit()
+    return thumbnail_key
+
 @router.get("/face-recognition-settings")
 async def get_face_recognition_settings(
     db: Session = Depends(get_db),
-    current_user: UserResponse = Depends(get_current_active_user)
+    current_user: CurrentPrincipal = Depends(get_current_active_principal)
 ):
     """Get available face recognition settings and capabilities"""
     if current_user.role != "admin":
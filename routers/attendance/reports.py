@@ -1,23 +1,38 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from database.db import get_db
-from schemas.user import UserResponse
-from security.auth import get_current_active_user
-from models.database import ClassSession, Attendance, User
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from sqlalchemy import exists, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.db import get_async_db, AsyncSessionLocal
+from security.auth import CurrentPrincipal, get_current_active_principal
+from crud.attendance_view import effective_attendance
+from models.database import ClassSession, AttendanceStatus, User, Class, StudentAttendanceRollup, student_class_association
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import base64
+import json
 
 router = APIRouter()
 
+# Batch requests covering more sessions than this are streamed back as rows arrive
+STREAMING_SESSION_THRESHOLD = 50
+ATTENDANCE_BATCH_SIZE = 1000
+MAX_ATTENDANCE_PAGE_SIZE = 500
+
 @router.get("/sessions/{session_id}/students")
 async def get_session_attendance(
     session_id: int,
-    db: Session = Depends(get_db),
-    current_user: UserResponse = Depends(get_current_active_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentPrincipal = Depends(get_current_active_principal)
 ):
     """
     Get attendance records for a specific class session.
     """
-    session = db.query(ClassSession).filter(ClassSession.id == session_id).first()
+    session = (await db.execute(
+        select(ClassSession.class_id, Class.teacher_id).outerjoin(
+            Class, Class.id == ClassSession.class_id
+        ).where(ClassSession.id == session_id)
+    )).first()
     if not session:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -25,112 +40,259 @@ async def get_session_attendance(
         )
     
     # Only teachers of this class or admins can view attendance
-    class_obj = session.class_obj
-    if current_user.role == "teacher" and class_obj.teacher_id != current_user.id:
+    if current_user.role == "teacher" and session.teacher_id != current_user.id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions"
         )
-    elif current_user.role == "student" and not any(c.id == session.class_id for c in current_user.classes):
+    elif current_user.role == "student" and not await db.scalar(select(exists().where(
+        student_class_association.c.class_id == session.class_id,
+        student_class_association.c.user_id == current_user.id
+    ))):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions"
         )
     
-    attendances = session.attendances
     result = []
+    async for _, rows in _session_attendance_rows(db, [session_id]):
+        result.extend(rows)
+    return result
+
+async def _ensure_can_view_student(db: AsyncSession, current_user: CurrentPrincipal, student_id: int):
+    """Admins and the student can view their attendance; teachers only for students in their classes."""
+    if current_user.role == "admin" or current_user.id == student_id:
+        return
     
-    for attendance in attendances:
-        # Check if student exists before accessing its attributes
-        if attendance.student is None:
-            # Handle the case where student is None
-            student_data = {
-                "student_id": attendance.student_id,
-                "username": f"Unknown (ID: {attendance.student_id})",
-                "full_name": "Unknown Student",
-                "status": attendance.status,
-                "check_in_time": attendance.check_in_time,
-                "late_minutes": attendance.late_minutes
-            }
-        else:
-            # Student exists, access attributes normally
-            student_data = {
-                "student_id": attendance.student_id,
-                "username": attendance.student.username,
-                "full_name": attendance.student.full_name,
-                "status": attendance.status,
-                "check_in_time": attendance.check_in_time,
-                "late_minutes": attendance.late_minutes
-            }
-        
-        result.append(student_data)
+    if current_user.role != "teacher":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
     
-    return result
+    student = await db.scalar(select(User.id).where(User.id == student_id))
+    if not student:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Student not found"
+        )
+    
+    # Check if the teacher teaches any class the student is in
+    teaches_student = await db.scalar(select(exists().where(
+        student_class_association.c.class_id == Class.id,
+        Class.teacher_id == current_user.id,
+        student_class_association.c.user_id == student_id
+    )))
+    if not teaches_student:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+
+def _encode_cursor(session_date: datetime, session_id: int) -> str:
+    raw = json.dumps([session_date.isoformat(), session_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        session_date, session_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(session_date), int(session_id)
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
 
 @router.get("/student/{student_id}")
 async def get_student_attendance(
     student_id: int,
-    db: Session = Depends(get_db),
-    current_user: UserResponse = Depends(get_current_active_user)
+    response: Response,
+    class_id: Optional[int] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    attendance_status: Optional[AttendanceStatus] = Query(None, alias="status"),
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_ATTENDANCE_PAGE_SIZE),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentPrincipal = Depends(get_current_active_principal)
+):
+    """
+    Get attendance records for a specific student, most recent session first.
+    
+    When a limit is given the records are paginated by session date; pass the
+    X-Next-Cursor response header back as `cursor` to fetch the next page.
+    """
+    await _ensure_can_view_student(db, current_user, student_id)
+    
+    # Absences are only stored when edited, so read them through the effective view
+    attendance = effective_attendance()
+    query = select(
+        attendance.c.id,
+        attendance.c.status,
+        attendance.c.check_in_time,
+        attendance.c.late_minutes,
+        attendance.c.created_at,
+        ClassSession.id.label("session_id"),
+        ClassSession.session_date,
+        ClassSession.start_time,
+        ClassSession.end_time,
+        Class.id.label("class_id"),
+        Class.name.label("class_name"),
+        Class.class_code
+    ).select_from(attendance).join(
+        ClassSession, ClassSession.id == attendance.c.session_id
+    ).join(
+        Class, Class.id == ClassSession.class_id
+    ).where(attendance.c.student_id == student_id)
+    
+    if class_id is not None:
+        query = query.where(ClassSession.class_id == class_id)
+    if start_date is not None:
+        query = query.where(ClassSession.session_date >= start_date)
+    if end_date is not None:
+        query = query.where(ClassSession.session_date <= end_date)
+    if attendance_status is not None:
+        query = query.where(attendance.c.status == attendance_status.value)
+    if cursor:
+        # Implied absences have no attendance id, so pages are keyed on the session
+        cursor_date, cursor_session_id = _decode_cursor(cursor)
+        query = query.where(
+            tuple_(ClassSession.session_date, ClassSession.id) < tuple_(cursor_date, cursor_session_id)
+        )
+    
+    query = query.order_by(ClassSession.session_date.desc(), ClassSession.id.desc())
+    if limit is not None:
+        # Fetch one extra row to know whether another page exists
+        query = query.limit(limit + 1)
+    
+    rows = (await db.execute(query)).all()
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = _encode_cursor(rows[-1].session_date, rows[-1].session_id)
+    
+    return [
+        {
+            "id": row.id,
+            "session_id": row.session_id,
+            "session_date": row.session_date,
+            "start_time": row.start_time,
+            "end_time": row.end_time,
+            "class_id": row.class_id,
+            "class_name": row.class_name,
+            "class_code": row.class_code,
+            "status": row.status,
+            "check_in_time": row.check_in_time,
+            "late_minutes": row.late_minutes,
+            "created_at": row.created_at
+        }
+        for row in rows
+    ]
+
+@router.get("/student/{student_id}/summary")
+async def get_student_attendance_summary(
+    student_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentPrincipal = Depends(get_current_active_principal)
 ):
-    """Get attendance records for a specific student."""
-    if current_user.role != "admin" and current_user.id != student_id:
-        if current_user.role != "teacher":
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Not enough permissions"
-            )
+    """Get per-class attendance totals for a student from the attendance rollups."""
+    await _ensure_can_view_student(db, current_user, student_id)
+    
+    rows = (await db.execute(
+        select(StudentAttendanceRollup, Class.name, Class.class_code).join(
+            Class, Class.id == StudentAttendanceRollup.class_id
+        ).where(
+            StudentAttendanceRollup.student_id == student_id
+        )
+    )).all()
+    
+    classes = []
+    for rollup, class_name, class_code in rows:
+        total = rollup.present_count + rollup.late_count + rollup.absent_count
+        classes.append({
+            "class_id": rollup.class_id,
+            "class_name": class_name,
+            "class_code": class_code,
+            "present": rollup.present_count,
+            "late": rollup.late_count,
+            "absent": rollup.absent_count,
+            "total": total,
+            "attendance_rate": (rollup.present_count + rollup.late_count) / total if total else 0.0
+        })
+    
+    return {
+        "student_id": student_id,
+        "present": sum(c["present"] for c in classes),
+        "late": sum(c["late"] for c in classes),
+        "absent": sum(c["absent"] for c in classes),
+        "classes": classes
+    }
+
+async def _session_attendance_rows(db: AsyncSession, session_ids: List[int]) -> AsyncIterator[Tuple[int, List[dict]]]:
+    """
+    Yield (session_id, attendance rows) for each session, reading attendances joined
+    with their students in batches instead of lazy-loading them per session.
+    Students without a stored row are reported absent.
+    """
+    attendance = effective_attendance()
+    query = select(
+        attendance.c.session_id,
+        attendance.c.student_id,
+        attendance.c.status,
+        attendance.c.check_in_time,
+        attendance.c.late_minutes,
+        User.username,
+        User.full_name
+    ).select_from(attendance).outerjoin(
+        User, User.id == attendance.c.student_id
+    ).where(
+        attendance.c.session_id.in_(session_ids)
+    ).order_by(attendance.c.session_id).execution_options(yield_per=ATTENDANCE_BATCH_SIZE)
+    
+    seen = set()
+    current_id, current_rows = None, []
+    async for row in await db.stream(query):
+        if row.session_id != current_id:
+            if current_id is not None:
+                yield current_id, current_rows
+            current_id, current_rows = row.session_id, []
+            seen.add(current_id)
         
-            # For teachers, verify they teach at least one class the student is in
-            student = db.query(User).filter(User.id == student_id).first()
-            if not student:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="Student not found"
-                )
-                
-            # Check if the teacher teaches any class the student is in
-            teacher_classes = [c.id for c in current_user.teaching_classes]
-            student_classes = [c.id for c in student.classes]
-            if not any(c_id in teacher_classes for c_id in student_classes):
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail="Not enough permissions"
-                )
-    
-    attendance_records = db.query(Attendance).filter(Attendance.student_id == student_id).all()
+        current_rows.append({
+            "student_id": row.student_id,
+            "username": row.username if row.username is not None else f"Unknown (ID: {row.student_id})",
+            "full_name": row.full_name if row.username is not None else "Unknown Student",
+            "status": row.status,
+            "check_in_time": row.check_in_time,
+            "late_minutes": row.late_minutes
+        })
     
-    result = []
-    for record in attendance_records:
-        session = record.session
-        if session:
-            class_obj = session.class_obj
-            if class_obj:
-                result.append({
-                    "id": record.id,
-                    "session_id": session.id,
-                    "session_date": session.session_date,
-                    "start_time": session.start_time,
-                    "end_time": session.end_time,
-                    "class_id": class_obj.id,
-                    "class_name": class_obj.name,
-                    "class_code": class_obj.class_code,
-                    "status": record.status,
-                    "check_in_time": record.check_in_time,
-                    "late_minutes": record.late_minutes,
-                    "created_at": record.created_at
-                })
-    
-    # Sort by session date, most recent first
-    result.sort(key=lambda x: x["session_date"], reverse=True)
+    if current_id is not None:
+        yield current_id, current_rows
     
-    return result
+    # Sessions without any attendance rows still get an entry
+    for session_id in session_ids:
+        if session_id not in seen:
+            yield session_id, []
+
+async def _stream_sessions_attendance(errors: Dict[int, dict], session_ids: List[int]) -> AsyncIterator[str]:
+    """Stream the batch response as JSON, one session at a time."""
+    # The request-scoped session is closed before a streamed body is sent, so use our own
+    async with AsyncSessionLocal() as db:
+        yield "{"
+        separator = ""
+        for session_id, error in errors.items():
+            yield f"{separator}{json.dumps(str(session_id))}:{json.dumps(error)}"
+            separator = ","
+        async for session_id, rows in _session_attendance_rows(db, session_ids):
+            yield f"{separator}{json.dumps(str(session_id))}:{json.dumps(jsonable_encoder(rows))}"
+            separator = ","
+        yield "}"
 
 @router.post("/sessions/batch/students")
 async def get_multiple_sessions_attendance(
     session_ids: List[int],
-    db: Session = Depends(get_db),
-    current_user: UserResponse = Depends(get_current_active_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentPrincipal = Depends(get_current_active_principal)
 ):
     """Get attendance records for multiple class sessions in one request."""
     if current_user.role != "admin" and current_user.role != "teacher":
@@ -139,43 +301,40 @@ async def get_multiple_sessions_attendance(
             detail="Not enough permissions"
         )
     
-    result = {}
+    # Load every requested session with its class teacher in one query
+    teacher_by_session = dict((await db.execute(
+        select(ClassSession.id, Class.teacher_id).outerjoin(
+            Class, Class.id == ClassSession.class_id
+        ).where(ClassSession.id.in_(session_ids))
+    )).all())
     
-    for session_id in session_ids:
-        session = db.query(ClassSession).filter(ClassSession.id == session_id).first()
-        if not session:
-            result[session_id] = {"error": "Session not found"}
-            continue
-            
-        # Check permissions
-        class_obj = session.class_obj
-        if current_user.role == "teacher" and class_obj.teacher_id != current_user.id:
-            result[session_id] = {"error": "Not enough permissions"}
-            continue
-        
-        # Get attendance records
-        attendances = session.attendances
-        session_result = []
-        
-        for attendance in attendances:
-            session_result.append({
-                "student_id": attendance.student_id,
-                "username": attendance.student.username,
-                "full_name": attendance.student.full_name,
-                "status": attendance.status,
-                "check_in_time": attendance.check_in_time,
-                "late_minutes": attendance.late_minutes
-            })
-        
-        result[session_id] = session_result
+    errors = {}
+    allowed_ids = []
+    for session_id in dict.fromkeys(session_ids):
+        if session_id not in teacher_by_session:
+            errors[session_id] = {"error": "Session not found"}
+        elif current_user.role == "teacher" and teacher_by_session[session_id] != current_user.id:
+            errors[session_id] = {"error": "Not enough permissions"}
+        else:
+            allowed_ids.append(session_id)
+    
+    if len(allowed_ids) > STREAMING_SESSION_THRESHOLD:
+        return StreamingResponse(
+            _stream_sessions_attendance(errors, allowed_ids),
+            media_type="application/json"
+        )
+    
+    result = dict(errors)
+    async for session_id, rows in _session_attendance_rows(db, allowed_ids):
+        result[session_id] = rows
     
     return result
 
 @router.get("/sessions/{session_id}")
 async def get_session_attendance_shortcut(
     session_id: int,
-    db: Session = Depends(get_db),
-    current_user: UserResponse = Depends(get_current_active_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentPrincipal = Depends(get_current_active_principal)
 ):
 
     return await get_session_attendance(session_id, db, current_user)
\ No newline at end of file
@@ -3,9 +3,9 @@ from sqlalchemy.orm import Session
 from database.db import get_db
 from sqlalchemy.orm import Session
 from schemas.user import UserCreate, UserResponse
-from crud.user import create_user, get_user_by_email, get_user_by_username, authenticate_user, get_user
-from security.auth import create_access_token, Token, get_current_active_user
-from security.password import verify_password, get_password_hash
+from crud.user import create_user, get_user_by_email, get_user_by_username, authenticate_user_async, get_user
+from security.auth import create_access_token, Token, CurrentPrincipal, get_current_active_principal
+from security.password import verify_password_async, get_password_hash_async
 from fastapi.security import OAuth2PasswordRequestForm
 from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
@@ -55,11 +55,11 @@ async def register_user(user: UserCreate, db: Session = Depends(get_db)):
 
 
 @router.post("/token", response_model=Token)
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     """
     OAuth2 compatible token login, get an access token for future requests
     """
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user_async(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -73,30 +73,30 @@ def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db:
             detail="Inactive user",
         )
 
-    access_token = create_access_token(data={"sub": user.username})
+    access_token = create_access_token(data={"sub": user.username}, user=user)
     return {"access_token": access_token, "token_type": "bearer"}
 
 
 @router.post("/login")
-async def login_user(form_data: OAuth2PasswordRequestForm = Depends()):
+async def login_user(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     """
     Redirect to token endpoint for backward compatibility
     """
-    return login_for_access_token(form_data)
+    return await login_for_access_token(form_data, db)
 
 
 @router.post("/verify-password", response_model=PasswordVerifyResponse)
 async def verify_current_password(
     verify_data: PasswordVerifyRequest = Body(...),
-    current_user: UserResponse = Depends(get_current_active_user),
+    current_user: CurrentPrincipal = Depends(get_current_active_principal),
     db: Session = Depends(get_db),
 ):
     """
     Verify if the provided password matches the current user's password
     """
-    user = get_user(db, user_id=current_user.id)
+    user = await run_in_threadpool(lambda: get_user(db, user_id=current_user.id))
 
-    is_valid = verify_password(verify_data.password, user.hashed_password)
+    is_valid = await verify_password_async(verify_data.password, user.hashed_password)
 
     return {"valid": is_valid}
 
@@ -165,7 +165,7 @@ async def reset_password(
             detail="User not found"
         )
 
-    user.hashed_password = get_password_hash(request.new_password)
+    user.hashed_password = await get_password_hash_async(request.new_password)
 
     # Mark token as used
     db_reset.used = True
@@ -5,7 +5,7 @@ from database.db import get_db
 from schemas.class_schema import ClassCreate, ClassResponse, ClassUpdate, ClassWithTeacherResponse
 from schemas.user import UserResponse
 from crud.class_crud import create_class, get_class, get_classes, update_class, delete_class, get_class_sessions
-from security.auth import get_current_active_user, get_current_teacher_or_admin
+from security.auth import get_current_active_user, get_current_teacher_or_admin, CurrentPrincipal, get_current_active_principal
 from starlette.concurrency import run_in_threadpool
 from models.database import Class, User
 
@@ -15,7 +15,7 @@ router = APIRouter(tags=["Class Management"])
 async def create_class_endpoint(
     class_obj: ClassCreate, 
     db: Session = Depends(get_db),
-    current_user: UserResponse = Depends(get_current_teacher_or_admin)
+    current_user: CurrentPrincipal = Depends(get_current_teacher_or_admin)
 ):
     """Create a new class. Only teachers and admins can create classes."""
     # If the user is a teacher, they can only create classes where they are the teacher
@@ -48,7 +48,7 @@ async def read_classes(
     include_sessions_count: bool = False,
     teacher_id: Optional[int] = None,
     db: Session = Depends(get_db),
-    current_user: UserResponse = Depends(get_current_active_user)
+    current_user: CurrentPrincipal = Depends(get_current_active_principal)
 ):
     """Get all classes. Optionally filter by teacher_id."""
     if current_user.role == "teacher":
@@ -126,7 +126,7 @@ async def read_classes(
 async def read_class(
     class_id: int, 
     db: Session = Depends(get_db),
-    current_user: UserResponse = Depends(get_current_active_user),
+    current_user: CurrentPrincipal = Depends(get_current_active_principal),
     include_students: bool = True,
     include_sessions: bool = True,
 ):
@@ -199,7 +199,7 @@ async def update_class_endpoint(
     class_id: int, 
     class_obj: ClassUpdate, 
     db: Session = Depends(get_db),
-    current_user: UserResponse = Depends(get_current_teacher_or_admin)
+    current_user: CurrentPrincipal = Depends(get_current_teacher_or_admin)
 ):
     """Update class information. Only teachers of the class and admins can update."""
     db_class = get_class(db, class_id=class_id)
@@ -230,7 +230,7 @@ async def update_class_endpoint(
 async def delete_class_endpoint(
     class_id: int, 
     db: Session = Depends(get_db),
-    current_user: UserResponse = Depends(get_current_teacher_or_admin)
+    current_user: CurrentPrincipal = Depends(get_current_teacher_or_admin)
 ):
     """Delete a class. Only teachers of the class and admins can delete."""
     db_class = get_class(db, class_id=class_id)
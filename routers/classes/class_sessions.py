@@ -1,16 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from typing import Dict, List
 from database.db import get_db
 from schemas.class_schema import (
-    ClassSessionCreate, ClassSessionResponse, ClassSessionUpdate
+    ClassSessionCreate, ClassSessionResponse, ClassSessionUpdate, ClassSessionScheduleCreate
 )
-from schemas.user import UserResponse
 from crud.class_crud import (
     get_class, get_session, get_class_sessions, 
-    create_class_session, update_class_session, delete_class_session
+    create_class_session, update_class_session, delete_class_session, SessionConflictError
 )
-from security.auth import get_current_active_user, get_current_teacher_or_admin
+from crud.session_schedule import generate_class_sessions
+from crud.attendance_view import effective_attendance
+from security.auth import get_current_teacher_or_admin, CurrentPrincipal, get_current_active_principal
 from models.database import User, ClassSession
 
 router = APIRouter(tags=["Class Sessions"])
@@ -19,7 +21,7 @@ router = APIRouter(tags=["Class Sessions"])
 async def create_session(
     session: ClassSessionCreate, 
     db: Session = Depends(get_db),
-    current_user: UserResponse = Depends(get_current_teacher_or_admin)
+    current_user: CurrentPrincipal = Depends(get_current_teacher_or_admin)
 ):
     """Create a new class session. Only teachers of the class and admins can create sessions."""
     db_class = get_class(db, class_id=session.class_id)
@@ -36,13 +38,52 @@ async def create_session(
             detail="Not enough permissions"
         )
     
-    return create_class_session(db=db, session=session)
+    try:
+        return create_class_session(db=db, session=session)
+    except SessionConflictError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+
+@router.post("/{class_id}/sessions/generate", response_model=List[ClassSessionResponse], status_code=status.HTTP_201_CREATED)
+async def generate_sessions(
+    class_id: int,
+    schedule: ClassSessionScheduleCreate,
+    db: Session = Depends(get_db),
+    current_user: CurrentPrincipal = Depends(get_current_teacher_or_admin)
+):
+    """
+    Create all sessions of a weekly schedule (e.g. MWF 10:00 for a semester).
+    
+    Sessions that already exist at the same start time are skipped; only new ones are returned.
+    """
+    db_class = get_class(db, class_id=class_id)
+    if db_class is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, 
+            detail="Class not found"
+        )
+    
+    if current_user.role == "teacher" and db_class.teacher_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    
+    try:
+        return generate_class_sessions(db, class_id=class_id, schedule=schedule)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
 
 @router.get("/sessions/{session_id}", response_model=dict)
 async def read_session(
     session_id: int, 
     db: Session = Depends(get_db),
-    current_user: UserResponse = Depends(get_current_active_user)
+    current_user: CurrentPrincipal = Depends(get_current_active_principal)
 ):
     """Get a specific class session by ID with teacher details."""
     db_session = get_session(db, session_id=session_id)
@@ -103,7 +144,7 @@ async def read_session(
 async def read_class_sessions(
     class_id: int, 
     db: Session = Depends(get_db),
-    current_user: UserResponse = Depends(get_current_active_user)
+    current_user: CurrentPrincipal = Depends(get_current_active_principal)
 ):
     """Get all sessions for a specific class."""
     db_class = get_class(db, class_id=class_id)
@@ -127,7 +168,7 @@ async def update_session(
     session_id: int, 
     session: ClassSessionUpdate, 
     db: Session = Depends(get_db),
-    current_user: UserResponse = Depends(get_current_teacher_or_admin)
+    current_user: CurrentPrincipal = Depends(get_current_teacher_or_admin)
 ):
     """Update a class session. Only teachers of the class and admins can update sessions."""
     db_session = get_session(db, session_id=session_id)
@@ -145,14 +186,20 @@ async def update_session(
             detail="Not enough permissions"
         )
     
-    updated_session = update_class_session(db, session_id=session_id, session=session)
+    try:
+        updated_session = update_class_session(db, session_id=session_id, session=session)
+    except SessionConflictError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
     return updated_session
 
 @router.delete("/sessions/{session_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_session(
     session_id: int, 
     db: Session = Depends(get_db),
-    current_user: UserResponse = Depends(get_current_teacher_or_admin)
+    current_user: CurrentPrincipal = Depends(get_current_teacher_or_admin)
 ):
     """Delete a class session. Only teachers of the class and admins can delete sessions."""
     db_session = get_session(db, session_id=session_id)
@@ -177,7 +224,7 @@ async def delete_session(
 async def get_multiple_class_sessions(
     class_ids: str = Query(..., description="Comma-separated list of class IDs"),
     db: Session = Depends(get_db),
-    current_user: UserResponse = Depends(get_current_active_user)
+    current_user: CurrentPrincipal = Depends(get_current_active_principal)
 ):
     """Get sessions for multiple classes in a single request."""
     try:
@@ -205,7 +252,7 @@ async def get_session_attendance_by_class(
     class_id: int,
     session_id: int,
     db: Session = Depends(get_db),
-    current_user: UserResponse = Depends(get_current_active_user)
+    current_user: CurrentPrincipal = Depends(get_current_active_principal)
 ):
     """
     Get attendance records for a specific class session.
@@ -222,28 +269,38 @@ async def get_session_attendance_by_class(
             detail="Session not found or doesn't belong to the specified class"
         )
     
-    # Reuse logic from the existing attendance endpoint
-    attendances = session.attendances
-    result = []
+    # Absences are only stored when edited, so read them through the effective view
+    attendance = effective_attendance()
+    rows = db.execute(select(
+        attendance.c.student_id,
+        attendance.c.status,
+        attendance.c.check_in_time,
+        attendance.c.late_minutes,
+        User.username,
+        User.full_name
+    ).select_from(attendance).outerjoin(
+        User, User.id == attendance.c.student_id
+    ).where(attendance.c.session_id == session_id))
     
-    for attendance in attendances:
-        if attendance.student is None:
+    result = []
+    for row in rows:
+        if row.username is None:
             student_data = {
-                "student_id": attendance.student_id,
-                "username": f"Unknown (ID: {attendance.student_id})",
+                "student_id": row.student_id,
+                "username": f"Unknown (ID: {row.student_id})",
                 "full_name": "Unknown Student",
-                "status": attendance.status,
-                "check_in_time": attendance.check_in_time,
-                "late_minutes": attendance.late_minutes
+                "status": row.status,
+                "check_in_time": row.check_in_time,
+                "late_minutes": row.late_minutes
             }
         else:
             student_data = {
-                "student_id": attendance.student_id,
-                "username": attendance.student.username,
-                "full_name": attendance.student.full_name,
-                "status": attendance.status,
-                "check_in_time": attendance.check_in_time,
-                "late_minutes": attendance.late_minutes
+                "student_id": row.student_id,
+                "username": row.username,
+                "full_name": row.full_name,
+                "status": row.status,
+                "check_in_time": row.check_in_time,
+                "late_minutes": row.late_minutes
             }
         
         result.append(student_data)
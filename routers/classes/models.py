@@ -6,5 +6,8 @@ from schemas.class_schema import ClassResponse
 class StudentRegistration(BaseModel):
     student_id: int
 
+class BulkEnrollmentRequest(BaseModel):
+    student_ids: List[int]
+
 class ClassWithStudentsResponse(ClassResponse):
     students: List[UserResponse] = []
\ No newline at end of file
@@ -1,23 +1,104 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, status
 from sqlalchemy.orm import Session
 from typing import List
 from database.db import get_db
 from schemas.user import UserResponse
 from crud.class_crud import (
-    get_class, register_student_to_class, 
+    get_class, register_student_to_class, register_students_to_class,
     remove_student_from_class, get_class_students
 )
-from security.auth import get_current_active_user, get_current_teacher_or_admin
+from crud.user import get_user_ids_by_student_ids
+from .models import BulkEnrollmentRequest
+import csv
+import io
+from security.auth import get_current_teacher_or_admin, CurrentPrincipal, get_current_active_principal
 from starlette.concurrency import run_in_threadpool
 
 router = APIRouter(tags=["Class Student Enrollment"])
 
+async def _ensure_can_enroll(db: Session, class_id: int, current_user: CurrentPrincipal):
+    db_class = await run_in_threadpool(
+        lambda: get_class(db, class_id=class_id)
+    )
+    
+    if db_class is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, 
+            detail="Class not found"
+        )
+    
+    if current_user.role == "teacher" and db_class.teacher_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+
+# Registered before the single-student route so "bulk" is not taken as a student id
+@router.post("/{class_id}/students/bulk", status_code=status.HTTP_200_OK)
+async def register_students_bulk(
+    class_id: int,
+    enrollment: BulkEnrollmentRequest,
+    db: Session = Depends(get_db),
+    current_user: CurrentPrincipal = Depends(get_current_teacher_or_admin)
+):
+    """
+    Register many students (by user id) to a class in one request.
+    
+    Ids that are not students are reported under not_found instead of failing the request.
+    """
+    await _ensure_can_enroll(db, class_id, current_user)
+    
+    return await run_in_threadpool(
+        lambda: register_students_to_class(db, class_id=class_id, student_ids=enrollment.student_ids)
+    )
+
+@router.post("/{class_id}/students/bulk/csv", status_code=status.HTTP_200_OK)
+async def register_students_csv(
+    class_id: int,
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    current_user: CurrentPrincipal = Depends(get_current_teacher_or_admin)
+):
+    """
+    Register the students of a roster CSV to a class.
+    
+    The first column holds school student numbers (a header row is allowed);
+    numbers that match no user are returned under unknown_student_ids.
+    """
+    await _ensure_can_enroll(db, class_id, current_user)
+    
+    try:
+        content = (await file.read()).decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="CSV file must be UTF-8 encoded"
+        )
+    
+    student_numbers = [
+        row[0].strip() for row in csv.reader(io.StringIO(content))
+        if row and row[0].strip()
+    ]
+    if student_numbers and student_numbers[0].lower().replace(" ", "_") in ("student_id", "student_number"):
+        student_numbers = student_numbers[1:]
+    student_numbers = list(dict.fromkeys(student_numbers))
+    
+    def enroll():
+        user_ids = get_user_ids_by_student_ids(db, student_numbers)
+        result = register_students_to_class(
+            db, class_id=class_id, student_ids=[user_ids[number] for number in student_numbers if number in user_ids]
+        )
+        result["unknown_student_ids"] = [number for number in student_numbers if number not in user_ids]
+        return result
+    
+    return await run_in_threadpool(enroll)
+
 @router.post("/{class_id}/students/{student_id}", status_code=status.HTTP_200_OK)
 async def register_student(
     class_id: int,
     student_id: int,
     db: Session = Depends(get_db),
-    current_user: UserResponse = Depends(get_current_teacher_or_admin)
+    current_user: CurrentPrincipal = Depends(get_current_teacher_or_admin)
 ):
     """Register a student to a class. Only teachers of the class and admins can register students."""
     db_class = await run_in_threadpool(
@@ -54,7 +135,7 @@ async def remove_student(
     class_id: int,
     student_id: int,
     db: Session = Depends(get_db),
-    current_user: UserResponse = Depends(get_current_teacher_or_admin)
+    current_user: CurrentPrincipal = Depends(get_current_teacher_or_admin)
 ):
     """Remove a student from a class. Only teachers of the class and admins can remove students."""
     db_class = await run_in_threadpool(
@@ -90,7 +171,7 @@ async def remove_student(
 async def get_class_students_endpoint(
     class_id: int,
     db: Session = Depends(get_db),
-    current_user: UserResponse = Depends(get_current_active_user)
+    current_user: CurrentPrincipal = Depends(get_current_active_principal)
 ):
     """Get all students registered for a specific class."""
     db_class = await run_in_threadpool(
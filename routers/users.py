@@ -11,7 +11,7 @@ from crud.user import (
     delete_user, get_user_by_email, get_user_by_username,
     get_user_by_student_id, get_user_by_staff_id
 )
-from security.auth import get_current_active_user, get_current_admin_user
+from security.auth import get_current_active_user, get_current_admin_user, CurrentPrincipal, get_current_active_principal
 from fastapi.concurrency import run_in_threadpool
 from services.email_service import email_service
 
@@ -73,7 +73,7 @@ async def read_users(
     limit: int = 100, 
     role: Optional[str] = None,
     db: Session = Depends(get_db),
-    current_user: UserResponse = Depends(get_current_admin_user)
+    current_user: CurrentPrincipal = Depends(get_current_admin_user)
 ):
     """
     Get all users. Only accessible by admin users.
@@ -86,7 +86,7 @@ async def read_users(
 def read_user(
     user_id: int, 
     db: Session = Depends(get_db),
-    current_user: UserResponse = Depends(get_current_active_user)
+    current_user: CurrentPrincipal = Depends(get_current_active_principal)
 ):
     """
     Get a specific user by ID.
@@ -112,7 +112,7 @@ async def update_user_info(
     user_id: int, 
     user: UserUpdate, 
     db: Session = Depends(get_db),
-    current_user: UserResponse = Depends(get_current_active_user)
+    current_user: CurrentPrincipal = Depends(get_current_active_principal)
 ):
     """
     Update user information.
@@ -181,7 +181,7 @@ async def update_user_info(
 async def delete_user_endpoint(
     user_id: int, 
     db: Session = Depends(get_db),
-    current_user: UserResponse = Depends(get_current_admin_user)
+    current_user: CurrentPrincipal = Depends(get_current_admin_user)
 ):
     """
     Delete a user. Only admins can delete users.
@@ -209,7 +209,7 @@ async def get_current_user_info(
 async def get_user_classes(
     user_id: int,
     db: Session = Depends(get_db),
-    current_user: UserResponse = Depends(get_current_active_user)
+    current_user: CurrentPrincipal = Depends(get_current_active_principal)
 ):
     """Get classes a user is enrolled in or teaches"""
     # Check permissions
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, EmailStr, Field
 from typing import List, Optional
-from datetime import datetime
+from datetime import date, datetime, time
 
 from pydantic import BaseModel
 class ClassBase(BaseModel):
@@ -56,6 +56,16 @@ class ClassSessionUpdate(ClassSessionBase):
     end_time: Optional[datetime] = None
     notes: Optional[str] = None
 
+class ClassSessionScheduleCreate(BaseModel):
+    """A weekly recurrence, e.g. days="MWF" at 10:00 from the first to the last day of term."""
+    days: str = Field(..., description="Weekday letters: M, T, W, Th, F, Sa, Su (e.g. 'MWF', 'TTh')")
+    start_time: time
+    duration_minutes: int = Field(90, gt=0)
+    start_date: date
+    end_date: date
+    skip_dates: List[date] = []  # Holidays and breaks
+    notes: Optional[str] = None
+
 class ClassSessionResponse(ClassSessionBase):
     id: int
 
@@ -6,7 +6,7 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 
 from database.db import SessionLocal
 from models.database import FaceEmbedding
-from config.face_recognition_config import face_recognition_config
+from crud.face_recognition_config import get_face_recognition_config
 from utils.logging import logger
 
 def add_model_type_column():
@@ -23,7 +23,7 @@ def add_model_type_column():
             return
         
         # Default model from config
-        default_model = face_recognition_config.DEFAULT_MODEL
+        default_model = get_face_recognition_config().DEFAULT_MODEL
         
         # Update each embedding
         for emb in embeddings:
@@ -8,14 +8,16 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 
 from database.db import SessionLocal
 from models.database import FaceEmbedding
+from sqlalchemy.orm import undefer
 from utils.logging import logger
+from services.invalidation_bus import publish
 
 def clean_embeddings():
     """Remove corrupted face embeddings from the database"""
     db = SessionLocal()
     try:
         # Get all embeddings
-        embeddings = db.query(FaceEmbedding).all()
+        embeddings = db.query(FaceEmbedding).options(undefer(FaceEmbedding.embedding)).all()
         
         total = len(embeddings)
         removed = 0
@@ -34,6 +36,9 @@ def clean_embeddings():
                 db.delete(embedding)
                 removed += 1
         
+        if removed:
+            # Running workers re-check their gallery snapshot against the database
+            publish("face_gallery", db=db)
         db.commit()
         print(f"Completed: {removed} corrupted embeddings removed, {valid} valid embeddings kept")
         
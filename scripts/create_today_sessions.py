@@ -1,20 +1,20 @@
 import os
 import sys
+import argparse
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
-from models.database import Class, ClassSession
+from datetime import datetime, time
+from models.database import Class
 from database.db import SessionLocal
-from crud.class_crud import create_class_session
-from schemas.class_schema import ClassSessionCreate
+from crud.session_schedule import generate_class_sessions, WEEKDAY_CODES, WEEKDAY_NAMES
+from schemas.class_schema import ClassSessionScheduleCreate
 
-def create_today_sessions():
+def create_today_sessions(force=False):
     """Create class sessions for today following the MWF or TTh pattern"""
     db = SessionLocal()
     try:
         # Get all classes
-        classes = db.query(Class).all()
+        classes = db.query(Class.id, Class.name).order_by(Class.id).all()
         if not classes:
             print("No classes found in the database")
             return
@@ -23,46 +23,35 @@ def create_today_sessions():
         today = datetime.now().date()
         day_of_week = today.weekday()  # 0=Monday, 1=Tuesday, etc.
         
-        # Determine if today is a class day (MWF or TTh)
-        is_mwf = day_of_week in [0, 2, 4]  # Monday, Wednesday, Friday
-        is_tth = day_of_week in [1, 3]     # Tuesday, Thursday
+        # Only weekdays are regular class days (MWF or TTh)
+        if day_of_week > 4 and not force:
+            print(f"Today is {WEEKDAY_NAMES[day_of_week]}, which is not a regular class day; pass --force to create sessions anyway")
+            return
         
-        if not (is_mwf or is_tth):
-            print(f"Today is {['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'][day_of_week]}, which is not a regular class day")
-            choice = input("Do you want to create sessions anyway? (y/n): ")
-            if choice.lower() != 'y':
-                return
+        day_code = next(code for code, number in WEEKDAY_CODES.items() if number == day_of_week)
         
-        # Create sessions for each class
+        # Sessions that already exist for today are skipped by the insert itself
         sessions_created = 0
-        for i, class_obj in enumerate(classes):
-            # Check if a session already exists for today
-            existing_session = db.query(ClassSession).filter(
-                ClassSession.class_id == class_obj.id,
-                ClassSession.session_date == today
-            ).first()
-            
-            if existing_session:
-                print(f"Session for {class_obj.name} already exists for today")
-                continue
-            
+        for i, (class_id, class_name) in enumerate(classes):
             # Each class has a different start time based on the seed data pattern
             class_hour = 9 + i % 3  # 9AM, 10AM, 11AM (following seed pattern)
             
-            # Create session
-            session = ClassSessionCreate(
-                class_id=class_obj.id,
-                session_date=today,
-                start_time=datetime.combine(today, datetime.min.time()) + timedelta(hours=class_hour),
-                end_time=datetime.combine(today, datetime.min.time()) + timedelta(hours=class_hour+1, minutes=30),
-                notes=f"{['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'][day_of_week]} session for {class_obj.name}"
-            )
+            created = generate_class_sessions(db, class_id, ClassSessionScheduleCreate(
+                days=day_code,
+                start_time=time(hour=class_hour),
+                duration_minutes=90,
+                start_date=today,
+                end_date=today,
+                notes=f"{WEEKDAY_NAMES[day_of_week]} session for {class_name}"
+            ))
             
-            # Store in database
-            created_session = create_class_session(db, session)
-            sessions_created += 1
+            if not created:
+                print(f"Session for {class_name} already exists for today")
+                continue
             
-            print(f"Created session for {class_obj.name} at {created_session.start_time.strftime('%H:%M')} - {created_session.end_time.strftime('%H:%M')}")
+            sessions_created += len(created)
+            for session in created:
+                print(f"Created session for {class_name} at {session.start_time.strftime('%H:%M')} - {session.end_time.strftime('%H:%M')}")
         
         print(f"\nTotal sessions created: {sessions_created}")
         
@@ -72,4 +61,7 @@ def create_today_sessions():
         db.close()
 
 if __name__ == "__main__":
-    create_today_sessions()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Create today's class sessions")
+    parser.add_argument("--force", action="store_true", help="Create sessions even on a weekend")
+    args = parser.parse_args()
+    create_today_sessions(force=args.force)
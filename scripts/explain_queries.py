@@ -0,0 +1,115 @@
+import os
+import sys
+import argparse
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime, timedelta
+from sqlalchemy import func, select
+from database.db import SessionLocal
+from crud.attendance_view import effective_attendance
+from models.database import (
+    User, Class, ClassSession, Attendance, FaceEmbedding,
+    ClassAttendanceRollup, student_class_association
+)
+
+def hot_queries(student_id, session_id, class_id):
+    """The queries behind the busiest endpoints, keyed by a short description"""
+    enrolled = select(student_class_association.c.user_id).where(
+        student_class_association.c.class_id == class_id
+    )
+    now = datetime.now()
+    attendance = effective_attendance()
+
+    return {
+        "GET /attendance/student/{id} (history page)": select(
+            attendance.c.id, attendance.c.status, ClassSession.session_date, Class.name
+        ).select_from(attendance).join(
+            ClassSession, ClassSession.id == attendance.c.session_id
+        ).join(
+            Class, Class.id == ClassSession.class_id
+        ).where(
+            attendance.c.student_id == student_id
+        ).order_by(ClassSession.session_date.desc(), ClassSession.id.desc()).limit(51),
+
+        "GET /attendance/sessions/{id}/students": select(
+            attendance.c.student_id, attendance.c.status, User.username, User.full_name
+        ).select_from(attendance).outerjoin(
+            User, User.id == attendance.c.student_id
+        ).where(attendance.c.session_id == session_id),
+
+        "POST /attendance/check-in (attendance lookup)": select(Attendance.id).where(
+            Attendance.student_id == student_id,
+            Attendance.session_id == session_id
+        ),
+
+        "POST /attendance/check-in (class gallery)": select(
+            FaceEmbedding.user_id, FaceEmbedding.id
+        ).where(
+            FaceEmbedding.user_id.in_(enrolled),
+            FaceEmbedding.model_type == "deepface"
+        ),
+
+        "GET /classes/{id}/sessions": select(ClassSession.id, ClassSession.session_date).where(
+            ClassSession.class_id == class_id
+        ).order_by(ClassSession.session_date),
+
+        "GET /classes/me/classes (teacher)": select(Class.id, Class.name).where(
+            Class.teacher_id == select(Class.teacher_id).where(Class.id == class_id).scalar_subquery()
+        ),
+
+        "GET /admin/dashboard (enrollment counts)": select(
+            Class.id, func.count(student_class_association.c.user_id)
+        ).outerjoin(
+            student_class_association, student_class_association.c.class_id == Class.id
+        ).group_by(Class.id),
+
+        "GET /admin/dashboard (monthly attendance)": select(
+            ClassAttendanceRollup.month,
+            func.sum(ClassAttendanceRollup.present_count),
+            func.sum(ClassAttendanceRollup.late_count),
+            func.sum(ClassAttendanceRollup.absent_count)
+        ).where(
+            ClassAttendanceRollup.month >= (now - timedelta(days=150)).date()
+        ).group_by(ClassAttendanceRollup.month),
+    }
+
+def explain_queries(student_id=None, session_id=None, class_id=None):
+    """Print EXPLAIN ANALYZE output for the hot endpoint queries"""
+    db = SessionLocal()
+    try:
+        # Default to ids that actually have data so the plans are representative
+        if session_id is None or student_id is None:
+            sample = db.query(Attendance.student_id, Attendance.session_id).first()
+            if sample:
+                student_id = student_id if student_id is not None else sample.student_id
+                session_id = session_id if session_id is not None else sample.session_id
+        if class_id is None:
+            class_id = db.query(ClassSession.class_id).filter(ClassSession.id == session_id).scalar()
+
+        if student_id is None or session_id is None or class_id is None:
+            print("No attendance data found; pass --student-id, --session-id and --class-id explicitly")
+            return
+
+        print(f"Using student_id={student_id}, session_id={session_id}, class_id={class_id}")
+
+        connection = db.connection()
+        for name, statement in hot_queries(student_id, session_id, class_id).items():
+            compiled = statement.compile(dialect=connection.dialect)
+            plan = connection.exec_driver_sql(
+                f"EXPLAIN (ANALYZE, BUFFERS) {compiled}", compiled.params
+            ).fetchall()
+
+            print(f"\n=== {name} ===")
+            for line in plan:
+                print(line[0])
+    finally:
+        db.rollback()
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print EXPLAIN ANALYZE for the main endpoint queries")
+    parser.add_argument("--student-id", type=int, default=None)
+    parser.add_argument("--session-id", type=int, default=None)
+    parser.add_argument("--class-id", type=int, default=None)
+    args = parser.parse_args()
+    explain_queries(student_id=args.student_id, session_id=args.session_id, class_id=args.class_id)
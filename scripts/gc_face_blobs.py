@@ -0,0 +1,46 @@
+import os
+import sys
+import time
+import argparse
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.db import SessionLocal
+from models.database import FaceImage
+from services.blob_store import get_blob_store
+
+def collect_garbage(min_age_seconds=3600, dry_run=False):
+    """Delete face image and thumbnail blobs that no face_images row references any more"""
+    db = SessionLocal()
+    try:
+        # Both the crops and their thumbnails are blobs
+        crops = {key for (key,) in db.query(FaceImage.image_key).distinct()}
+        thumbnails = {
+            key for (key,) in db.query(FaceImage.thumbnail_key).filter(FaceImage.thumbnail_key.isnot(None)).distinct()
+        }
+        referenced = crops | thumbnails
+    finally:
+        db.close()
+
+    store = get_blob_store()
+    # Skip recent blobs: a registration may have stored the file but not committed its row yet
+    cutoff = time.time() - min_age_seconds
+    removed = 0
+    for key in list(store.keys()):
+        if key in referenced:
+            continue
+        modified = store.last_modified(key)
+        if modified is None or modified > cutoff:
+            continue
+        if not dry_run:
+            store.delete(key)
+        removed += 1
+
+    action = "Would remove" if dry_run else "Removed"
+    print(f"{action} {removed} unreferenced blobs ({len(crops)} crops and {len(thumbnails)} thumbnails referenced)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Remove face image blobs no longer referenced by the database")
+    parser.add_argument("--min-age-seconds", type=int, default=3600, help="Only remove blobs older than this")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    collect_garbage(min_age_seconds=args.min_age_seconds, dry_run=args.dry_run)
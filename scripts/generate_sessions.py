@@ -0,0 +1,66 @@
+import os
+import sys
+import argparse
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import date, datetime
+from database.db import SessionLocal
+from models.database import Class
+from crud.session_schedule import generate_class_sessions
+from schemas.class_schema import ClassSessionScheduleCreate
+
+def generate_sessions(class_ids, days, start_time, start_date, end_date, duration_minutes=90, skip_dates=None, notes=None):
+    """Create the sessions of a weekly schedule for each class, skipping ones that already exist"""
+    db = SessionLocal()
+    try:
+        query = db.query(Class.id, Class.name)
+        if class_ids:
+            query = query.filter(Class.id.in_(class_ids))
+        classes = query.all()
+        if not classes:
+            print("No classes found in the database")
+            return
+
+        schedule = ClassSessionScheduleCreate(
+            days=days,
+            start_time=start_time,
+            duration_minutes=duration_minutes,
+            start_date=start_date,
+            end_date=end_date,
+            skip_dates=skip_dates or [],
+            notes=notes
+        )
+
+        total = 0
+        for class_id, class_name in classes:
+            created = generate_class_sessions(db, class_id, schedule)
+            total += len(created)
+            print(f"{class_name}: created {len(created)} sessions")
+
+        print(f"\nTotal sessions created: {total}")
+    except ValueError as e:
+        print(f"Invalid schedule: {str(e)}")
+    except Exception as e:
+        print(f"Error creating sessions: {str(e)}")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create class sessions from a weekly schedule, e.g. MWF 10:00 for a semester")
+    parser.add_argument("--class-id", type=int, action="append", dest="class_ids",
+                        help="Class to schedule (repeatable); defaults to every class")
+    parser.add_argument("--days", required=True, help="Weekday letters, e.g. MWF or TTh")
+    parser.add_argument("--time", required=True, type=lambda value: datetime.strptime(value, "%H:%M").time(),
+                        help="Start time as HH:MM")
+    parser.add_argument("--start", required=True, type=date.fromisoformat, help="First day (YYYY-MM-DD)")
+    parser.add_argument("--end", required=True, type=date.fromisoformat, help="Last day (YYYY-MM-DD)")
+    parser.add_argument("--duration", type=int, default=90, help="Session length in minutes")
+    parser.add_argument("--skip", type=date.fromisoformat, action="append", default=[],
+                        help="Date without classes, e.g. a holiday (repeatable)")
+    parser.add_argument("--notes", default=None)
+    args = parser.parse_args()
+
+    generate_sessions(
+        args.class_ids, args.days, args.time, args.start, args.end,
+        duration_minutes=args.duration, skip_dates=args.skip, notes=args.notes
+    )
@@ -0,0 +1,31 @@
+import os
+import sys
+import argparse
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.db import SessionLocal
+from models.database import ClassAttendanceRollup, StudentAttendanceRollup
+from crud.attendance_rollup import rebuild_attendance_rollups
+
+def rebuild(class_id=None):
+    """Recompute the attendance rollup tables from the raw attendances"""
+    db = SessionLocal()
+    try:
+        rebuild_attendance_rollups(db, class_id=class_id)
+        
+        class_rows = db.query(ClassAttendanceRollup).count()
+        student_rows = db.query(StudentAttendanceRollup).count()
+        scope = f"class {class_id}" if class_id is not None else "all classes"
+        print(f"Rebuilt attendance rollups for {scope}")
+        print(f"Class/month rows: {class_rows}, student/class rows: {student_rows}")
+    except Exception as e:
+        db.rollback()
+        print(f"Error rebuilding attendance rollups: {str(e)}")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill the attendance rollup tables")
+    parser.add_argument("--class-id", type=int, default=None, help="Only rebuild a single class")
+    args = parser.parse_args()
+    rebuild(class_id=args.class_id)
@@ -223,7 +223,7 @@ def create_sample_data():
                 embedding=embedding_vector,  # Direct assignment - pgvector handles this
                 confidence_score=0.95,
                 device_id="test_device_001",
-                model_type="facenet512",
+                model_type="deepface",
                 registration_group_id="default_group"
             )
             db.add(embedding)
@@ -1,5 +1,8 @@
 from datetime import datetime, timedelta
-from typing import Optional, Union
+from typing import Optional, Tuple, Union
+from collections import OrderedDict
+import threading
+import time
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
@@ -8,6 +11,7 @@ from pydantic import BaseModel
 from database.db import get_db
 from models.database import User
 from config.app import settings
+from services.invalidation_bus import publish, subscribe
 
 
 # Secret key and algorithm configuration
@@ -22,20 +26,55 @@ class Token(BaseModel):
     access_token: str
     token_type: str
 
+class CurrentPrincipal(BaseModel):
+    """The authenticated caller, for endpoints that only need its identity and role."""
+    id: int
+    username: str
+    role: str
+    is_active: bool = True
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+# user id -> (expires_at, is_active, role)
+_user_state_cache: "OrderedDict[int, Tuple[float, bool, str]]" = OrderedDict()
+_user_state_lock = threading.Lock()
+
+def _evict_user_state(payload: dict):
+    with _user_state_lock:
+        _user_state_cache.pop(payload["user_id"], None)
+
+subscribe("user_state", _evict_user_state)
+
+def invalidate_user_state(user_id: int):
+    """Drop the cached active flag and role of a user in every worker, e.g. after it was updated or deleted."""
+    publish("user_state", {"user_id": user_id})
+
+def _get_user_state(db: Session, user_id: int) -> Optional[Tuple[bool, str]]:
+    now = time.monotonic()
+    with _user_state_lock:
+        cached = _user_state_cache.get(user_id)
+        if cached and cached[0] > now:
+            return cached[1], cached[2]
+
+    row = db.query(User.is_active, User.role).filter(User.id == user_id).first()
+    with _user_state_lock:
+        if row is None:
+            _user_state_cache.pop(user_id, None)
+            return None
+
+        _user_state_cache[user_id] = (now + settings.USER_STATE_CACHE_TTL_SECONDS, row.is_active, row.role)
+        _user_state_cache.move_to_end(user_id)
+        while len(_user_state_cache) > settings.USER_STATE_CACHE_MAX_SIZE:
+            _user_state_cache.popitem(last=False)
+    return row.is_active, row.role
+
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None, user: Optional[User] = None):
     to_encode = data.copy()
     
-    # Get user from database to include more information
-    username = data.get("sub")
-    if username:
-        db = next(get_db())  # Get database session
-        user = db.query(User).filter(User.username == username).first()
-        if user:
-            # Add user ID and role to the token
-            to_encode["user_id"] = user.id
-            to_encode["role"] = user.role
+    # Embed the already-authenticated user's ID and role so requests can skip the user lookup
+    if user is not None:
+        to_encode["user_id"] = user.id
+        to_encode["role"] = user.role
     
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -46,28 +85,56 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
+def _credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
+
+def _decode_token(token: str) -> dict:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-        token_data = TokenData(username=username)
     except JWTError:
-        raise credentials_exception
+        raise _credentials_exception()
+    
+    if payload.get("sub") is None:
+        raise _credentials_exception()
+    return payload
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    payload = _decode_token(token)
+    token_data = TokenData(username=payload.get("sub"))
     
     user = db.query(User).filter(User.username == token_data.username).first()
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
     
     return user
 
+def get_current_principal(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> CurrentPrincipal:
+    """
+    Build the caller from the token claims without loading the User row.
+    
+    The active flag and role come from a short-lived cache so deactivation and role
+    changes take effect within USER_STATE_CACHE_TTL_SECONDS (immediately on this worker).
+    Tokens issued without a user_id claim, or STATELESS_AUTH being off, fall back to the DB.
+    """
+    payload = _decode_token(token)
+    username = payload.get("sub")
+    user_id = payload.get("user_id")
+    
+    if not settings.STATELESS_AUTH or user_id is None:
+        user = get_current_user(token, db)
+        return CurrentPrincipal(id=user.id, username=user.username, role=user.role, is_active=user.is_active)
+    
+    state = _get_user_state(db, user_id)
+    if state is None:
+        raise _credentials_exception()
+    
+    is_active, role = state
+    return CurrentPrincipal(id=user_id, username=username, role=role, is_active=is_active)
+
 
 def get_current_active_user(current_user: User = Depends(get_current_user)):
     if not current_user.is_active:
@@ -75,7 +142,13 @@ def get_current_active_user(current_user: User = Depends(get_current_user)):
     return current_user
 
 
-def get_current_admin_user(current_user: User = Depends(get_current_active_user)):
+def get_current_active_principal(current_user: CurrentPrincipal = Depends(get_current_principal)):
+    if not current_user.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return current_user
+
+
+def get_current_admin_user(current_user: CurrentPrincipal = Depends(get_current_active_principal)):
     if current_user.role != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -84,10 +157,10 @@ def get_current_admin_user(current_user: User = Depends(get_current_active_user)
     return current_user
 
 
-def get_current_teacher_or_admin(current_user: User = Depends(get_current_active_user)):
+def get_current_teacher_or_admin(current_user: CurrentPrincipal = Depends(get_current_active_principal)):
     if current_user.role not in ["teacher", "admin"]:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions, teacher or admin role required"
         )
-    return current_user
\ No newline at end of file
+    return current_user
@@ -1,9 +1,91 @@
 from passlib.context import CryptContext
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from typing import Optional, Tuple
+import asyncio
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from config.app import settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Pin min/max rounds to the configured cost so hashes made with any other cost
+# are reported as needing an update and get rehashed on login
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS,
+)
+
+# bcrypt is CPU bound, so keep it off the event loop and off the shared threadpool
+_hash_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS or os.cpu_count() or 2,
+    thread_name_prefix="bcrypt"
+)
+
+# Successful verifications in login throughput mode: HMAC(stored hash, password) -> expires_at.
+# The key is salted with a per-process secret so the cache never holds anything reusable.
+_verify_cache_secret = secrets.token_bytes(32)
+_verify_cache: "OrderedDict[bytes, float]" = OrderedDict()
+_verify_cache_lock = threading.Lock()
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
\ No newline at end of file
+    return pwd_context.hash(password)
+
+def _verify_cache_key(plain_password: str, hashed_password: str) -> bytes:
+    message = f"{hashed_password}\0{plain_password}".encode()
+    return hmac.new(_verify_cache_secret, message, hashlib.sha256).digest()
+
+def _check_verify_cache(key: bytes) -> bool:
+    with _verify_cache_lock:
+        expires_at = _verify_cache.get(key)
+        if expires_at is None:
+            return False
+        if expires_at < time.monotonic():
+            del _verify_cache[key]
+            return False
+        return True
+
+def _remember_verified(key: bytes):
+    with _verify_cache_lock:
+        _verify_cache[key] = time.monotonic() + settings.PASSWORD_VERIFY_CACHE_TTL_SECONDS
+        _verify_cache.move_to_end(key)
+        while len(_verify_cache) > settings.PASSWORD_VERIFY_CACHE_MAX_SIZE:
+            _verify_cache.popitem(last=False)
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password on the bcrypt executor.
+
+    Returns (valid, new_hash); new_hash is set when the stored hash should be replaced
+    because it was made with a different cost factor.
+    """
+    cache_key = None
+    if settings.LOGIN_THROUGHPUT_MODE:
+        cache_key = _verify_cache_key(plain_password, hashed_password)
+        if _check_verify_cache(cache_key):
+            return True, None
+
+    loop = asyncio.get_running_loop()
+    valid, new_hash = await loop.run_in_executor(
+        _hash_executor, pwd_context.verify_and_update, plain_password, hashed_password
+    )
+
+    if valid and cache_key is not None and new_hash is None:
+        _remember_verified(cache_key)
+    return valid, new_hash
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    valid, _ = await verify_and_update_password_async(plain_password, hashed_password)
+    return valid
+
+async def get_password_hash_async(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hash_executor, pwd_context.hash, password)
@@ -0,0 +1,137 @@
+import hashlib
+import os
+import tempfile
+from typing import Iterator, Optional
+from config.app import settings
+from utils.logging import logger
+
+class BlobStore:
+    """
+    Content-addressed storage for binary blobs such as face crops.
+
+    A blob's key is the SHA-256 hex digest of its bytes, so storing the same bytes
+    twice keeps one copy. Objects live at "<namespace>/<aa>/<bb>/<digest>", a layout
+    that maps one-to-one onto object keys in an S3-compatible bucket.
+    """
+    namespace = "blobs"
+
+    @staticmethod
+    def key_for(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def object_name(self, key: str) -> str:
+        return f"{self.namespace}/{key[:2]}/{key[2:4]}/{key}"
+
+    def put(self, data: bytes) -> str:
+        """Store the bytes if they are not stored yet and return their key."""
+        raise NotImplementedError
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def stream(self, key: str, chunk_size: int = 64 * 1024) -> Optional[Iterator[bytes]]:
+        """Iterate over the blob in chunks, or None if it is missing."""
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def keys(self) -> Iterator[str]:
+        """Every stored key, for garbage collection."""
+        raise NotImplementedError
+
+    def last_modified(self, key: str) -> Optional[float]:
+        """When the blob was written, as a Unix timestamp, or None if it is missing."""
+        raise NotImplementedError
+
+class LocalBlobStore(BlobStore):
+    """Blob store on the local filesystem (or a shared volume mounted by every worker)."""
+
+    def __init__(self, root: str, namespace: str = "blobs"):
+        self.root = root
+        self.namespace = namespace
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *self.object_name(key).split("/"))
+
+    def put(self, data: bytes) -> str:
+        key = self.key_for(data)
+        path = self._path(key)
+        if os.path.exists(path):
+            # Refresh the timestamp so garbage collection treats the blob as freshly written
+            os.utime(path)
+            return key
+
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # Write to a temporary file and rename so readers never see a partial blob
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return key
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            logger.warning(f"Blob {key} is missing from {self.root}")
+            return None
+
+    def stream(self, key: str, chunk_size: int = 64 * 1024) -> Optional[Iterator[bytes]]:
+        try:
+            f = open(self._path(key), "rb")
+        except FileNotFoundError:
+            logger.warning(f"Blob {key} is missing from {self.root}")
+            return None
+
+        def chunks():
+            with f:
+                while True:
+                    chunk = f.read(chunk_size)
+                    if not chunk:
+                        break
+                    yield chunk
+        return chunks()
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def keys(self) -> Iterator[str]:
+        base = os.path.join(self.root, self.namespace)
+        for _, _, files in os.walk(base):
+            for name in files:
+                if not name.startswith(".tmp-"):
+                    yield name
+
+    def last_modified(self, key: str) -> Optional[float]:
+        try:
+            return os.path.getmtime(self._path(key))
+        except FileNotFoundError:
+            return None
+
+_blob_stores = {}
+
+def get_blob_store(namespace: str = "face-images") -> BlobStore:
+    """Return the configured blob store for a namespace (one instance per namespace)."""
+    if namespace not in _blob_stores:
+        if settings.BLOB_STORE_BACKEND == "local":
+            _blob_stores[namespace] = LocalBlobStore(settings.BLOB_STORE_PATH, namespace)
+        else:
+            raise ValueError(f"Unsupported blob store backend: {settings.BLOB_STORE_BACKEND}")
+    return _blob_stores[namespace]
@@ -0,0 +1,107 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+import numpy as np
+from config.app import settings
+
+@dataclass(frozen=True)
+class ProbeExtraction:
+    """
+    Face pipeline output for one check-in upload: the probe embeddings by model, or
+    the detection, completeness or anti-spoofing error that was returned for it.
+
+    Nothing here depends on the stored galleries, so it stays valid while faces are
+    registered or deleted; matching is redone on every request.
+    """
+    embeddings: Dict[str, np.ndarray] = field(default_factory=dict)
+    error_status: Optional[int] = None
+    error_detail: Optional[str] = None
+
+class CheckInResultCache:
+    """
+    Bounded TTL cache of probe extractions keyed by upload content.
+
+    Resubmissions of the same image (kiosk retries, flaky mobile uploads) skip
+    detection, anti-spoofing and embedding. Entries whose upload went on to record
+    a check-in are marked, so that replays of those can be told apart from retries
+    after an error. The cache is per worker process.
+    """
+
+    def __init__(self, ttl_seconds: float, max_size: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._entries: "OrderedDict[bytes, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.rejected_replays = 0
+
+    @staticmethod
+    def key_for(image_data: bytes, model: str, session_id: int, try_both_models: bool, config_version: int) -> bytes:
+        # The config version is part of the key so threshold changes take effect at once
+        digest = hashlib.sha256()
+        digest.update(image_data)
+        digest.update(f"\0{model}\0{session_id}\0{int(try_both_models)}\0{config_version}".encode())
+        return digest.digest()
+
+    def get(self, key: bytes) -> Optional[ProbeExtraction]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < now:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: bytes, result: ProbeExtraction):
+        # Shared between requests, so the cached vectors must not be modified in place
+        for embedding in result.embeddings.values():
+            embedding.setflags(write=False)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, result, False)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def mark_checked_in(self, key: bytes):
+        """Note that the upload cached under key recorded a check-in."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries[key] = (entry[0], entry[1], True)
+
+    def checked_in(self, key: bytes) -> bool:
+        """Whether the upload cached under key already recorded a check-in."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry[0] >= time.monotonic() and entry[2]
+
+    def record_rejected_replay(self):
+        with self._lock:
+            self.rejected_replays += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "rejected_replays": self.rejected_replays,
+            }
+
+check_in_cache = CheckInResultCache(
+    ttl_seconds=settings.CHECK_IN_RESULT_CACHE_TTL_SECONDS,
+    max_size=settings.CHECK_IN_RESULT_CACHE_MAX_SIZE,
+)
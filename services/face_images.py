@@ -0,0 +1,42 @@
+from typing import Optional, Tuple
+import cv2
+import numpy as np
+from services.blob_store import get_blob_store
+from utils.logging import logger
+
+# Longest side of the thumbnails shown on the face-management page
+THUMBNAIL_SIZE = 128
+THUMBNAIL_QUALITY = 80
+
+FULL_MEDIA_TYPE = "image/jpeg"
+THUMBNAIL_MEDIA_TYPE = "image/webp"
+
+def make_thumbnail(image_data: bytes, max_size: int = THUMBNAIL_SIZE) -> Optional[bytes]:
+    """Downscale an encoded face crop to a small WebP image; None if it cannot be decoded."""
+    img = cv2.imdecode(np.frombuffer(image_data, np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        return None
+
+    height, width = img.shape[:2]
+    scale = max_size / max(height, width)
+    if scale < 1:
+        img = cv2.resize(img, (max(1, int(width * scale)), max(1, int(height * scale))), interpolation=cv2.INTER_AREA)
+
+    ok, buf = cv2.imencode(".webp", img, [cv2.IMWRITE_WEBP_QUALITY, THUMBNAIL_QUALITY])
+    return buf.tobytes() if ok else None
+
+def store_face_crop(image_data: bytes) -> Tuple[str, Optional[str]]:
+    """Store a face crop and its thumbnail, returning (image_key, thumbnail_key)."""
+    store = get_blob_store()
+    image_key = store.put(image_data)
+
+    thumbnail_key = None
+    try:
+        thumbnail = make_thumbnail(image_data)
+        if thumbnail:
+            thumbnail_key = store.put(thumbnail)
+    except Exception as e:
+        # The full image is still served when there is no thumbnail
+        logger.error(f"Error creating face thumbnail: {str(e)}")
+
+    return image_key, thumbnail_key
@@ -1,12 +1,32 @@
+from dataclasses import dataclass
 from typing import Dict, Optional, Tuple, Literal, ClassVar
 import numpy as np
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 import os
 from utils.logging import logger
+from config.app import settings
 from deepface import DeepFace 
-from config.face_recognition_config import face_recognition_config
+from crud.face_recognition_config import get_face_recognition_config
 ModelType = Literal["insightface", "deepface"]
 
+@dataclass
+class DetectedFace:
+    """
+    A face found by one model's detector, in a form every model can embed.
+    
+    Lets both recognition networks run on a single detection, alignment and
+    anti-spoofing pass.
+    """
+    image: np.ndarray  # decoded upload, BGR
+    bbox: Tuple[int, int, int, int]  # x, y, w, h
+    # 5x2 points in InsightFace order: eyes, nose, mouth corners, each pair left to right in the image
+    landmarks: Optional[np.ndarray]
+    confidence: float
+    aligned_face: Optional[bytes]  # JPEG crop for storage
+    face_crop: Optional[np.ndarray] = None  # DeepFace's eye-aligned BGR crop, when it did the detection
+    spoof_result: Optional[dict] = None
+
 class FaceRecognitionBase:
     _instances: ClassVar[Dict[str, 'FaceRecognitionBase']] = {}
     
@@ -40,6 +60,14 @@ class FaceRecognitionBase:
         """Detect if the image is a spoof (photo/screen) or real face"""
         raise NotImplementedError("Subclass must implement this method")
     
+    def detect_face(self, image_data: bytes, check_spoofing=False) -> Tuple[Optional[DetectedFace], Optional[dict]]:
+        """Detect, check and crop the main face without embedding it; returns (face, None) or (None, error dict)"""
+        raise NotImplementedError("Subclass must implement this method")
+    
+    def embed_detected_face(self, detected: DetectedFace) -> Optional[np.ndarray]:
+        """Run only the recognition network on a face detected by this or another model"""
+        raise NotImplementedError("Subclass must implement this method")
+    
     def store_face_embedding(self, db: Session, user_id: int, embedding: np.ndarray, 
                  confidence: float, device_id: str = "web", model_type: str = None,
                  registration_group_id: str = None) -> int:
@@ -65,46 +93,57 @@ class FaceRecognitionBase:
             db.commit()
             db.refresh(db_embedding)
             logger.info(f"Stored face embedding for user {user_id} with model {model_to_use}")
+            
+            if settings.GALLERY_SNAPSHOTS:
+                from services.face_recognition.gallery_snapshot import add_to_snapshot
+                add_to_snapshot(db_embedding.id, user_id, model_to_use, embedding)
             return db_embedding.id
         except Exception as e:
             logger.error(f"Error storing face embedding: {str(e)}")
             db.rollback()
             return 0
     
-    def compare_face(self, embedding: np.ndarray, db: Session, class_id: int, threshold: float = face_recognition_config.SIMILARITY_THRESHOLD) -> Tuple[bool, Optional[int], float]:
-        """Compare a face embedding with stored embeddings"""
-        from models.database import FaceEmbedding, Class
+    def compare_face(self, embedding: np.ndarray, db: Session, class_id: int, threshold: Optional[float] = None,
+                     model_type: Optional[str] = None) -> Tuple[bool, Optional[int], float]:
+        """
+        Compare a face embedding with the stored embeddings of a class's students.
         
+        Only embeddings made by model_type (this service's model by default) are scored,
+        and threshold defaults to that model's configured similarity threshold.
+        """
+        from models.database import Class, student_class_association
+        from services.face_recognition.gallery import load_gallery
+        from services.face_recognition.gallery_snapshot import current_gallery
+        
+        model_type = model_type or self.model_type
         try:
-            # Query students enrolled in the class
-            class_obj = db.query(Class).filter(Class.id == class_id).first()
-            if not class_obj:
+            if not db.query(Class.id).filter(Class.id == class_id).first():
                 logger.error(f"Class with ID {class_id} not found.")
                 return False, None, 0.0
 
-            enrolled_student_ids = [student.id for student in class_obj.students]
-
-            # Query embeddings for enrolled students
-            stored_embeddings = db.query(FaceEmbedding).filter(
-                FaceEmbedding.user_id.in_(enrolled_student_ids)
-            ).all()
+            # Embeddings of the students enrolled in the class
+            enrolled_student_ids = select(student_class_association.c.user_id).where(
+                student_class_association.c.class_id == class_id
+            )
+            if settings.GALLERY_SNAPSHOTS:
+                gallery = current_gallery(db, model_type)
+                mask = np.isin(gallery.user_ids, db.execute(enrolled_student_ids).scalars().all())
+            else:
+                gallery = load_gallery(db, user_ids=enrolled_student_ids, model_type=model_type)
+                mask = None
 
-            if not stored_embeddings:
+            index, similarity = gallery.best_match(embedding, mask=mask)
+            if index is None:
                 logger.warning(f"No stored embeddings found for class {class_id}.")
                 return False, None, 0.0
 
-            best_score = 0.0
-            best_user_id = None
-
-            for stored in stored_embeddings:
-                stored_embedding = stored.embedding
-                similarity = self.calculate_similarity(embedding, stored_embedding)
-
-                if similarity > best_score:
-                    best_score = similarity
-                    best_user_id = stored.user_id
+            # Normalize to 0-1 range like calculate_similarity
+            best_score = min(max(similarity, 0.0), 1.0)
+            best_user_id = int(gallery.user_ids[index])
 
             # Check if the best match exceeds the threshold
+            if threshold is None:
+                threshold = get_face_recognition_config().get_similarity_threshold(model_type)
             if best_score >= threshold:
                 return True, best_user_id, best_score
             else:
@@ -136,7 +175,7 @@ class FaceRecognitionBase:
     def get_user_embeddings_count(self, db: Session, user_id: int) -> int:
         """Get the number of face embeddings stored for a user"""
         from models.database import FaceEmbedding
-        return db.query(FaceEmbedding).filter(FaceEmbedding.user_id == user_id).count()
+        return db.query(func.count(FaceEmbedding.id)).filter(FaceEmbedding.user_id == user_id).scalar()
         
     def preprocess_image(self, file_data: bytes) -> bytes:
         """Preprocess image for better face detection"""
@@ -6,8 +6,8 @@ import tempfile
 from concurrent.futures import ThreadPoolExecutor
 import functools
 from utils.logging import logger
-from services.face_recognition.base import FaceRecognitionBase
-from config.face_recognition_config import face_recognition_config
+from services.face_recognition.base import DetectedFace, FaceRecognitionBase
+from crud.face_recognition_config import get_face_recognition_config
 from deepface import DeepFace 
 
 def process_batch_embeddings(self, image_data_list: List[bytes]) -> List[Tuple[Optional[np.ndarray], float, Optional[bytes]]]:
@@ -35,6 +35,28 @@ def process_batch_embeddings(self, image_data_list: List[bytes]) -> List[Tuple[O
     
     return results
 
+def _landmarks_from_facial_area(facial_area: dict) -> Optional[np.ndarray]:
+    """DeepFace's named landmarks as InsightFace's 5x2 array, or None if the detector gave fewer"""
+    names = ["left_eye", "right_eye", "nose", "mouth_left", "mouth_right"]
+    points = [facial_area.get(name) for name in names]
+    if any(point is None for point in points):
+        return None
+    # DeepFace names points from the subject's side; InsightFace orders them left to right in the image
+    eyes = sorted(points[0:2])
+    mouth = sorted(points[3:5])
+    return np.array([*eyes, points[2], *mouth], dtype=np.float32)
+
+def _eye_aligned_crop(img: np.ndarray, bbox: Tuple[int, int, int, int], landmarks: Optional[np.ndarray]) -> np.ndarray:
+    """Rotate the image so the eyes are level (as DeepFace's align=True does), then crop the face box"""
+    x, y, w, h = bbox
+    if landmarks is not None:
+        (left_x, left_y), (right_x, right_y) = landmarks[0], landmarks[1]
+        angle = np.degrees(np.arctan2(right_y - left_y, right_x - left_x))
+        center = ((left_x + right_x) / 2.0, (left_y + right_y) / 2.0)
+        rotation = cv2.getRotationMatrix2D(center, angle, 1.0)
+        img = cv2.warpAffine(img, rotation, (img.shape[1], img.shape[0]), borderMode=cv2.BORDER_CONSTANT)
+    return img[max(0, y):y+h, max(0, x):x+w]
+
 class DeepFaceService(FaceRecognitionBase):
     """DeepFace implementation of face recognition service"""
     
@@ -193,63 +215,9 @@ class DeepFaceService(FaceRecognitionBase):
             spoof_result = None
             if check_spoofing:
                 logger.info("Step 3: Anti-spoofing check")
-                try:
-                    anti_spoof_faces = self.deepface.extract_faces(
-                        img_path=temp_path,
-                        enforce_detection=False,
-                        anti_spoofing=True
-                    )
-                    
-                    logger.info(f"Anti-spoofing check completed, found {len(anti_spoof_faces) if anti_spoof_faces else 0} faces")
-                    
-                    if not anti_spoof_faces or len(anti_spoof_faces) == 0:
-                        logger.warning("No faces detected in anti-spoofing check")
-                        spoof_result = {
-                            "is_spoof": False,  # Assume not spoof if we can't check
-                            "details": {"message": "No faces detected in anti-spoofing check"},
-                            "method": "deepface_no_faces"
-                        }
-                    else:
-                        face_obj = anti_spoof_faces[0]
-                        logger.info(f"Anti-spoofing face object: {face_obj}")
-                        is_real = face_obj.get("is_real", False)
-                        confidence = face_obj.get("antispoof_score", 0.0)
-                        
-                        logger.info(f"Anti-spoofing result: is_real={is_real}, confidence={confidence}")
-                        
-                        if not is_real:
-                            logger.warning("Spoofing detected by DeepFace")
-                            return None, 0.0, None, {
-                                "error": "Spoofing detected. Please use a real face for authentication.",
-                                "is_spoof": True,
-                                "details": {
-                                    "confidence": confidence,
-                                    "is_real": is_real,
-                                    "method": "deepface_native"
-                                }
-                            }
-                        
-                        spoof_result = {
-                            "is_spoof": False,
-                            "details": {
-                                "message": "Face appears to be real",
-                                "confidence": confidence,
-                                "is_real": is_real
-                            },
-                            "method": "deepface_native"
-                        }
-                        
-                except Exception as spoof_e:
-                    logger.error(f"Error during anti-spoofing check: {str(spoof_e)}")
-                    # Don't fail the entire process if anti-spoofing fails
-                    spoof_result = {
-                        "is_spoof": False,
-                        "details": {
-                            "message": "Anti-spoofing check failed, proceeding without spoofing detection",
-                            "error": str(spoof_e)
-                        },
-                        "method": "deepface_error"
-                    }
+                spoof_result = self._anti_spoofing_check(temp_path)
+                if spoof_result.get("is_spoof", False):
+                    return None, 0.0, None, spoof_result
             
             # STEP 4: Embedding Extraction
             logger.info("Step 4: Embedding extraction")
@@ -338,6 +306,160 @@ class DeepFaceService(FaceRecognitionBase):
                 "method": "error"
             }    
 
+    def _anti_spoofing_check(self, img) -> dict:
+        """DeepFace's native anti-spoofing on an image path or BGR array"""
+        try:
+            anti_spoof_faces = self.deepface.extract_faces(
+                img_path=img,
+                enforce_detection=False,
+                anti_spoofing=True
+            )
+            
+            logger.info(f"Anti-spoofing check completed, found {len(anti_spoof_faces) if anti_spoof_faces else 0} faces")
+            
+            if not anti_spoof_faces or len(anti_spoof_faces) == 0:
+                logger.warning("No faces detected in anti-spoofing check")
+                return {
+                    "is_spoof": False,  # Assume not spoof if we can't check
+                    "details": {"message": "No faces detected in anti-spoofing check"},
+                    "method": "deepface_no_faces"
+                }
+            
+            face_obj = anti_spoof_faces[0]
+            is_real = face_obj.get("is_real", False)
+            confidence = face_obj.get("antispoof_score", 0.0)
+            
+            logger.info(f"Anti-spoofing result: is_real={is_real}, confidence={confidence}")
+            
+            if not is_real:
+                logger.warning("Spoofing detected by DeepFace")
+                return {
+                    "error": "Spoofing detected. Please use a real face for authentication.",
+                    "is_spoof": True,
+                    "details": {
+                        "confidence": confidence,
+                        "is_real": is_real,
+                        "method": "deepface_native"
+                    }
+                }
+            
+            return {
+                "is_spoof": False,
+                "details": {
+                    "message": "Face appears to be real",
+                    "confidence": confidence,
+                    "is_real": is_real
+                },
+                "method": "deepface_native"
+            }
+            
+        except Exception as spoof_e:
+            logger.error(f"Error during anti-spoofing check: {str(spoof_e)}")
+            # Don't fail the entire process if anti-spoofing fails
+            return {
+                "is_spoof": False,
+                "details": {
+                    "message": "Anti-spoofing check failed, proceeding without spoofing detection",
+                    "error": str(spoof_e)
+                },
+                "method": "deepface_error"
+            }
+    
+    def detect_face(self, image_data: bytes, check_spoofing=False) -> Tuple[Optional[DetectedFace], Optional[dict]]:
+        """Detect and align the main face with DeepFace's detector, check completeness and (optionally) spoofing"""
+        try:
+            nparr = np.frombuffer(image_data, np.uint8)
+            img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            if img is None:
+                logger.error("Failed to decode image")
+                return None, {"error": "Failed to read image"}
+            
+            try:
+                face_objs = self.deepface.extract_faces(
+                    img_path=img,
+                    detector_backend=self.detector_backend,
+                    enforce_detection=True,
+                    align=True
+                )
+            except Exception as face_e:
+                logger.error(f"Face detection failed: {str(face_e)}")
+                return None, {"error": "No face detected in the image"}
+            
+            if not face_objs:
+                logger.warning("No faces detected in image")
+                return None, {"error": "No face detected in the image"}
+            
+            is_complete, error_message = self.check_face_completeness(face_objs[0], img)
+            if not is_complete:
+                logger.warning(f"Incomplete face detected: {error_message}")
+                return None, {
+                    "error": f"Incomplete face: {error_message}",
+                    "incomplete_face": True,
+                    "is_spoof": False
+                }
+            
+            spoof_result = None
+            if check_spoofing:
+                spoof_result = self._anti_spoofing_check(img)
+                if spoof_result.get("is_spoof", False):
+                    return None, spoof_result
+            
+            facial_area = face_objs[0]["facial_area"]
+            img_h, img_w = img.shape[:2]
+            x = max(0, facial_area.get("x", 0))
+            y = max(0, facial_area.get("y", 0))
+            w = min(img_w - x, facial_area.get("w", 0))
+            h = min(img_h - y, facial_area.get("h", 0))
+            
+            aligned_face_bytes = None
+            face_img = img[y:y+h, x:x+w]
+            if face_img.size == 0:
+                face_img = img
+            ok, buf = cv2.imencode('.jpg', face_img)
+            if ok:
+                aligned_face_bytes = buf.tobytes()
+            
+            # extract_faces returns the aligned crop as RGB floats in [0, 1]
+            face_crop = (face_objs[0]["face"][:, :, ::-1] * 255).round().astype(np.uint8)
+            
+            return DetectedFace(
+                image=img,
+                bbox=(x, y, w, h),
+                landmarks=_landmarks_from_facial_area(facial_area),
+                confidence=face_objs[0].get("confidence", 0.9),
+                aligned_face=aligned_face_bytes,
+                face_crop=face_crop,
+                spoof_result=spoof_result
+            ), None
+        
+        except Exception as e:
+            logger.error(f"DeepFace face detection failed: {str(e)}")
+            return None, {
+                "error": f"Face extraction failed: {str(e)}",
+                "is_spoof": False,
+                "method": "error"
+            }
+    
+    def embed_detected_face(self, detected: DetectedFace) -> Optional[np.ndarray]:
+        """Facenet512 embedding of a detected face, skipping DeepFace's own detector"""
+        face_crop = detected.face_crop
+        if face_crop is None:
+            face_crop = _eye_aligned_crop(detected.image, detected.bbox, detected.landmarks)
+        if face_crop.size == 0:
+            return None
+        
+        embedding_obj = self.deepface.represent(
+            img_path=face_crop,
+            model_name=self.deepface_model_name,
+            detector_backend="skip",
+            enforce_detection=False,
+            normalization="base",
+            align=False
+        )
+        if not embedding_obj:
+            return None
+        return np.array(embedding_obj[0]["embedding"])
+    
     def _fallback_extraction(self, temp_path: str) -> Tuple[Optional[np.ndarray], float, Optional[bytes]]:
         try:
             img = cv2.imread(temp_path)
@@ -454,6 +576,7 @@ class DeepFaceService(FaceRecognitionBase):
             logger.error(f"Error in memory management: {str(e)}")
     
     def check_face_completeness(self, face_obj, img=None) -> Tuple[bool, Optional[str]]:
+        config = get_face_recognition_config()
         try:
             if not face_obj:
                 return False, "No face detected"
@@ -486,25 +609,25 @@ class DeepFaceService(FaceRecognitionBase):
             if "img" in face_obj:
                 face_img = face_obj["img"]
                 mean_intensity = face_img.mean()
-                if mean_intensity < face_recognition_config.MIN_FACE_INTENSITY:
+                if mean_intensity < config.MIN_FACE_INTENSITY:
                     return False, "Possible occlusion detected (low intensity)"
             
             # Check face size
             width_ratio = w / img_width
             height_ratio = h / img_height
-            if width_ratio < face_recognition_config.FACE_MIN_WIDTH_RATIO:
+            if width_ratio < config.FACE_MIN_WIDTH_RATIO:
                 return False, "Face too small (width)"
-            if height_ratio < face_recognition_config.FACE_MIN_HEIGHT_RATIO:
+            if height_ratio < config.FACE_MIN_HEIGHT_RATIO:
                 return False, "Face too small (height)"
             
             # Check if face is too close to edge
-            margin_ratio = face_recognition_config.FACE_MARGIN_RATIO
+            margin_ratio = config.FACE_MARGIN_RATIO
             margin_x, margin_y = img_width * margin_ratio, img_height * margin_ratio
             if x < margin_x or (x + w) > (img_width - margin_x) or y < margin_y or (y + h) > (img_height - margin_y):
                 return False, "Face too close to image edge"
             
             # Check detection confidence
-            if "confidence" in face_obj and face_obj["confidence"] < face_recognition_config.FACE_DETECTION_CONFIDENCE:
+            if "confidence" in face_obj and face_obj["confidence"] < config.FACE_DETECTION_CONFIDENCE:
                 return False, "Face detection confidence too low"
             
             return True, None
@@ -0,0 +1,43 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+import numpy as np
+from utils.logging import logger
+from services.face_recognition.base import DetectedFace, FaceRecognitionBase
+
+# Runs the second model's recognition network while the first runs in the caller's thread
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="face-recognition")
+
+def other_model(model: str) -> str:
+    return "insightface" if model == "deepface" else "deepface"
+
+def _embed(service: FaceRecognitionBase, detected: DetectedFace) -> Optional[np.ndarray]:
+    try:
+        return service.embed_detected_face(detected)
+    except Exception as e:
+        logger.error(f"Error embedding face with {service.model_type}: {str(e)}")
+        return None
+
+def extract_dual_embeddings(
+    primary_model: str,
+    image_data: bytes,
+    check_spoofing: bool = False
+) -> Tuple[Optional[DetectedFace], Dict[str, Optional[np.ndarray]], Optional[dict]]:
+    """
+    Embed one upload with both models from a single detection pass.
+
+    The image is decoded, detected, checked for completeness and (optionally)
+    anti-spoofed once, by the primary model; both recognition networks then run
+    on that face concurrently. Returns (face, {model: embedding or None}, None),
+    or (None, {}, error dict) if no usable face was found.
+    """
+    primary = FaceRecognitionBase.get_instance(model_type=primary_model)
+    secondary = FaceRecognitionBase.get_instance(model_type=other_model(primary_model))
+
+    detected, error = primary.detect_face(image_data, check_spoofing)
+    if detected is None:
+        return None, {}, error
+
+    secondary_future = _executor.submit(_embed, secondary, detected)
+    embeddings = {primary.model_type: _embed(primary, detected)}
+    embeddings[secondary.model_type] = secondary_future.result()
+    return detected, embeddings, None
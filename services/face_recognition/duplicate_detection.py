@@ -1,83 +1,77 @@
 from typing import List, Dict, Optional, Tuple
 import numpy as np
 from utils.logging import logger
-from config.face_recognition_config import face_recognition_config
-from models.database import User, FaceEmbedding
+from crud.face_recognition_config import get_face_recognition_config
+from models.database import User
+from services.face_recognition.gallery import load_gallery
+from services.face_recognition.gallery_snapshot import REMOVED_USER_ID, current_gallery
+from config.app import settings
+
 class DuplicateFaceDetector:
     """Service to detect duplicate faces across users"""
     
     @staticmethod
-    async def check_for_duplicates(embedding: np.ndarray, current_user_id: Optional[int] = None) -> Tuple[bool, Optional[Dict]]:
-        if not face_recognition_config.ENABLE_DUPLICATE_DETECTION:
+    async def check_for_duplicates(embedding: np.ndarray, model_type: str, current_user_id: Optional[int] = None) -> Tuple[bool, Optional[Dict]]:
+        """Find the registered face closest to the embedding among other users' embeddings from the same model"""
+        config = get_face_recognition_config()
+        if not config.ENABLE_DUPLICATE_DETECTION:
             return False, None
             
         try:
-            import pickle
-            from sqlalchemy import select, join
-            from database.db import get_db, SessionLocal
+            from database.db import SessionLocal
             
-            highest_similarity = 0.0
-            most_similar_user = None
-            most_similar_embedding = None
-            duplicate_threshold = face_recognition_config.DUPLICATE_DETECTION_THRESHOLD
+            duplicate_threshold = config.get_duplicate_detection_threshold(model_type)
             
             # Create a database session directly without using async for
             db = SessionLocal()
             try:
-                # Query for all face embeddings except those belonging to current user
-                query = select(FaceEmbedding, User).join(User, FaceEmbedding.user_id == User.id)
-                if current_user_id is not None:
-                    query = query.where(FaceEmbedding.user_id != current_user_id)
-                    
-                result = db.execute(query)
-                embeddings_with_users = result.all()
+                # The model's embeddings except those belonging to the current user, as arrays
+                if settings.GALLERY_SNAPSHOTS:
+                    gallery = current_gallery(db, model_type)
+                    mask = gallery.user_ids != REMOVED_USER_ID
+                    if current_user_id is not None:
+                        mask &= gallery.user_ids != current_user_id
+                else:
+                    gallery = load_gallery(db, model_type=model_type, exclude_user_id=current_user_id)
+                    mask = None
+                index, highest_similarity = gallery.best_match(embedding, mask=mask)
+                if index is None:
+                    return False, None
                 
-                for face_embedding, user in embeddings_with_users:
-                    if face_embedding.embedding is not None:
-                        try:
-                            # Use pickle.loads to unpickle the embedding
-                            # stored_embedding = pickle.loads(face_embedding.embedding)
-                            stored_embedding = face_embedding.embedding
-                            
-                            # Calculate cosine similarity
-                            similarity = np.dot(embedding, stored_embedding) / (
-                                np.linalg.norm(embedding) * np.linalg.norm(stored_embedding)
-                            )
-
-                            logger.debug(f"Similarity with user {user.username}: {similarity:.4f}")
-                            
-                            # Track highest similarity
-                            if similarity > highest_similarity:
-                                highest_similarity = similarity
-                                most_similar_user = user
-                                most_similar_embedding = face_embedding
-                            
-                            # Check if this exceeds the duplicate threshold
-                            if similarity >= duplicate_threshold:
-                                logger.warning(f"Duplicate face detected! Similarity: {similarity:.4f}, User ID: {user.id}, Username: {user.username}")
-                                return True, {
-                                    "is_duplicate": True,
-                                    "similarity": float(similarity),
-                                    "duplicate_user_id": user.id,
-                                    "duplicate_user_name": user.full_name if user.full_name else user.username,
-                                    "embedding_id": face_embedding.id,
-                                    "model_type": face_embedding.model_type
-                                }
-                        except Exception as inner_e:
-                            logger.error(f"Error processing embedding {face_embedding.id}: {str(inner_e)}")
-                            continue
+                most_similar_user = db.query(User.id, User.username, User.full_name).filter(
+                    User.id == int(gallery.user_ids[index])
+                ).first()
             finally:
                 db.close()
             
-            if most_similar_user and highest_similarity > (duplicate_threshold * 0.8):
+            if most_similar_user is None:
+                return False, None
+            
+            user_name = most_similar_user.full_name if most_similar_user.full_name else most_similar_user.username
+            embedding_id = int(gallery.embedding_ids[index])
+            model_type = gallery.model_types[index]
+            
+            # Check if the closest face exceeds the duplicate threshold
+            if highest_similarity >= duplicate_threshold:
+                logger.warning(f"Duplicate face detected! Similarity: {highest_similarity:.4f}, User ID: {most_similar_user.id}, Username: {most_similar_user.username}")
+                return True, {
+                    "is_duplicate": True,
+                    "similarity": float(highest_similarity),
+                    "duplicate_user_id": most_similar_user.id,
+                    "duplicate_user_name": user_name,
+                    "embedding_id": embedding_id,
+                    "model_type": model_type
+                }
+            
+            if highest_similarity > (duplicate_threshold * 0.8):
                 logger.info(f"Similar face detected (but below threshold). Similarity: {highest_similarity:.4f}, User ID: {most_similar_user.id}")
                 return False, {
                     "is_duplicate": False,
                     "highest_similarity": float(highest_similarity),
                     "most_similar_user_id": most_similar_user.id,
-                    "most_similar_user_name": most_similar_user.full_name if most_similar_user.full_name else most_similar_user.username,
-                    "embedding_id": most_similar_embedding.id if most_similar_embedding else None,
-                    "model_type": most_similar_embedding.model_type if most_similar_embedding else None
+                    "most_similar_user_name": user_name,
+                    "embedding_id": embedding_id,
+                    "model_type": model_type
                 }
                 
             return False, None
@@ -0,0 +1,231 @@
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+import numpy as np
+from sqlalchemy import Integer, SmallInteger, case, cast, func, select
+from sqlalchemy.orm import Session
+from models.database import FaceEmbedding
+from config.app import settings
+from utils.logging import logger
+
+EMBEDDING_DIM = 512
+
+@dataclass(frozen=True)
+class EmbeddingGallery:
+    """
+    Read-only set of stored embeddings for matching, held as parallel arrays.
+
+    Row i of `embeddings` belongs to embedding_ids[i] / user_ids[i] / model_types[i].
+    Built straight from result rows, so no ORM objects or identity-map entries are created.
+    """
+    embedding_ids: np.ndarray
+    user_ids: np.ndarray
+    model_types: np.ndarray
+    embeddings: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.embedding_ids)
+
+    def cosine_similarities(self, embedding: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Cosine similarity of the embedding against every row (or the given row indices); 0 where either vector is zero."""
+        matrix = self.embeddings if rows is None else self.embeddings[rows]
+        if not len(matrix):
+            return np.zeros(0, dtype=np.float32)
+
+        query = np.asarray(embedding, dtype=np.float32)
+        query_norm = np.linalg.norm(query)
+        norms = np.linalg.norm(matrix, axis=1) * query_norm
+        dots = matrix @ query
+        return np.divide(dots, norms, out=np.zeros_like(dots), where=norms > 0)
+
+    def best_match(self, embedding: np.ndarray, mask: Optional[np.ndarray] = None) -> Tuple[Optional[int], float]:
+        """
+        Index and similarity of the closest row, or (None, 0.0) when there is nothing to match.
+
+        mask limits the candidates to a boolean selection of rows. A small selection is
+        scored on its own; a large one is scored in place so the matrix is not copied.
+        """
+        if mask is None:
+            similarities = self.cosine_similarities(embedding)
+            candidates = None
+        else:
+            candidates = np.flatnonzero(mask)
+            if 2 * len(candidates) < len(self):
+                similarities = self.cosine_similarities(embedding, rows=candidates)
+            else:
+                similarities = np.where(mask, self.cosine_similarities(embedding), -np.inf)
+                candidates = None
+
+        if not len(similarities):
+            return None, 0.0
+        index = int(np.argmax(similarities))
+        similarity = float(similarities[index])
+        if similarity == -np.inf:
+            return None, 0.0
+        return (index if candidates is None else int(candidates[index])), similarity
+
+    @classmethod
+    def empty(cls, dim: int = EMBEDDING_DIM) -> "EmbeddingGallery":
+        return cls(
+            embedding_ids=np.zeros(0, dtype=np.int64),
+            user_ids=np.zeros(0, dtype=np.int64),
+            model_types=np.zeros(0, dtype=object),
+            embeddings=np.zeros((0, dim), dtype=np.float32),
+        )
+
+# Small integer codes so the model type travels as a fixed-width column in binary COPY
+MODEL_TYPE_CODES = {"insightface": 1, "deepface": 2}
+_MODEL_TYPE_NAMES = np.array([None, "insightface", "deepface"], dtype=object)
+
+_COPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+_COPY_HEADER_SIZE = len(_COPY_SIGNATURE) + 8  # flags + header extension length
+_COPY_TRAILER = b"\xff\xff"
+
+def _copy_record_dtype(dim: int) -> np.dtype:
+    """One binary COPY tuple of (id int4, user_id int4, model code int2, embedding vector)."""
+    return np.dtype([
+        ("field_count", ">i2"),
+        ("id_length", ">i4"), ("id", ">i4"),
+        ("user_id_length", ">i4"), ("user_id", ">i4"),
+        ("model_length", ">i4"), ("model", ">i2"),
+        # pgvector's binary format: int16 dimensions, int16 unused, then big-endian float4s
+        ("vector_length", ">i4"), ("dim", ">i2"), ("unused", ">i2"), ("vector", ">f4", (dim,)),
+    ])
+
+class _GalleryCopySink:
+    """
+    File-like target for COPY ... TO STDOUT (FORMAT binary) that decodes whole tuples
+    straight into preallocated arrays as the chunks arrive, without per-row objects.
+    """
+
+    def __init__(self, capacity: int, dim: int):
+        self.dtype = _copy_record_dtype(dim)
+        self.dim = dim
+        self.count = 0
+        self.embedding_ids = np.empty(capacity, dtype=np.int64)
+        self.user_ids = np.empty(capacity, dtype=np.int64)
+        self.model_codes = np.empty(capacity, dtype=np.int16)
+        self.embeddings = np.empty((capacity, dim), dtype=np.float32)
+        self._pending = bytearray()
+        self._header_read = False
+
+    def _grow(self, needed: int):
+        # Rows committed between the count and the COPY
+        capacity = max(needed, 2 * len(self.embedding_ids))
+        self.embedding_ids = np.resize(self.embedding_ids, capacity)
+        self.user_ids = np.resize(self.user_ids, capacity)
+        self.model_codes = np.resize(self.model_codes, capacity)
+        self.embeddings = np.resize(self.embeddings, (capacity, self.dim))
+
+    def write(self, data) -> int:
+        self._pending += data
+        if not self._header_read:
+            if len(self._pending) < _COPY_HEADER_SIZE:
+                return len(data)
+            if bytes(self._pending[:len(_COPY_SIGNATURE)]) != _COPY_SIGNATURE:
+                raise ValueError("Unexpected COPY header")
+            extension_length = int.from_bytes(self._pending[_COPY_HEADER_SIZE - 4:_COPY_HEADER_SIZE], "big")
+            if len(self._pending) < _COPY_HEADER_SIZE + extension_length:
+                return len(data)
+            del self._pending[:_COPY_HEADER_SIZE + extension_length]
+            self._header_read = True
+
+        records = len(self._pending) // self.dtype.itemsize
+        if records:
+            decoded = np.frombuffer(self._pending, dtype=self.dtype, count=records)
+            if (decoded["field_count"] != 4).any() or (decoded["dim"] != self.dim).any():
+                raise ValueError("Unexpected COPY tuple layout")
+            if self.count + records > len(self.embedding_ids):
+                self._grow(self.count + records)
+
+            end = self.count + records
+            self.embedding_ids[self.count:end] = decoded["id"]
+            self.user_ids[self.count:end] = decoded["user_id"]
+            self.model_codes[self.count:end] = decoded["model"]
+            # Byte-swaps into the preallocated matrix in one vectorized copy
+            self.embeddings[self.count:end] = decoded["vector"]
+            self.count = end
+            del decoded
+            del self._pending[:records * self.dtype.itemsize]
+        return len(data)
+
+    def gallery(self) -> EmbeddingGallery:
+        if bytes(self._pending) != _COPY_TRAILER:
+            raise ValueError("Incomplete COPY stream")
+        return EmbeddingGallery(
+            embedding_ids=self.embedding_ids[:self.count],
+            user_ids=self.user_ids[:self.count],
+            model_types=_MODEL_TYPE_NAMES[self.model_codes[:self.count]],
+            embeddings=self.embeddings[:self.count],
+        )
+
+def _gallery_conditions(user_ids=None, model_type: Optional[str] = None, exclude_user_id: Optional[int] = None) -> List:
+    conditions = [FaceEmbedding.embedding.isnot(None), FaceEmbedding.user_id.isnot(None)]
+    if user_ids is not None:
+        conditions.append(FaceEmbedding.user_id.in_(user_ids))
+    if model_type is not None:
+        conditions.append(FaceEmbedding.model_type == model_type)
+    if exclude_user_id is not None:
+        conditions.append(FaceEmbedding.user_id != exclude_user_id)
+    return conditions
+
+def _load_gallery_rows(db: Session, conditions: List) -> EmbeddingGallery:
+    rows = db.execute(select(
+        FaceEmbedding.id, FaceEmbedding.user_id, FaceEmbedding.model_type, FaceEmbedding.embedding
+    ).where(*conditions)).all()
+    if not rows:
+        return EmbeddingGallery.empty()
+
+    return EmbeddingGallery(
+        embedding_ids=np.fromiter((row.id for row in rows), dtype=np.int64, count=len(rows)),
+        user_ids=np.fromiter((row.user_id for row in rows), dtype=np.int64, count=len(rows)),
+        model_types=np.array([row.model_type for row in rows], dtype=object),
+        embeddings=np.vstack([row.embedding for row in rows]).astype(np.float32, copy=False),
+    )
+
+def _load_gallery_copy(db: Session, conditions: List) -> EmbeddingGallery:
+    connection = db.connection()
+    capacity = db.execute(select(func.count(FaceEmbedding.id)).where(*conditions)).scalar()
+    if not capacity:
+        return EmbeddingGallery.empty()
+
+    model_code = case(
+        *[(FaceEmbedding.model_type == name, code) for name, code in MODEL_TYPE_CODES.items()],
+        else_=0
+    )
+    query = select(
+        cast(FaceEmbedding.id, Integer),
+        cast(FaceEmbedding.user_id, Integer),
+        cast(model_code, SmallInteger),
+        FaceEmbedding.embedding
+    ).where(*conditions)
+    compiled = query.compile(dialect=connection.dialect, compile_kwargs={"literal_binds": True})
+
+    sink = _GalleryCopySink(capacity, EMBEDDING_DIM)
+    with connection.connection.cursor() as cursor:
+        cursor.copy_expert(f"COPY ({compiled}) TO STDOUT WITH (FORMAT binary)", sink)
+    return sink.gallery()
+
+def load_gallery(
+    db: Session,
+    user_ids=None,
+    model_type: Optional[str] = None,
+    exclude_user_id: Optional[int] = None
+) -> EmbeddingGallery:
+    """
+    Load embeddings as an EmbeddingGallery.
+
+    user_ids may be a list or a subquery of user ids; model_type and exclude_user_id
+    narrow the rows further. On psycopg2 the rows are streamed with binary COPY and
+    decoded straight into one float32 matrix; otherwise (or if COPY fails) they come
+    from a plain column select.
+    """
+    conditions = _gallery_conditions(user_ids, model_type, exclude_user_id)
+
+    if settings.GALLERY_BINARY_COPY and db.get_bind().dialect.driver == "psycopg2":
+        try:
+            with db.begin_nested():
+                return _load_gallery_copy(db, conditions)
+        except Exception as e:
+            logger.warning(f"Binary gallery load failed, falling back to a row query: {str(e)}")
+
+    return _load_gallery_rows(db, conditions)
@@ -0,0 +1,368 @@
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional, Tuple
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from models.database import FaceEmbedding
+from config.app import settings
+from utils.logging import logger
+from services.invalidation_bus import subscribe
+from services.face_recognition.gallery import (
+    EMBEDDING_DIM, MODEL_TYPE_CODES, EmbeddingGallery, _gallery_conditions, load_gallery
+)
+
+try:
+    import fcntl
+except ImportError:  # Windows: snapshot writers are not serialized across processes
+    fcntl = None
+
+# Snapshot file layout (little-endian):
+#   64-byte header: magic, format version, dimensions, rows used, row capacity,
+#   highest live embedding id, rows removed since the last compaction
+#   int64[capacity] embedding ids, int64[capacity] user ids, int16[capacity] model codes,
+#   then the float32[capacity, dim] matrix, each section starting on a 64-byte boundary
+#
+# Rows are appended in place into the spare capacity and deletes overwrite the row's
+# user id with REMOVED_USER_ID, so registering or deleting a face writes a few hundred
+# bytes. Readers map the whole file once and see both through the shared page cache,
+# reading the row count from the mapped header. Compaction drops removed rows and
+# regrows the capacity; it writes a new file and renames it into place.
+SNAPSHOT_MAGIC = b"FACEGAL\x00"
+SNAPSHOT_VERSION = 2
+_HEADER = np.dtype([
+    ("magic", "S8"), ("version", "<u4"), ("dim", "<u4"),
+    ("count", "<i8"), ("capacity", "<i8"), ("max_id", "<i8"), ("removed", "<i8"),
+])
+_ALIGNMENT = 64
+REMOVED_USER_ID = -1
+
+# Spare rows allocated on each compaction, as a fraction of the live rows
+_GROWTH = 0.5
+_MIN_SPARE_ROWS = 256
+# Compact in the background once this fraction of the rows is removed or the spare capacity is nearly used
+_COMPACT_REMOVED_FRACTION = 0.25
+_COMPACT_FILL_FRACTION = 0.9
+
+# One snapshot per model type: embeddings from different models are never scored against each other
+SNAPSHOT_FILE = "embeddings.{model_type}.gallery"
+
+def _align(offset: int) -> int:
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+def _section_offsets(capacity: int, dim: int) -> Tuple[int, int, int, int, int]:
+    ids_offset = _align(_HEADER.itemsize)
+    user_ids_offset = _align(ids_offset + 8 * capacity)
+    models_offset = _align(user_ids_offset + 8 * capacity)
+    matrix_offset = _align(models_offset + 2 * capacity)
+    return ids_offset, user_ids_offset, models_offset, matrix_offset, matrix_offset + 4 * capacity * dim
+
+def snapshot_path(model_type: str) -> str:
+    return os.path.join(settings.GALLERY_SNAPSHOT_PATH, SNAPSHOT_FILE.format(model_type=model_type))
+
+def _header(dim: int, count: int, capacity: int, max_id: int, removed: int) -> bytes:
+    header = np.zeros((), dtype=_HEADER)
+    header["magic"], header["version"], header["dim"] = SNAPSHOT_MAGIC, SNAPSHOT_VERSION, dim
+    header["count"], header["capacity"], header["max_id"], header["removed"] = count, capacity, max_id, removed
+    return header.tobytes()
+
+def _read_header(f) -> np.void:
+    """The header as a writable copy; write it back with f.write(header.tobytes())."""
+    f.seek(0)
+    header = np.frombuffer(f.read(_HEADER.itemsize), dtype=_HEADER).copy()[0]
+    # Fixed-width bytes fields come back without their trailing NULs
+    if header["magic"] != SNAPSHOT_MAGIC.rstrip(b"\x00") or header["version"] != SNAPSHOT_VERSION:
+        raise ValueError(f"{f.name} is not a version {SNAPSHOT_VERSION} gallery snapshot")
+    return header
+
+def write_snapshot(path: str, gallery: EmbeddingGallery) -> None:
+    """Write a gallery with spare capacity to a temporary file next to `path` and rename it into place."""
+    count = len(gallery)
+    dim = gallery.embeddings.shape[1]
+    capacity = count + max(_MIN_SPARE_ROWS, int(count * _GROWTH))
+    ids_offset, user_ids_offset, models_offset, matrix_offset, size = _section_offsets(capacity, dim)
+    max_id = int(gallery.embedding_ids.max()) if count else 0
+    model_codes = np.fromiter(
+        (MODEL_TYPE_CODES.get(model_type, 0) for model_type in gallery.model_types), dtype=np.int16, count=count
+    )
+
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.truncate(size)
+            f.write(_header(dim, count, capacity, max_id, 0))
+            for offset, array, dtype in (
+                (ids_offset, gallery.embedding_ids, "<i8"),
+                (user_ids_offset, gallery.user_ids, "<i8"),
+                (models_offset, model_codes, "<i2"),
+                (matrix_offset, gallery.embeddings, "<f4"),
+            ):
+                f.seek(offset)
+                f.write(np.ascontiguousarray(array, dtype=dtype).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        # Workers that already mapped the old file keep reading it until they reopen
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+class _MappedSnapshot:
+    """A snapshot file mapped read-only at its full capacity; rows appended later show up through the mapping."""
+
+    def __init__(self, path: str, model_type: str):
+        # Mapped through the handle that was checked, in case the path is renamed over meanwhile
+        with open(path, "rb") as f:
+            header = _read_header(f)
+            self.inode = os.fstat(f.fileno()).st_ino
+            dim, capacity = int(header["dim"]), int(header["capacity"])
+            ids_offset, user_ids_offset, models_offset, matrix_offset, _ = _section_offsets(capacity, dim)
+            self.header = np.memmap(f, dtype=_HEADER, mode="r", shape=(1,))
+            self.embedding_ids = np.memmap(f, dtype="<i8", mode="r", offset=ids_offset, shape=(capacity,))
+            self.user_ids = np.memmap(f, dtype="<i8", mode="r", offset=user_ids_offset, shape=(capacity,))
+            self.embeddings = np.memmap(f, dtype="<f4", mode="r", offset=matrix_offset, shape=(capacity, dim))
+        self.model_type = model_type
+        self.verified_at = 0.0
+        self._gallery: Optional[EmbeddingGallery] = None
+
+    def gallery(self) -> EmbeddingGallery:
+        # Views of the mapping; removed rows stay in it with REMOVED_USER_ID as their user id
+        count = int(self.header[0]["count"])
+        if self._gallery is None or len(self._gallery) != count:
+            self._gallery = EmbeddingGallery(
+                embedding_ids=self.embedding_ids[:count],
+                user_ids=self.user_ids[:count],
+                model_types=np.full(count, self.model_type, dtype=object),
+                embeddings=self.embeddings[:count],
+            )
+        return self._gallery
+
+    def state(self) -> Tuple[int, int]:
+        """(live rows, highest live embedding id), to compare with the database."""
+        header = self.header[0]
+        return int(header["count"] - header["removed"]), int(header["max_id"])
+
+@contextmanager
+def _writer_lock(model_type: str):
+    """Serialize writes to one model's snapshot across worker processes."""
+    os.makedirs(settings.GALLERY_SNAPSHOT_PATH, exist_ok=True)
+    with open(os.path.join(settings.GALLERY_SNAPSHOT_PATH, f".{model_type}.lock"), "w") as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+# The snapshots this process has mapped, by path; the request threads and the
+# invalidation listener both touch them
+_mapped: Dict[str, _MappedSnapshot] = {}
+_mapped_lock = threading.Lock()
+
+def _mapped_snapshot(path: str, model_type: str) -> Optional[_MappedSnapshot]:
+    try:
+        inode = os.stat(path).st_ino
+    except FileNotFoundError:
+        return None
+    with _mapped_lock:
+        mapped = _mapped.get(path)
+        if mapped is None or mapped.inode != inode:
+            try:
+                mapped = _MappedSnapshot(path, model_type)
+            except (FileNotFoundError, ValueError) as e:
+                # Renamed away meanwhile, or left by an older version: rebuilt by the caller
+                logger.info(f"Gallery snapshot {path} cannot be mapped: {str(e)}")
+                return None
+            _mapped[path] = mapped
+        return mapped
+
+def _reverify_snapshot(payload: dict):
+    # Embeddings were changed outside the snapshot writers; check the database on the next read
+    with _mapped_lock:
+        for mapped in _mapped.values():
+            mapped.verified_at = 0.0
+
+subscribe("face_gallery", _reverify_snapshot)
+
+def _database_state(db: Session, model_type: str) -> Tuple[int, int]:
+    count, max_id = db.execute(
+        select(func.count(FaceEmbedding.id), func.max(FaceEmbedding.id)).where(*_gallery_conditions(model_type=model_type))
+    ).one()
+    return count, max_id or 0
+
+def rebuild_snapshot(db: Session, model_type: str) -> EmbeddingGallery:
+    """Write a fresh snapshot of one model's stored embeddings from the database."""
+    path = snapshot_path(model_type)
+    # Loaded under the writer lock so an embedding appended meanwhile is not overwritten
+    with _writer_lock(model_type):
+        gallery = load_gallery(db, model_type=model_type)
+        write_snapshot(path, gallery)
+    logger.info(f"Wrote gallery snapshot with {len(gallery)} embeddings to {path}")
+    mapped = _mapped_snapshot(path, model_type)
+    return mapped.gallery() if mapped else gallery
+
+def current_gallery(db: Session, model_type: str) -> EmbeddingGallery:
+    """
+    The gallery of every embedding stored by one model, memory-mapped from its shared snapshot.
+
+    All workers map the same file, so the matrix lives once in the page cache.
+    Removed rows are still present with REMOVED_USER_ID as their user id and must be
+    masked out. At most every GALLERY_SNAPSHOT_VERIFY_SECONDS the live row count and
+    highest id are checked against the database, and the snapshot is rebuilt if
+    changes were made without going through add_to_snapshot/remove_from_snapshot.
+    """
+    path = snapshot_path(model_type)
+    mapped = _mapped_snapshot(path, model_type)
+    if mapped is None:
+        return rebuild_snapshot(db, model_type)
+
+    now = time.monotonic()
+    if now - mapped.verified_at >= settings.GALLERY_SNAPSHOT_VERIFY_SECONDS:
+        if _database_state(db, model_type) != mapped.state():
+            logger.info(f"{model_type} gallery snapshot is out of date, rebuilding")
+            return rebuild_snapshot(db, model_type)
+        with _mapped_lock:
+            mapped.verified_at = now
+    return mapped.gallery()
+
+def compact_snapshot(model_type: str) -> None:
+    """Rewrite a snapshot without its removed rows and with fresh spare capacity."""
+    path = snapshot_path(model_type)
+    with _writer_lock(model_type):
+        try:
+            snapshot = _MappedSnapshot(path, model_type)
+        except (FileNotFoundError, ValueError):
+            # Built from the database on the next read
+            return
+        gallery = snapshot.gallery()
+        live = np.flatnonzero(gallery.user_ids != REMOVED_USER_ID)
+        write_snapshot(path, EmbeddingGallery(
+            embedding_ids=gallery.embedding_ids[live],
+            user_ids=gallery.user_ids[live],
+            model_types=gallery.model_types[live],
+            embeddings=gallery.embeddings[live],
+        ))
+    logger.info(f"Compacted {model_type} gallery snapshot to {len(live)} embeddings")
+
+_compacting = set()
+_compacting_lock = threading.Lock()
+
+def _compact_in_background(model_type: str) -> None:
+    with _compacting_lock:
+        if model_type in _compacting:
+            return
+        _compacting.add(model_type)
+
+    def run():
+        try:
+            compact_snapshot(model_type)
+        except Exception as e:
+            logger.error(f"Error compacting {model_type} gallery snapshot: {str(e)}")
+        finally:
+            with _compacting_lock:
+                _compacting.discard(model_type)
+
+    threading.Thread(target=run, name=f"gallery-compaction-{model_type}", daemon=True).start()
+
+def _needs_compaction(header: np.ndarray) -> bool:
+    count, capacity, removed = int(header["count"]), int(header["capacity"]), int(header["removed"])
+    return removed > _COMPACT_REMOVED_FRACTION * max(count, 1) or count >= _COMPACT_FILL_FRACTION * capacity
+
+def add_to_snapshot(embedding_id: int, user_id: int, model_type: str, embedding: np.ndarray) -> None:
+    """Append one stored embedding to its model's shared snapshot, in place."""
+    if model_type not in MODEL_TYPE_CODES:
+        return
+    vector = np.asarray(embedding, dtype="<f4").reshape(EMBEDDING_DIM)
+    path = snapshot_path(model_type)
+
+    try:
+        with _writer_lock(model_type):
+            try:
+                f = open(path, "r+b")
+            except FileNotFoundError:
+                # Built from the database on the next read
+                return
+            with f:
+                header = _read_header(f)
+                count, capacity = int(header["count"]), int(header["capacity"])
+                if count >= capacity:
+                    header = None
+                else:
+                    ids_offset, user_ids_offset, models_offset, matrix_offset, _ = _section_offsets(capacity, int(header["dim"]))
+                    # A rebuild that ran after the row was committed already has it
+                    present = False
+                    if embedding_id <= header["max_id"]:
+                        f.seek(ids_offset)
+                        present = bool((np.frombuffer(f.read(8 * count), dtype="<i8") == embedding_id).any())
+                    if not present:
+                        # The row first, then the header that makes it visible
+                        for offset, data in (
+                            (ids_offset + 8 * count, np.array(embedding_id, dtype="<i8")),
+                            (user_ids_offset + 8 * count, np.array(user_id, dtype="<i8")),
+                            (models_offset + 2 * count, np.array(MODEL_TYPE_CODES[model_type], dtype="<i2")),
+                            (matrix_offset + 4 * EMBEDDING_DIM * count, vector),
+                        ):
+                            f.seek(offset)
+                            f.write(data.tobytes())
+                        f.flush()
+                        header["count"] = count + 1
+                        header["max_id"] = max(int(header["max_id"]), embedding_id)
+                        f.seek(0)
+                        f.write(header.tobytes())
+        if header is None:
+            # No spare capacity left: compact now, which also makes room for the next rows
+            compact_snapshot(model_type)
+            add_to_snapshot(embedding_id, user_id, model_type, embedding)
+        elif _needs_compaction(header):
+            _compact_in_background(model_type)
+    except Exception as e:
+        logger.error(f"Error updating gallery snapshot: {str(e)}")
+
+def remove_from_snapshot(embedding_ids: Iterable[int]) -> None:
+    """Mark deleted embeddings as removed in the shared snapshots, in place."""
+    removed_ids = np.fromiter(embedding_ids, dtype=np.int64)
+
+    # The caller only knows the ids, so each partition drops whichever of them it holds
+    for model_type in MODEL_TYPE_CODES:
+        path = snapshot_path(model_type)
+        try:
+            with _writer_lock(model_type):
+                try:
+                    f = open(path, "r+b")
+                except FileNotFoundError:
+                    continue
+                with f:
+                    header = _read_header(f)
+                    count, capacity = int(header["count"]), int(header["capacity"])
+                    ids_offset, user_ids_offset, _, _, _ = _section_offsets(capacity, int(header["dim"]))
+                    f.seek(ids_offset)
+                    ids = np.frombuffer(f.read(8 * count), dtype="<i8")
+                    f.seek(user_ids_offset)
+                    user_ids = np.frombuffer(f.read(8 * count), dtype="<i8").copy()
+
+                    rows = np.flatnonzero(np.isin(ids, removed_ids) & (user_ids != REMOVED_USER_ID))
+                    if not len(rows):
+                        continue
+                    marker = np.array(REMOVED_USER_ID, dtype="<i8").tobytes()
+                    for row in rows:
+                        f.seek(user_ids_offset + 8 * int(row))
+                        f.write(marker)
+                    f.flush()
+
+                    user_ids[rows] = REMOVED_USER_ID
+                    live_ids = ids[user_ids != REMOVED_USER_ID]
+                    header["removed"] = int(header["removed"]) + len(rows)
+                    header["max_id"] = int(live_ids.max()) if len(live_ids) else 0
+                    f.seek(0)
+                    f.write(header.tobytes())
+            if _needs_compaction(header):
+                _compact_in_background(model_type)
+        except Exception as e:
+            logger.error(f"Error updating {model_type} gallery snapshot: {str(e)}")
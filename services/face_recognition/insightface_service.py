@@ -2,8 +2,8 @@ from typing import Optional, Tuple, Dict, Any
 import numpy as np
 import cv2
 from utils.logging import logger
-from services.face_recognition.base import FaceRecognitionBase
-from config.face_recognition_config import face_recognition_config
+from services.face_recognition.base import DetectedFace, FaceRecognitionBase
+from crud.face_recognition_config import get_face_recognition_config
 
 class InsightFaceService(FaceRecognitionBase):
     """InsightFace implementation of face recognition service"""
@@ -39,12 +39,13 @@ class InsightFaceService(FaceRecognitionBase):
         Returns:
             Tuple of (is_complete, error_message)
         """
+        config = get_face_recognition_config()
         try:
             # Get image dimensions
             img_height, img_width = image.shape[:2]
             
             # Check face detection confidence
-            if face.det_score < face_recognition_config.FACE_DETECTION_CONFIDENCE:
+            if face.det_score < config.FACE_DETECTION_CONFIDENCE:
                 return False, "Face detection confidence too low"
             
             # Get face bounding box
@@ -59,14 +60,14 @@ class InsightFaceService(FaceRecognitionBase):
             width_ratio = face_width / img_width
             height_ratio = face_height / img_height
             
-            if width_ratio < face_recognition_config.FACE_MIN_WIDTH_RATIO:
+            if width_ratio < config.FACE_MIN_WIDTH_RATIO:
                 return False, "Face too small (width)"
                 
-            if height_ratio < face_recognition_config.FACE_MIN_HEIGHT_RATIO:
+            if height_ratio < config.FACE_MIN_HEIGHT_RATIO:
                 return False, "Face too small (height)"
             
             # Check if face is too close to the edge of the frame
-            margin_ratio = face_recognition_config.FACE_MARGIN_RATIO
+            margin_ratio = config.FACE_MARGIN_RATIO
             margin_x = img_width * margin_ratio
             margin_y = img_height * margin_ratio
             
@@ -95,30 +96,33 @@ class InsightFaceService(FaceRecognitionBase):
             logger.error(f"Error checking face completeness: {str(e)}")
             return False, f"Error checking face completeness: {str(e)}"
     
-    def extract_face_embedding(self, image_data: bytes, check_spoofing=False) -> Tuple[Optional[np.ndarray], float, Optional[bytes], Optional[dict]]:
-        """Extract embedding using InsightFace with optional anti-spoofing check"""
+    def detect_face(self, image_data: bytes, check_spoofing=False) -> Tuple[Optional[DetectedFace], Optional[dict]]:
+        """Detect the main face with InsightFace's detector, check completeness and (optionally) spoofing"""
         try:
             spoof_result = None
             
             # Decode the image first (needed for both face detection and anti-spoofing)
             nparr = np.frombuffer(image_data, np.uint8)
-            img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            if img is None:
+            bgr_img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            if bgr_img is None:
                 logger.error("Failed to decode image")
-                return None, 0.0, None, {"error": "Failed to decode image"}
+                return None, {"error": "Failed to decode image"}
                 
             # RGB conversion (InsightFace expects RGB)
-            img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+            img = cv2.cvtColor(bgr_img, cv2.COLOR_BGR2RGB)
             
-            # Detect faces first - needed for both completeness check and anti-spoofing
-            faces = self.app.get(img)
+            from insightface.app.common import Face
             
-            if not faces:
+            # Only the detector runs here; recognition happens in embed_detected_face
+            bboxes, kpss = self.app.det_model.detect(img, max_num=0, metric="default")
+            
+            if bboxes.shape[0] == 0:
                 logger.warning("No face detected in the image")
-                return None, 0.0, None, {"error": "No face detected in the image"}
+                return None, {"error": "No face detected in the image"}
             
             # Get the face with highest detection score
-            face = max(faces, key=lambda x: x.det_score)
+            best = int(np.argmax(bboxes[:, 4]))
+            face = Face(bbox=bboxes[best, :4], kps=kpss[best] if kpss is not None else None, det_score=bboxes[best, 4])
             
             # Check face completeness FIRST - no point doing anti-spoofing if face is incomplete
             is_complete, error_message = self.check_face_completeness(face, img)
@@ -129,7 +133,7 @@ class InsightFaceService(FaceRecognitionBase):
                     "error": f"Incomplete face: {error_message}",
                     "incomplete_face": True
                 }
-                return None, 0.0, None, face_completeness_result
+                return None, face_completeness_result
             
             # Only perform anti-spoofing after verifying the face is complete
             if check_spoofing:
@@ -137,42 +141,68 @@ class InsightFaceService(FaceRecognitionBase):
     
                 if spoof_result.get("is_spoof", False):
                     logger.warning("Spoofing detected in InsightFace, skipping embedding extraction")
-                    return None, 0.0, None, spoof_result
+                    return None, spoof_result
         
-            # Get aligned face image for storage (optional)
+            x1, y1, x2, y2 = face.bbox.astype(int)
+            
+            # Get face image for storage (optional)
             aligned_face_bytes = None
             try:
-                # First try using the built-in method if available
-                if hasattr(face, 'bbox_crop') and callable(face.bbox_crop):
-                    aligned_face = face.bbox_crop(img)
-                    if aligned_face is not None:
-                        # Convert to bytes for storage
-                        aligned_face_bgr = cv2.cvtColor(aligned_face, cv2.COLOR_RGB2BGR)
-                        _, buf = cv2.imencode('.jpg', aligned_face_bgr)
-                        aligned_face_bytes = buf.tobytes()
-                else:
-                    # Manual crop as fallback
-                    bbox = face.bbox.astype(int)
-                    x1, y1, x2, y2 = bbox
-                    # Add some margin (20%)
-                    h, w = y2-y1, x2-x1
-                    x1 = max(0, x1 - int(w*0.1))
-                    y1 = max(0, y1 - int(h*0.1))
-                    x2 = min(img.shape[1], x2 + int(w*0.1))
-                    y2 = min(img.shape[0], y2 + int(h*0.1))
-                    # Crop and convert
-                    aligned_face = img[y1:y2, x1:x2]
-                    aligned_face_bgr = cv2.cvtColor(aligned_face, cv2.COLOR_RGB2BGR)
-                    _, buf = cv2.imencode('.jpg', aligned_face_bgr)
-                    aligned_face_bytes = buf.tobytes()
+                # Add some margin (20%)
+                h, w = y2-y1, x2-x1
+                cx1 = max(0, x1 - int(w*0.1))
+                cy1 = max(0, y1 - int(h*0.1))
+                cx2 = min(img.shape[1], x2 + int(w*0.1))
+                cy2 = min(img.shape[0], y2 + int(h*0.1))
+                _, buf = cv2.imencode('.jpg', bgr_img[cy1:cy2, cx1:cx2])
+                aligned_face_bytes = buf.tobytes()
             except Exception as e:
                 logger.warning(f"Failed to crop face: {str(e)}")
 
-            return face.embedding, float(face.det_score), aligned_face_bytes, spoof_result
+            return DetectedFace(
+                image=bgr_img,
+                bbox=(int(x1), int(y1), int(x2 - x1), int(y2 - y1)),
+                landmarks=face.kps,
+                confidence=float(face.det_score),
+                aligned_face=aligned_face_bytes,
+                spoof_result=spoof_result
+            ), None
             
+        except Exception as e:
+            logger.error(f"Error detecting face: {str(e)}")
+            return None, {"error": str(e)}
+    
+    def embed_detected_face(self, detected: DetectedFace) -> Optional[np.ndarray]:
+        """ArcFace embedding of a detected face, aligned on its five landmarks"""
+        from insightface.app.common import Face
+        
+        img = cv2.cvtColor(detected.image, cv2.COLOR_BGR2RGB)
+        x, y, w, h = detected.bbox
+        
+        landmarks = detected.landmarks
+        if landmarks is None:
+            # The other detector gave no full landmark set; find them with ours
+            bboxes, kpss = self.app.det_model.detect(img, max_num=0, metric="default")
+            if bboxes.shape[0] == 0 or kpss is None:
+                logger.warning("InsightFace found no landmarks for the detected face")
+                return None
+            landmarks = kpss[int(np.argmax(bboxes[:, 4]))]
+        
+        face = Face(bbox=np.array([x, y, x + w, y + h], dtype=np.float32), kps=landmarks, det_score=detected.confidence)
+        return self.app.models["recognition"].get(img, face)
+    
+    def extract_face_embedding(self, image_data: bytes, check_spoofing=False) -> Tuple[Optional[np.ndarray], float, Optional[bytes], Optional[dict]]:
+        """Extract embedding using InsightFace with optional anti-spoofing check"""
+        detected, error = self.detect_face(image_data, check_spoofing)
+        if detected is None:
+            return None, 0.0, None, error
+        
+        try:
+            embedding = self.embed_detected_face(detected)
         except Exception as e:
             logger.error(f"Error extracting face embedding: {str(e)}")
             return None, 0.0, None, {"error": str(e)}
+        return embedding, detected.confidence, detected.aligned_face, detected.spoof_result
     
     def detect_spoofing(self, image, face) -> dict:
         """
@@ -237,7 +267,7 @@ class InsightFaceService(FaceRecognitionBase):
             score = float(pred[0][0])
             label = int(np.argmax(pred))
         
-            threshold = face_recognition_config.ANTI_SPOOFING_THRESHOLD if hasattr(face_recognition_config, 'ANTI_SPOOFING_THRESHOLD') else 0.5
+            threshold = get_face_recognition_config().ANTI_SPOOFING_THRESHOLD
             
             if label == 0: 
                 is_spoof = not (score > threshold)  # Only not spoof if score > threshold
@@ -289,7 +319,7 @@ class InsightFaceService(FaceRecognitionBase):
         """Fallback method for anti-spoofing detection (basic check)"""
         try:
             # Simple check - if we have a valid face with good confidence, assume it's not a spoof
-            if face is not None and hasattr(face, 'det_score') and face.det_score > face_recognition_config.FACE_DETECTION_CONFIDENCE:
+            if face is not None and hasattr(face, 'det_score') and face.det_score > get_face_recognition_config().FACE_DETECTION_CONFIDENCE:
                 return {"is_spoof": False}
             else:
                 return {"is_spoof": True, "error": "Face detection confidence too low"}
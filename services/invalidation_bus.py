@@ -0,0 +1,159 @@
+import json
+import os
+import select
+import threading
+import uuid
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from config.app import settings
+from utils.logging import logger
+
+Handler = Callable[[dict], None]
+
+class InvalidationBus:
+    """
+    Broadcasts small invalidation messages (config changes, cache evictions) to every worker.
+
+    Handlers are registered per topic with subscribe(). publish() runs the local
+    handlers right away and delivers the message to the other workers, which run
+    their handlers for it. Handlers must be idempotent and quick.
+    """
+
+    def __init__(self):
+        self._handlers: Dict[str, List[Handler]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def subscribe(self, topic: str, handler: Handler) -> None:
+        with self._lock:
+            if handler not in self._handlers[topic]:
+                self._handlers[topic].append(handler)
+
+    def dispatch(self, topic: str, payload: dict) -> None:
+        with self._lock:
+            handlers = list(self._handlers.get(topic, ()))
+        for handler in handlers:
+            try:
+                handler(payload)
+            except Exception as e:
+                logger.error(f"Error handling invalidation message on {topic}: {str(e)}")
+
+    def publish(self, topic: str, payload: Optional[dict] = None, db: Optional[Session] = None) -> None:
+        raise NotImplementedError
+
+    def start(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+class LocalInvalidationBus(InvalidationBus):
+    """In-process bus for a single worker, scripts and tests."""
+
+    def publish(self, topic: str, payload: Optional[dict] = None, db: Optional[Session] = None) -> None:
+        self.dispatch(topic, payload or {})
+
+class PostgresInvalidationBus(InvalidationBus):
+    """
+    Bus on Postgres LISTEN/NOTIFY.
+
+    Each worker keeps one dedicated connection LISTENing on the channel in a daemon
+    thread. Messages carry the sending process's id so it skips its own echo, since
+    it already ran its handlers when publishing. Notifications sent through a
+    session are only delivered if that session's transaction commits.
+    """
+
+    def __init__(self, database_url: str, channel: str):
+        super().__init__()
+        self.database_url = database_url
+        self.channel = channel
+        self.origin = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    def publish(self, topic: str, payload: Optional[dict] = None, db: Optional[Session] = None) -> None:
+        payload = payload or {}
+        self.dispatch(topic, payload)
+
+        message = json.dumps({"topic": topic, "payload": payload, "origin": self.origin})
+        statement = text("SELECT pg_notify(:channel, :message)")
+        params = {"channel": self.channel, "message": message}
+        try:
+            if db is not None:
+                db.execute(statement, params)
+            else:
+                from database.db import engine
+                with engine.begin() as connection:
+                    connection.execute(statement, params)
+        except Exception as e:
+            # Other workers catch up through their TTLs and periodic checks
+            logger.error(f"Error publishing invalidation message on {topic}: {str(e)}")
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._listen_forever, name="invalidation-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    def _listen_forever(self):
+        import psycopg2
+
+        backoff = 1.0
+        while not self._stopping.is_set():
+            connection = None
+            try:
+                connection = psycopg2.connect(self.database_url)
+                connection.autocommit = True
+                with connection.cursor() as cursor:
+                    cursor.execute(f'LISTEN "{self.channel}"')
+                logger.info(f"Listening for invalidation messages on {self.channel}")
+                backoff = 1.0
+
+                while not self._stopping.is_set():
+                    if select.select([connection], [], [], 1.0) == ([], [], []):
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        self._handle(connection.notifies.pop(0).payload)
+            except Exception as e:
+                logger.error(f"Invalidation listener error, reconnecting in {backoff:.0f}s: {str(e)}")
+                self._stopping.wait(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                if connection is not None:
+                    connection.close()
+
+    def _handle(self, raw: str):
+        try:
+            message = json.loads(raw)
+        except ValueError:
+            logger.warning(f"Ignoring malformed invalidation message: {raw[:100]}")
+            return
+        if message.get("origin") == self.origin:
+            return
+        self.dispatch(message.get("topic", ""), message.get("payload") or {})
+
+_bus: Optional[InvalidationBus] = None
+
+def get_invalidation_bus() -> InvalidationBus:
+    """Return the configured bus (one per process)."""
+    global _bus
+    if _bus is None:
+        if settings.INVALIDATION_BUS_BACKEND == "postgres":
+            _bus = PostgresInvalidationBus(settings.DATABASE_URL, settings.INVALIDATION_CHANNEL)
+        elif settings.INVALIDATION_BUS_BACKEND == "local":
+            _bus = LocalInvalidationBus()
+        else:
+            raise ValueError(f"Unsupported invalidation bus backend: {settings.INVALIDATION_BUS_BACKEND}")
+    return _bus
+
+def subscribe(topic: str, handler: Handler) -> None:
+    get_invalidation_bus().subscribe(topic, handler)
+
+def publish(topic: str, payload: Optional[dict] = None, db: Optional[Session] = None) -> None:
+    get_invalidation_bus().publish(topic, payload, db)
@@ -0,0 +1,89 @@
+import os
+from datetime import datetime, timezone
+import pytest
+
+# Runs against a real Postgres database: the upsert relies on ON CONFLICT and row locks
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+if not TEST_DATABASE_URL:
+    pytest.skip("TEST_DATABASE_URL is not set", allow_module_level=True)
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from models.database import (
+    Base, User, Class, ClassSession, Attendance, ClassAttendanceRollup, StudentAttendanceRollup,
+    student_class_association
+)
+from crud.attendance import upsert_attendance
+from crud.class_crud import delete_class_session
+
+TABLES = [
+    User.__table__, Class.__table__, student_class_association, ClassSession.__table__,
+    Attendance.__table__, ClassAttendanceRollup.__table__, StudentAttendanceRollup.__table__,
+]
+
+@pytest.fixture
+def db():
+    engine = create_engine(TEST_DATABASE_URL)
+    Base.metadata.create_all(engine, tables=TABLES)
+    connection = engine.connect()
+    transaction = connection.begin()
+    session = Session(bind=connection)
+    try:
+        yield session
+    finally:
+        session.close()
+        transaction.rollback()
+        connection.close()
+        engine.dispose()
+
+@pytest.fixture
+def class_session(db):
+    class_obj = Class(class_code="ROLLUP-TEST", name="Rollup test")
+    db.add(class_obj)
+    db.flush()
+    start = datetime(2026, 10, 5, 9, 0, tzinfo=timezone.utc)
+    session = ClassSession(class_id=class_obj.id, session_date=start, start_time=start, end_time=start)
+    student = User(username="rollup-student", email="rollup-student@example.com")
+    db.add_all([session, student])
+    db.flush()
+    return session, student
+
+def _counts(db, class_id, student_id):
+    class_rollup = db.query(ClassAttendanceRollup).filter(ClassAttendanceRollup.class_id == class_id).one()
+    student_rollup = db.query(StudentAttendanceRollup).filter(
+        StudentAttendanceRollup.class_id == class_id,
+        StudentAttendanceRollup.student_id == student_id
+    ).one()
+    return [
+        (rollup.present_count, rollup.late_count, rollup.absent_count)
+        for rollup in (class_rollup, student_rollup)
+    ]
+
+def test_resubmitted_attendance_is_counted_once(db, class_session):
+    session, student = class_session
+
+    first = upsert_attendance(db, session, student.id, "present")
+    second = upsert_attendance(db, session, student.id, "present")
+
+    assert first.previous_status is None
+    assert second.previous_status == "present"
+    assert second.id == first.id
+    assert _counts(db, session.class_id, student.id) == [(1, 0, 0), (1, 0, 0)]
+
+def test_status_change_moves_the_count(db, class_session):
+    session, student = class_session
+
+    upsert_attendance(db, session, student.id, "present")
+    changed = upsert_attendance(db, session, student.id, "late", late_minutes=5)
+
+    assert changed.previous_status == "present"
+    assert _counts(db, session.class_id, student.id) == [(0, 1, 0), (0, 1, 0)]
+
+def test_deleting_a_session_takes_its_attendance_out_of_the_rollups(db, class_session):
+    session, student = class_session
+    upsert_attendance(db, session, student.id, "present")
+    db.commit()
+
+    assert delete_class_session(db, session.id)
+
+    assert _counts(db, session.class_id, student.id) == [(0, 0, 0), (0, 0, 0)]
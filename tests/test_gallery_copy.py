@@ -0,0 +1,75 @@
+import struct
+import numpy as np
+import pytest
+from services.face_recognition.gallery import _GalleryCopySink, MODEL_TYPE_CODES
+
+DIM = 4
+
+def _copy_stream(rows, header_extension=b""):
+    """A binary COPY stream of (id, user_id, model code, vector) tuples, as Postgres sends it."""
+    stream = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, len(header_extension)) + header_extension
+    for embedding_id, user_id, model_code, vector in rows:
+        stream += struct.pack(">h", 4)
+        stream += struct.pack(">ii", 4, embedding_id)
+        stream += struct.pack(">ii", 4, user_id)
+        stream += struct.pack(">ih", 2, model_code)
+        stream += struct.pack(">ihh", 4 + 4 * len(vector), len(vector), 0)
+        stream += struct.pack(f">{len(vector)}f", *vector)
+    return stream + b"\xff\xff"
+
+ROWS = [
+    (7, 100, MODEL_TYPE_CODES["insightface"], [0.5, -1.0, 2.0, 0.25]),
+    (9, 101, MODEL_TYPE_CODES["deepface"], [1.0, 0.0, -0.5, 3.0]),
+    (12, 100, MODEL_TYPE_CODES["insightface"], [0.0, 0.125, 1.5, -2.0]),
+]
+
+def _decode(chunks, capacity=len(ROWS)):
+    sink = _GalleryCopySink(capacity, DIM)
+    for chunk in chunks:
+        assert sink.write(chunk) == len(chunk)
+    return sink.gallery()
+
+def _assert_rows(gallery):
+    assert gallery.embedding_ids.tolist() == [7, 9, 12]
+    assert gallery.user_ids.tolist() == [100, 101, 100]
+    assert gallery.model_types.tolist() == ["insightface", "deepface", "insightface"]
+    assert gallery.embeddings.dtype == np.float32
+    np.testing.assert_array_equal(gallery.embeddings, np.array([row[3] for row in ROWS], dtype=np.float32))
+
+def test_decodes_a_stream_written_in_one_chunk():
+    _assert_rows(_decode([_copy_stream(ROWS)]))
+
+@pytest.mark.parametrize("header_extension", [b"", b"\x01\x02\x03"])
+def test_decodes_chunks_split_at_every_byte(header_extension):
+    # Covers splits inside the signature, the header extension, a tuple and the trailer
+    stream = _copy_stream(ROWS, header_extension)
+    _assert_rows(_decode([stream[i:i + 1] for i in range(len(stream))]))
+
+@pytest.mark.parametrize("split", [5, 17, 19, 30, 60])
+def test_decodes_a_stream_split_in_two(split):
+    stream = _copy_stream(ROWS)
+    _assert_rows(_decode([stream[:split], stream[split:]]))
+
+def test_grows_past_the_counted_capacity():
+    _assert_rows(_decode([_copy_stream(ROWS)], capacity=1))
+
+def test_empty_stream_gives_an_empty_gallery():
+    gallery = _decode([_copy_stream([])], capacity=1)
+    assert len(gallery) == 0
+    assert gallery.embeddings.shape == (0, DIM)
+
+def test_missing_trailer_is_an_incomplete_stream():
+    with pytest.raises(ValueError, match="Incomplete"):
+        _decode([_copy_stream(ROWS)[:-2]])
+
+def test_truncated_tuple_is_an_incomplete_stream():
+    with pytest.raises(ValueError, match="Incomplete"):
+        _decode([_copy_stream(ROWS)[:-10]])
+
+def test_rejects_an_unexpected_header():
+    with pytest.raises(ValueError, match="header"):
+        _decode([b"NOTCOPY" + _copy_stream(ROWS)[7:]])
+
+def test_rejects_vectors_of_another_dimension():
+    with pytest.raises(ValueError, match="layout"):
+        _decode([_copy_stream([(1, 2, 1, [0.0] * (DIM + 1))])])
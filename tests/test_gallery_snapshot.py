@@ -0,0 +1,140 @@
+import numpy as np
+import pytest
+from config.app import settings
+from services.face_recognition import gallery_snapshot
+from services.face_recognition.gallery import EMBEDDING_DIM, EmbeddingGallery
+from services.face_recognition.gallery_snapshot import (
+    REMOVED_USER_ID, _MappedSnapshot, add_to_snapshot, remove_from_snapshot, snapshot_path, write_snapshot
+)
+
+MODEL = "insightface"
+
+@pytest.fixture(autouse=True)
+def snapshot_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "GALLERY_SNAPSHOT_PATH", str(tmp_path))
+    return tmp_path
+
+@pytest.fixture
+def compactions(monkeypatch):
+    """Background compactions requested, by model type, instead of starting threads."""
+    requested = []
+    monkeypatch.setattr(gallery_snapshot, "_compact_in_background", requested.append)
+    return requested
+
+def _gallery(embedding_ids, user_ids):
+    rng = np.random.default_rng(len(embedding_ids))
+    return EmbeddingGallery(
+        embedding_ids=np.array(embedding_ids, dtype=np.int64),
+        user_ids=np.array(user_ids, dtype=np.int64),
+        model_types=np.full(len(embedding_ids), MODEL, dtype=object),
+        embeddings=rng.standard_normal((len(embedding_ids), EMBEDDING_DIM)).astype(np.float32),
+    )
+
+def _mapped():
+    return _MappedSnapshot(snapshot_path(MODEL), MODEL)
+
+def test_written_snapshot_maps_back_to_the_same_gallery():
+    gallery = _gallery([3, 5, 8], [10, 11, 10])
+    write_snapshot(snapshot_path(MODEL), gallery)
+
+    mapped = _mapped()
+    header = mapped.header[0]
+    assert int(header["count"]) == 3
+    assert int(header["capacity"]) > 3
+    assert mapped.state() == (3, 8)
+
+    mapped_gallery = mapped.gallery()
+    np.testing.assert_array_equal(mapped_gallery.embedding_ids, gallery.embedding_ids)
+    np.testing.assert_array_equal(mapped_gallery.user_ids, gallery.user_ids)
+    np.testing.assert_array_equal(mapped_gallery.embeddings, gallery.embeddings)
+    assert mapped_gallery.model_types.tolist() == [MODEL] * 3
+
+def test_empty_gallery_round_trips():
+    write_snapshot(snapshot_path(MODEL), EmbeddingGallery.empty())
+
+    mapped = _mapped()
+    assert len(mapped.gallery()) == 0
+    assert mapped.state() == (0, 0)
+
+def test_rejects_files_of_another_format():
+    path = snapshot_path(MODEL)
+    with open(path, "wb") as f:
+        f.write(b"\x00" * 256)
+
+    with pytest.raises(ValueError):
+        _MappedSnapshot(path, MODEL)
+
+def test_appended_rows_show_up_through_an_existing_mapping(compactions):
+    write_snapshot(snapshot_path(MODEL), _gallery([3, 5], [10, 11]))
+    mapped = _mapped()
+    vector = np.arange(EMBEDDING_DIM, dtype=np.float32)
+
+    add_to_snapshot(9, 12, MODEL, vector)
+
+    gallery = mapped.gallery()
+    assert gallery.embedding_ids.tolist() == [3, 5, 9]
+    assert gallery.user_ids.tolist() == [10, 11, 12]
+    np.testing.assert_array_equal(gallery.embeddings[2], vector)
+    assert mapped.state() == (3, 9)
+    assert compactions == []
+
+def test_rows_already_in_the_snapshot_are_not_appended_twice(compactions):
+    write_snapshot(snapshot_path(MODEL), _gallery([3, 5], [10, 11]))
+
+    add_to_snapshot(3, 10, MODEL, np.zeros(EMBEDDING_DIM, dtype=np.float32))
+
+    assert _mapped().gallery().embedding_ids.tolist() == [3, 5]
+
+def test_adding_to_a_full_snapshot_compacts_it_first(monkeypatch, compactions):
+    path = snapshot_path(MODEL)
+    # A file with no spare rows and one removed row
+    with monkeypatch.context() as m:
+        m.setattr(gallery_snapshot, "_MIN_SPARE_ROWS", 0)
+        m.setattr(gallery_snapshot, "_GROWTH", 0)
+        write_snapshot(path, _gallery([3, 5, 8], [10, 11, 12]))
+    remove_from_snapshot([5])
+    full = _mapped()
+    assert int(full.header[0]["capacity"]) == 3
+
+    add_to_snapshot(9, 13, MODEL, np.ones(EMBEDDING_DIM, dtype=np.float32))
+
+    compacted = _mapped()
+    assert compacted.inode != full.inode
+    header = compacted.header[0]
+    assert int(header["removed"]) == 0
+    assert int(header["capacity"]) > int(header["count"])
+    gallery = compacted.gallery()
+    assert gallery.embedding_ids.tolist() == [3, 8, 9]
+    assert gallery.user_ids.tolist() == [10, 12, 13]
+    np.testing.assert_array_equal(gallery.embeddings[2], np.ones(EMBEDDING_DIM, dtype=np.float32))
+
+def test_removing_rows_marks_them_and_updates_the_header(compactions):
+    write_snapshot(snapshot_path(MODEL), _gallery([3, 5, 8, 13], [10, 11, 12, 13]))
+    mapped = _mapped()
+
+    remove_from_snapshot([13, 5, 404])
+
+    header = mapped.header[0]
+    assert int(header["count"]) == 4
+    assert int(header["removed"]) == 2
+    assert int(header["max_id"]) == 8
+    assert mapped.state() == (2, 8)
+    assert mapped.gallery().user_ids.tolist() == [10, REMOVED_USER_ID, 12, REMOVED_USER_ID]
+    assert compactions == [MODEL]
+
+def test_removing_a_row_twice_counts_it_once(compactions):
+    write_snapshot(snapshot_path(MODEL), _gallery([3, 5, 8, 13, 21], [10, 11, 12, 13, 14]))
+
+    remove_from_snapshot([5])
+    remove_from_snapshot([5])
+
+    header = _mapped().header[0]
+    assert int(header["removed"]) == 1
+    assert int(header["max_id"]) == 21
+
+def test_removing_every_row_resets_max_id(compactions):
+    write_snapshot(snapshot_path(MODEL), _gallery([3, 5], [10, 11]))
+
+    remove_from_snapshot([3, 5])
+
+    assert _mapped().state() == (0, 0)